@@ -1,3 +1,4 @@
+import asyncio
 import json
 import datetime
 import os
@@ -27,6 +28,9 @@ from planzero import get_peval
 
 u = planzero.ureg
 
+# fork the simulation workers now, before the server starts any threads
+planzero.sim.start_workers()
+
 HOME_SHOW_UNPUBLISHED_POSTS = (os.environ['PLANZERO_HOME_SHOW_UNPUBLISHED_POSTS'] == '1')
 
 def app_cache(f):
@@ -151,7 +155,7 @@ async def get_barriers(request: Request):
 
 @app.get("/scenarios/{scenario_name}/barriers/{barrier_name}/", response_class=HTMLResponse)
 async def get_scenario_strategy_impact(request: Request, scenario_name: str, barrier_name: str):
-    sim = planzero.sim.sim_scenario(scenario_name)
+    sim = await asyncio.wrap_future(planzero.sim.start_sim_scenario(scenario_name))
     return templates.TemplateResponse(
         request=request,
         name="scenario_barrier.html",
@@ -165,6 +169,18 @@ async def get_scenario_strategy_impact(request: Request, scenario_name: str, bar
     )
 
 
+@app.get("/scenarios/{scenario_name}/progress/")
+async def get_scenario_progress(scenario_name: str):
+    if scenario_name not in planzero.scenarios.scenarios:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    future = planzero.sim.start_sim_scenario(scenario_name)
+    progress = planzero.sim.sim_progress(scenario_name)
+    return dict(
+        done=future.done(),
+        n_runs_done=progress[0] if progress else None,
+        n_runs_total=progress[1] if progress else None)
+
+
 @app.get("/scenarios/", response_class=HTMLResponse)
 async def get_scenarios(request: Request):
     return templates.TemplateResponse(
@@ -207,7 +223,7 @@ async def get_scenario_ipcc_sectors_category(
     else:
         catpath = f'{category}'
 
-    sim = planzero.sim.sim_scenario(scenario_name)
+    sim = await asyncio.wrap_future(planzero.sim.start_sim_scenario(scenario_name))
     chart = sim.echart_ipcc_sector(catpath)
 
     return templates.TemplateResponse(
@@ -226,7 +242,7 @@ async def get_scenario_ipcc_sectors_category(
 
 @app.get("/scenarios/{scenario_name}/strategies/{strategy_name}/", response_class=HTMLResponse)
 async def get_scenario_strategy_impact(request: Request, scenario_name: str, strategy_name: str):
-    sim = planzero.sim.sim_scenario(scenario_name)
+    sim = await asyncio.wrap_future(planzero.sim.start_sim_scenario(scenario_name))
     baseline_state = sim.state
     ablated_state = sim.ablations.get(strategy_name)
     if not ablated_state:
@@ -80,6 +80,52 @@ def request_all_planzero_pages(args):
         print(status_code, '{:.2f}'.format(client.last_get_time), endpoint)
 
 
+def count_pint_conversions(args):
+    import time
+    from . import get_peval
+    from .ureg import counting_pint_conversions
+    with counting_pint_conversions() as counts:
+        t0 = time.time()
+        get_peval()
+        t1 = time.time()
+    print(f'get_peval() took {t1 - t0:.2f}s')
+    for key, count in sorted(counts.items()):
+        print(key, count)
+
+
+def benchmark_sts(args):
+    """Compare object-creation cost and memory of STS against its pydantic
+    schema STSModel (which is what STS used to be)
+    """
+    import array
+    import timeit
+    import tracemalloc
+    from .sts import STS, STSModel, InterpolationMode
+    from .ureg import u
+
+    times = array.array('d', [2000.0])
+    values = array.array('d', [0.0, 1.0])
+    t_unit = u.years
+    v_unit = u.kg
+
+    def make(cls):
+        return cls(
+            times=times,
+            values=values,
+            t_unit=t_unit,
+            v_unit=v_unit,
+            interpolation=InterpolationMode.current)
+
+    for cls in (STSModel, STS):
+        secs = min(timeit.repeat(lambda: make(cls), number=args.n, repeat=5))
+        tracemalloc.start()
+        objs = [make(cls) for ii in range(args.n)]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del objs
+        print(f'{cls.__name__}: {secs / args.n * 1e6:.2f} us and {size / args.n:.0f} bytes per object')
+
+
 if __name__ == '__main__':
 
     # create the top-level parser
@@ -106,5 +152,12 @@ if __name__ == '__main__':
     parser_request_all_pages = subparsers.add_parser('request_all_pages')
     parser_request_all_pages.set_defaults(func=request_all_planzero_pages)
 
+    parser_count_pint_conversions = subparsers.add_parser('count_pint_conversions')
+    parser_count_pint_conversions.set_defaults(func=count_pint_conversions)
+
+    parser_benchmark_sts = subparsers.add_parser('benchmark_sts')
+    parser_benchmark_sts.add_argument('-n', type=int, default=10000, help='objects per trial')
+    parser_benchmark_sts.set_defaults(func=benchmark_sts)
+
     args = parser.parse_args()
     args.func(args)
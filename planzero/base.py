@@ -3,13 +3,18 @@
 # https://climate-assessment.readthedocs.io/en/latest/index.html
 
 import array
+import collections
+import concurrent.futures
 import contextlib
+import copy
 import heapq
+import multiprocessing
 from io import StringIO
 import math
 import os
 import sys
 import time
+from typing import ClassVar
 
 import matplotlib.pyplot as plt
 import networkx as nx
@@ -17,7 +22,7 @@ import numpy as np
 import pandas as pd
 import pint
 from pydantic import BaseModel, computed_field
-from .ureg import ureg, kt_by_ghg
+from .ureg import ureg, kt_by_ghg, conversion_factor
 u = ureg
 
 
@@ -30,10 +35,29 @@ u = ureg
 from . import ipcc_canada
 from .enums import GHG, IPCC_Sector
 
-from .sts import SparseTimeSeries, STS
+from .sts import SparseTimeSeries, STS, LazySTS, EnsembleSTS
+from .sts import n_samples_of, ensemble_like
 
 
 class DynamicElement(BaseModel):
+    """A project, barrier, strategy, or model component that declares STS
+    in on_add_project and writes them in step().
+
+    Feed-forward elements can also implement the optional bulk alternative
+    to step(), `step_range(self, state, t0, t1)`. Whenever such an element
+    is due to step at `t0` and everything it reads has already been written
+    up to `t1`, the scheduler calls step_range once instead of calling
+    step() at each time in between. It returns (times, outputs, t_next):
+    the pint array of times at which step() would have been called, from t0
+    up to at most t1 (see `step_times`), a dict mapping the names of STS
+    this element writes to pint arrays of their values at those times, and
+    the t_next that step() would have returned at the last of them.
+
+    step_range reads its inputs directly from `state.sts`, e.g. with
+    `query_batch(times)`, so the scheduler only knows what it reads from
+    its declarations: every input must be declared with requiring_current,
+    and neither step_range nor step may read `state.latest`.
+    """
 
     identifier: str | None = None
     _sub_projects: 'list[DynamicElement]' = []
@@ -43,6 +67,8 @@ class DynamicElement(BaseModel):
 
     tags: set = set() # eg. barrier, strategy
 
+    step_range: ClassVar = None # see the class docstring
+
     @computed_field
     def short_description(self) -> str | None:
         # The intent is for subclasses to over-ride this method.
@@ -144,32 +170,112 @@ class BaseScenarioProject(DynamicElement):
 
 class StateCurrent(object):
     def __init__(self, state, readable, writeable):
+        # readable and writeable map names to STS objects, and every
+        # writeable one is also readable
         self.__dict__.update(
             state=state,
             readable=readable,
             writeable=writeable)
 
     def __getattr__(self, attr):
-        if attr in self.readable or attr in self.writeable:
+        try:
             # TODO: it might catch errors to be strict about not reading
             # before writing but current.foo += 1 is such natural syntax
             # and strict semantics would forbid it.
-            return self.state.sts[attr].query(self.state.t_now)
-        else:
+            sts = self.readable[attr]
+        except KeyError:
             if attr in self.state.sts:
                 raise AttributeError(f'state variable {attr} exists, but the calling DynamicElement class did not register to read it')
             else:
                 raise AttributeError(attr)
+        return sts.query(self.state.t_now)
 
     def __setattr__(self, attr, val):
         if attr in self.writeable:
-            self.state.sts[attr].append(self.state.t_now, val)
-            self.readable.add(attr)
-            self.writeable.remove(attr)
+            # writing twice in one step fails in append, as t_now is not
+            # after the last time
+            self.writeable[attr].append(self.state.t_now, val)
         else:
             assert 0, ('Setting non-writeable attr', attr)
 
 
+# SimulationPlan.signature -> SimulationPlan, least recently used first
+_simulation_plans = collections.OrderedDict()
+_simulation_plans_maxlen = 64
+
+
+class SimulationPlan(object):
+    """The schedule-independent part of running a State: the order in which
+    to step projects that are due at the same time (a topological sort of
+    the dependency graph), integer ids for the projects and STS, and each
+    project's tables of STS it may read and write with `current`.
+
+    This is compiled once per signature (the projects, and the STS with
+    their writers and current readers) and shared by every State with the
+    same one, e.g. the baseline and ablations of a scenario, or their forks.
+    """
+
+    def __init__(self, signature, project_order, sts_names, reads, writes):
+        self.signature = signature
+        self.project_order = project_order # tuple of prj.identifier
+        self.project_ids = {key: ii for ii, key in enumerate(project_order)}
+        self.sts_names = sts_names # tuple of STS names
+        self.sts_ids = {name: ii for ii, name in enumerate(sts_names)}
+        # by project id, the STS ids it may read (including its writes) and write
+        self.reads = reads
+        self.writes = writes
+
+    @staticmethod
+    def signature_of(state):
+        return (
+            tuple(state.projects),
+            tuple((name,
+                   sts.writer.identifier if sts.writer else None,
+                   tuple(prj.identifier for prj in sts.current_readers))
+                  for name, sts in state.sts.items()))
+
+    @classmethod
+    def for_state(cls, state):
+        """Return the (cached) plan for the projects and STS of `state`"""
+        signature = cls.signature_of(state)
+        try:
+            rval = _simulation_plans[signature]
+        except KeyError:
+            pass
+        else:
+            _simulation_plans.move_to_end(signature)
+            return rval
+        graph = state.dependency_digraph()
+        project_order = tuple(
+            node for node in nx.topological_sort(graph) if node in state.projects)
+        sts_names = tuple(state.sts)
+        sts_ids = {name: ii for ii, name in enumerate(sts_names)}
+        writes = tuple(
+            tuple(sts_ids[name] for name in sorted(state.project_writes[key]))
+            for key in project_order)
+        reads = tuple(
+            tuple(sts_ids[name] for name in sorted(state.project_requires_current[key]))
+            + project_writes
+            for key, project_writes in zip(project_order, writes))
+        rval = _simulation_plans[signature] = cls(
+            signature=signature,
+            project_order=project_order,
+            sts_names=sts_names,
+            reads=reads,
+            writes=writes)
+        while len(_simulation_plans) > _simulation_plans_maxlen:
+            _simulation_plans.popitem(last=False)
+        return rval
+
+    def current(self, state, project_id):
+        """Return the StateCurrent for stepping project `project_id` of `state`"""
+        names = self.sts_names
+        return StateCurrent(
+            state,
+            readable={names[ii]: state.sts[names[ii]] for ii in self.reads[project_id]},
+            writeable={names[ii]: state.sts[names[ii]] for ii in self.writes[project_id]})
+
+
 class DeclarationContext(object):
 
     def __init__(self, state, dynelem, need_current, write):
@@ -181,7 +287,9 @@ class DeclarationContext(object):
             )
 
     def __setattr__(self, name, thing):
-        if isinstance(thing, STS):
+        if isinstance(thing, LazySTS):
+            thing = thing.evaluate()
+        if isinstance(thing, (STS, EnsembleSTS)):
             return self.state.declare_sts(
                 self.dynelem,
                 thing,
@@ -196,12 +304,41 @@ class Stash(object):
     pass
 
 
+# The scheduler counts time in ticks of half an hour (of pint's Julian year),
+# so that years, half-years, months, days and hours are whole numbers of
+# ticks, and times that should coincide do, without float round-off.
+TICKS_PER_YEAR = 17532
+_years = u.years # (attribute lookup on the registry is slow)
+
+
+def _tick_of_time(t):
+    """Return the pint time `t` as a whole number of ticks (rounded)"""
+    return round(t.magnitude * conversion_factor(t.u, _years) * TICKS_PER_YEAR)
+
+
+def _time_of_tick(tick):
+    return u.Quantity(tick / TICKS_PER_YEAR, _years)
+
+
+def step_times(t0, t1, stepsize):
+    """Return (times, t_next) for a step_range from `t0` up to `t1` of an
+    element whose step() returns `state.t_now + stepsize`: the times at
+    which step() would be called, and the time after them it would be
+    called next, on the scheduler's tick grid.
+    """
+    tick0 = _tick_of_time(t0)
+    dtick = _tick_of_time(stepsize)
+    ticks = np.arange(tick0, _tick_of_time(t1) + 1, dtick)
+    return _time_of_tick(ticks), _time_of_tick(int(ticks[-1]) + dtick)
+
+
 class State(object):
     t_start = 1990 * u.years
 
     def __init__(self, t_start=t_start, name=None):
         self.t_start = t_start
-        self._t_now = t_start # always in some unit of time, not always the same unit
+        self._tick = _tick_of_time(t_start) # the scheduler's clock (see TICKS_PER_YEAR)
+        self._t_now = _time_of_tick(self._tick) # the same time, in years
         self.sts = {}  # the sts objects built up by rolling simulation forward
 
         # TODO: index by enums.IPCC_Sector
@@ -214,15 +351,27 @@ class State(object):
         self.projects = {}
         self.project_writes = {} # prj.identifier -> set of string names
         self.project_requires_current = {} # prj.identifier -> set of string names
-        #self.project_reads = {} # prj.identifier -> set of string names
+        self.project_reads = {} # prj.identifier -> set of string names read with `latest`
         self.project_t_next = {} # prj.identifier -> t_next
         self.stashes = {} # prj.identifier -> private namespace
-        self._depgraph = None
+        self._plan = None # SimulationPlan, once running
+        self._currents = {} # prj.identifier -> StateCurrent, for self._plan
         self.name = name
         self.emissions_registration_closed = False
 
         self.sts_id_counter = 100
 
+        # True once the results of running this state in a worker process
+        # have been copied in (see ProjectEvaluation.run_until); the
+        # dynamic elements here were not advanced, so it can't run further.
+        self.ran_in_worker = False
+
+        self._stepping = None # prj.identifier of the step() in progress
+        self._last_step = None # (t, prj.identifier) of the last step()
+        self._last_bulk_step = None # (t, prj.identifier) of the last time written by step_range
+        self._bulk = set() # prj.identifiers that implement step_range
+        self._readding = () # prj.identifiers being re-added by resimulate
+
     def new_sts_identifier(self):
         name = self.name or 'State_STS'
         rval = f'{name}_{self.sts_id_counter}'
@@ -246,21 +395,31 @@ class State(object):
         return graph
 
     def declare_read_current_sts(self, project, name):
-        self.sts[name].current_readers.append(project)
+        if project not in self.sts[name].current_readers:
+            self.sts[name].current_readers.append(project)
         self.project_requires_current[project.identifier].add(name)
-        self._depgraph = None
+        self._plan = None
 
     def declare_sts(self, project, sts, name=None, need_current=False, write=False):
+        if isinstance(sts, LazySTS):
+            sts = sts.evaluate()
         if name is None:
             name = sts.identifier or self.new_sts_identifier()
         elif sts.identifier is not None:
             assert name == sts.identifier
-        assert isinstance(sts, STS)
+        assert isinstance(sts, (STS, EnsembleSTS))
         if name not in self.sts:
             assert sts.identifier in (None, name)
             sts.identifier = name
             self.sts[name] = sts
-            self._depgraph = None
+            self._plan = None
+        elif write and project.identifier in self._readding:
+            # resimulate is re-adding the writer: keep the STS object, which
+            # other projects' stashes or STS may refer to, but not its data
+            assert self.sts[name].writer is project
+            _redefine_sts(self.sts[name], sts)
+            del sts
+            return self.sts[name]
         else:
             # TODO type-check for compatible existing sts
             pass
@@ -268,12 +427,14 @@ class State(object):
         if need_current:
             assert not write
             self.declare_read_current_sts(project, name)
+        elif not write:
+            self.project_reads[project.identifier].add(name)
         if write:
             assert not need_current
             assert self.sts[name].writer is None
             self.sts[name].writer = project
             self.project_writes[project.identifier].add(name)
-            self._depgraph = None
+            self._plan = None
             return self.sts[name]
         return self.sts[name]
 
@@ -307,9 +468,10 @@ class State(object):
         self.projects[project.identifier] = project
         self.project_writes[project.identifier] = set() # of strings
         self.project_requires_current[project.identifier] = set() # of strings
+        self.project_reads[project.identifier] = set() # of strings
         self.stashes[project.identifier] = Stash()
         self.project_t_next[project.identifier] = project.on_add_project(self)
-        self._depgraph = None
+        self._plan = None
 
         # we will close registration at the request of the first project that
         # requires it to be closed
@@ -351,10 +513,18 @@ class State(object):
 
     @t_now.setter
     def t_now(self, t_next):
-        assert t_next >= self._t_now
-        self._t_now = t_next
+        self._set_tick(_tick_of_time(t_next))
+
+    def _set_tick(self, tick):
+        if tick != self._tick:
+            assert tick > self._tick
+            self._tick = tick
+            self._t_now = _time_of_tick(tick)
 
     def register_emission(self, category_path, ghg, sts_key):
+        if sts_key in self.sectoral_emissions_contributors[category_path].get(ghg, ()):
+            # already registered (e.g. by the same project, being re-added)
+            return
         if self.emissions_registration_closed:
             raise RuntimeError()
         assert ghg == GHG(ghg)
@@ -368,20 +538,24 @@ class State(object):
     def latest(self):
         class Latest(object):
             def __getattr__(_, attr):
-                # setting this to 1e-6 with u.years gets rounded off and doesn't work
-                return self.sts[attr].query(self.t_now - 1e-5 * u.seconds)
+                if self._stepping is not None:
+                    self.project_reads[self._stepping].add(attr)
+                return self.sts[attr].query_before(self._t_now)
         return Latest()
 
-    def _current(self, readable_attrs, writeable_attrs):
+    def _current(self, prj_identifier):
         """Return a view of certain state variables, supporting the standard
         syntax of step(state, current).
 
         The semantics of this object are such that
         `current.foo` returns the self.t_now'th value of foo, when it is valid to do so.
         """
-        readable = set(readable_attrs)
-        writeable = set(writeable_attrs)
-        return StateCurrent(self, readable, writeable)
+        try:
+            return self._currents[prj_identifier]
+        except KeyError:
+            rval = self._currents[prj_identifier] = self._plan.current(
+                self, self._plan.project_ids[prj_identifier])
+            return rval
 
     def plot(self, t_unit='years', **kwargs):
         if len(self.sts) <= 1:
@@ -404,33 +578,272 @@ class State(object):
             plt.subplot(rows, cols, ii + 1)
             sts.plot(t_unit=t_unit)
 
-    def run_until(self, t_stop):
-        if self._depgraph is None:
-            self._depgraph = self.dependency_digraph()
+    def _schedule(self):
+        if self._plan is None:
+            self._plan = SimulationPlan.for_state(self)
+            self._currents = {}
             self._heap = [
-                (self.project_t_next[prj_identifier], ii, prj_identifier)
-                for (ii, prj_identifier) in enumerate(nx.topological_sort(self._depgraph))
-                if self.project_t_next.get(prj_identifier) is not None]
+                (_tick_of_time(self.project_t_next[prj_identifier]), ii, prj_identifier)
+                for (ii, prj_identifier) in enumerate(self._plan.project_order)
+                if self.project_t_next[prj_identifier] is not None]
             heapq.heapify(self._heap)
+            # (step_range results are written with STS.extend_array, which
+            # ensembles don't have)
+            self._bulk = {
+                prj_identifier for prj_identifier in self._plan.project_order
+                if type(self.projects[prj_identifier]).step_range is not None
+                and all(isinstance(self.sts[name], STS)
+                        for name in self.project_writes[prj_identifier])}
+
+    def _inputs_complete(self, prj_identifier, tick_stop):
+        """Return True if every STS that the project reads is written (by
+        other projects) as far as it will be up to tick_stop
+        """
+        # step_range reads aren't recorded, so they must all be declared
+        # (see DynamicElement)
+        assert not self.project_reads[prj_identifier], (
+            'step_range inputs must be declared with requiring_current',
+            prj_identifier, self.project_reads[prj_identifier])
+        for name in self.project_requires_current[prj_identifier]:
+            writer = self.sts[name].writer
+            if writer is None or writer.identifier == prj_identifier:
+                continue
+            t_next = self.project_t_next[writer.identifier]
+            if t_next is not None and _tick_of_time(t_next) <= tick_stop:
+                return False
+        return True
+
+    def _step_range(self, prj_identifier, tick_stop):
+        """Call step_range for the project due now, up to tick_stop, write
+        the arrays it returns, and return its t_next
+        """
+        self._stepping = prj_identifier
+        try:
+            times, outputs, t_next = self.projects[prj_identifier].step_range(
+                self, self._t_now, _time_of_tick(tick_stop))
+        finally:
+            self._stepping = None
+        ticks = np.rint(times.m_as(_years) * TICKS_PER_YEAR).astype(np.int64)
+        assert len(ticks) and ticks[0] == self._tick and ticks[-1] <= tick_stop, (
+            prj_identifier, ticks)
+        assert np.all(ticks[1:] > ticks[:-1])
+        ts = ticks / TICKS_PER_YEAR # as _time_of_tick
+        for name, values in outputs.items():
+            assert name in self.project_writes[prj_identifier], (prj_identifier, name)
+            self.sts[name].extend_array(ts, values, t_unit=_years)
+        if t_next is not None:
+            assert _tick_of_time(t_next) > ticks[-1]
+        self._last_bulk_step = (int(ticks[-1]), prj_identifier)
+        return t_next
+
+    def _step_next(self, tick_stop=None):
+        """Step the project due next, or if it implements step_range and
+        its inputs are ready, bulk-step it up to tick_stop
+        """
+        if self.ran_in_worker:
+            raise RuntimeError(f'{self.name} was run in a worker process')
+        tick, node_idx, prj_identifier = heapq.heappop(self._heap)
+        self._set_tick(tick)
+        if (tick_stop is not None
+                and tick <= tick_stop
+                and prj_identifier in self._bulk
+                and self._inputs_complete(prj_identifier, tick_stop)):
+            new_t_next = self._step_range(prj_identifier, tick_stop)
+        else:
+            current = self._current(prj_identifier)
+            self._stepping = prj_identifier
+            try:
+                new_t_next = self.projects[prj_identifier].step(self, current=current)
+            finally:
+                self._stepping = None
+        self._last_step = (tick, prj_identifier)
+        self.project_t_next[prj_identifier] = new_t_next
+        if new_t_next is not None:
+            new_tick = _tick_of_time(new_t_next)
+            assert new_tick > tick
+            heapq.heappush(self._heap, (new_tick, node_idx, prj_identifier))
+
+    def run_until(self, t_stop):
+        self._schedule()
+        tick_stop = _tick_of_time(t_stop)
+        while self._tick <= tick_stop and self._heap:
+            self._step_next(tick_stop)
+
+    def run_before(self, t_stop):
+        """Step everything scheduled strictly before t_stop (whereas
+        run_until also steps the first thing scheduled after t_stop), e.g.
+        to fork this state for projects that start at t_stop.
+        """
+        self._schedule()
+        tick_stop = _tick_of_time(t_stop)
+        while self._heap and self._heap[0][0] < tick_stop:
+            self._step_next(tick_stop - 1)
+
+    def downstream_projects(self, identifiers):
+        """Return the identifiers of the projects in `identifiers`, their
+        sub-projects, and every project that reads (with `current` or
+        `latest`) what any of those write, directly or indirectly.
+
+        Only declared reads, and reads through `state.latest` during step(),
+        are known; a project reading another's STS by other means must
+        declare it (see requiring_latest).
+        """
+        graph = self.dependency_digraph()
+        for prj_identifier, names in self.project_reads.items():
+            for name in names:
+                graph.add_edge(self.sts[name].identifier, prj_identifier)
+        rval = set()
+        stack = [self.projects[prj_identifier] for prj_identifier in identifiers]
+        while stack:
+            prj = stack.pop()
+            rval.add(prj.identifier)
+            stack.extend(prj._sub_projects)
+        for prj_identifier in list(rval):
+            rval.update(node for node in nx.descendants(graph, prj_identifier)
+                        if node in self.projects)
+        return rval
+
+    def resimulate(self, identifiers):
+        """Re-run the projects in `identifiers` (e.g. after changing their
+        fields) and their downstream_projects, from t_start up to where this
+        state had got to, reusing the STS of all other projects as they are.
 
-        while self.t_now <= t_stop and self._heap:
-            t_next, node_idx, prj_identifier = heapq.heappop(self._heap)
-            assert t_next >= self.t_now
-            self.t_now = t_next
-            if 0:
-                print("HEAP")
-                for foo in sorted(self._heap):
-                    print("    ", foo)
-                print('Stepping', t_next, prj_identifier)
+        The re-run projects are added again (on_add_project is called with
+        fresh stashes), and must declare the same STS as before; their STS
+        objects are kept, but hold only the newly simulated values.
+        Return the set of re-run identifiers.
+        """
+        stale = self.downstream_projects(identifiers)
+        # rewind the clock, so that on_add_project sees t_start as it did
+        # originally (e.g. when it returns the time of its first step)
+        tick, t_now = self._tick, self._t_now
+        self._tick = _tick_of_time(self.t_start)
+        self._t_now = _time_of_tick(self._tick)
+        try:
+            self._resimulate(stale)
+        finally:
+            self._tick, self._t_now = tick, t_now
+        return stale
 
-            current = self._current(
-                    readable_attrs=self.project_requires_current[prj_identifier],
-                    writeable_attrs=self.project_writes[prj_identifier])
-            new_t_next = self.projects[prj_identifier].step(self, current=current)
-            self.project_t_next[prj_identifier] = new_t_next
-            if new_t_next is not None:
-                assert new_t_next > self.t_now
-                heapq.heappush(self._heap, (new_t_next, node_idx, prj_identifier))
+    def _resimulate(self, stale):
+        self._readding = stale
+        try:
+            # in the original order, e.g. so that emissions are registered
+            # before AtmosphericChemistry collects them
+            for prj_identifier in [key for key in self.projects if key in stale]:
+                self.stashes[prj_identifier] = Stash()
+                self.project_t_next[prj_identifier] = \
+                    self.projects[prj_identifier].on_add_project(self)
+        finally:
+            self._readding = ()
+
+        last_step = self._last_step
+        if last_step is None:
+            # nothing has been run yet
+            return
+        self._plan = None
+        self._schedule()
+        # re-step everything up to and including last_step, in heap order
+        # (or as far as step_range wrote ahead of it), one step at a time
+        bound = (last_step[0], self._plan.project_ids[last_step[1]])
+        if self._last_bulk_step is not None:
+            bound = max(bound, (self._last_bulk_step[0],
+                                self._plan.project_ids[self._last_bulk_step[1]]))
+        others = [entry for entry in self._heap if entry[2] not in stale]
+        self._heap = [entry for entry in self._heap if entry[2] in stale]
+        heapq.heapify(self._heap)
+        try:
+            while self._heap and self._heap[0][:2] <= bound:
+                self._step_next()
+        finally:
+            self._heap.extend(others)
+            heapq.heapify(self._heap)
+            self._last_step = last_step
+
+    def snapshot(self):
+        """Return a fork of this state as it is now, which stays as it is
+        while this state runs on, for forking again later.
+        """
+        return self.fork()
+
+    def fork(self, name=None, without=()):
+        """Return a copy of this state that runs on independently.
+
+        STS buffers are shared copy-on-write (see STS.fork), so this is cheap
+        compared with simulating the prefix again. The projects are shared,
+        as between the states of a ProjectEvaluation, while the per-state
+        data (stashes, schedule, registrations) are copied.
+
+        The projects identified in `without` (and their sub-projects) are not
+        stepped in the fork. Their STS stay declared but unwritten, so this is
+        only like never adding them if nothing else depends on those STS:
+        ValueError is raised if an excluded project has written anything so
+        far, registered an emission or subsidy requirement, or writes STS
+        that another project reads (e.g. AtmosphericChemistry would tally
+        the default values of registered emissions).
+        """
+        if self.ran_in_worker:
+            raise RuntimeError(f'{self.name} was run in a worker process')
+        excluded = set()
+        stack = [self.projects[prj_identifier] for prj_identifier in without]
+        while stack:
+            prj = stack.pop()
+            excluded.add(prj.identifier)
+            stack.extend(prj._sub_projects)
+        registered = set(self.subsidy_requirements)
+        for contributors in self.sectoral_emissions_contributors.values():
+            for sts_keys in contributors.values():
+                registered.update(sts_keys)
+        read = set()
+        for prj_identifier in self.projects:
+            if prj_identifier not in excluded:
+                read.update(self.project_requires_current[prj_identifier])
+                read.update(self.project_reads[prj_identifier])
+        for prj_identifier in excluded:
+            for sts_key in self.project_writes[prj_identifier]:
+                if len(self.sts[sts_key].times):
+                    raise ValueError(f'{prj_identifier} has already written {sts_key}')
+                if sts_key in registered:
+                    raise ValueError(f'{prj_identifier} has registered {sts_key}')
+                if sts_key in read:
+                    raise ValueError(f'{sts_key} of {prj_identifier} is read by other projects')
+
+        rval = State(t_start=self.t_start, name=self.name if name is None else name)
+        rval._tick = self._tick
+        rval._t_now = self._t_now
+        forks = {id(obj): obj.fork() for obj in self.sts.values()}
+        rval.sts = {key: forks[id(obj)] for key, obj in self.sts.items()}
+        rval.sectoral_emissions_contributors = {
+            catpath: {ghg: list(sts_keys) for ghg, sts_keys in contributors.items()}
+            for catpath, contributors in self.sectoral_emissions_contributors.items()}
+        rval.subsidy_requirements = set(self.subsidy_requirements)
+        rval.projects = dict(self.projects)
+        rval.project_writes = {
+            key: set(names) for key, names in self.project_writes.items()}
+        rval.project_requires_current = {
+            key: set(names) for key, names in self.project_requires_current.items()}
+        rval.project_reads = {
+            key: set(names) for key, names in self.project_reads.items()}
+        rval.project_t_next = dict(self.project_t_next)
+
+        # stashes may refer to STS and projects, which deepcopy should map to
+        # the forked STS and leave shared, respectively
+        memo = {id(prj): prj for prj in self.projects.values()}
+        memo.update((id(obj), forks[id(obj)]) for obj in self.sts.values())
+        rval.stashes = copy.deepcopy(self.stashes, memo)
+
+        rval._plan = self._plan
+        if self._plan is not None:
+            rval._heap = [entry for entry in self._heap if entry[2] not in excluded]
+            heapq.heapify(rval._heap)
+            rval._bulk = set(self._bulk)
+        for prj_identifier in excluded:
+            rval.project_t_next[prj_identifier] = None
+        rval.emissions_registration_closed = self.emissions_registration_closed
+        rval.sts_id_counter = self.sts_id_counter
+        rval._last_step = self._last_step
+        rval._last_bulk_step = self._last_bulk_step
+        return rval
 
 
 
@@ -467,6 +880,23 @@ NF3_GWP_100 = 16_100 * u.kg_CO2e / u.kg_NF3
 
 
 
+# The GHGs that AtmosphericChemistry tallies: the GHG, its name in STS keys,
+# the unit of its tallies, and its GWP-100 in kt CO2e per tally unit
+_kt_CO2e = u.kt_CO2e
+_tallied_ghgs = tuple(
+    (ghg, name, unit, (gwp * unit).to(_kt_CO2e).magnitude)
+    for ghg, name, unit, gwp in (
+        (GHG.CO2, 'CO2', u.kt_CO2, CO2_GWP_100),
+        (GHG.CH4, 'CH4', u.kt_CH4, CH4_GWP_100),
+        (GHG.N2O, 'N2O', u.kt_N2O, N2O_GWP_100),
+        (GHG.HFCs, 'HFC', u.kt_HFC, HFC_GWP_100),
+        (GHG.PFCs, 'PFC', u.kt_PFC, PFC_GWP_100),
+        (GHG.SF6, 'SF6', u.kt_SF6, SF6_GWP_100),
+        (GHG.NF3, 'NF3', u.kt_NF3, NF3_GWP_100),
+    ))
+_tallied_gwps = np.asarray([gwp for _, _, _, gwp in _tallied_ghgs])
+
+
 class AtmosphericChemistry(BaseScenarioProject):
     """Combine GHG emissions into a CO2e estimate using GWP-100 emission factors,
     and also simulate a simple radiative forcing and planetary heating model.
@@ -494,194 +924,179 @@ class AtmosphericChemistry(BaseScenarioProject):
             )
 
     def on_add_project(self, state):
-        # TODO: use new ObjTensor support to vectorize this code
-
         for catpath, contributors in state.sectoral_emissions_contributors.items():
-            # TODO: why not loop over these keys?
-            for sts_key in contributors.get(GHG.CO2, []):
-                state.declare_read_current_sts(self, sts_key)
-            for sts_key in contributors.get(GHG.CH4, []):
-                state.declare_read_current_sts(self, sts_key)
-            for sts_key in contributors.get(GHG.N2O, []):
-                state.declare_read_current_sts(self, sts_key)
-            for sts_key in contributors.get(GHG.HFCs, []):
-                state.declare_read_current_sts(self, sts_key)
-            for sts_key in contributors.get(GHG.PFCs, []):
-                state.declare_read_current_sts(self, sts_key)
-            for sts_key in contributors.get(GHG.SF6, []):
-                state.declare_read_current_sts(self, sts_key)
-            for sts_key in contributors.get(GHG.NF3, []):
-                state.declare_read_current_sts(self, sts_key)
+            for ghg, _, _, _ in _tallied_ghgs:
+                for sts_key in contributors.get(ghg, []):
+                    state.declare_read_current_sts(self, sts_key)
+
+        # if any contributor is an ensemble (see sts.EnsembleSTS), so are
+        # all the outputs
+        n_samples = n_samples_of(*(
+            state.sts[sts_key]
+            for contributors in state.sectoral_emissions_contributors.values()
+            for ghg, _, _, _ in _tallied_ghgs
+            for sts_key in contributors.get(ghg, [])))
+
+        def series(**kwargs):
+            return ensemble_like(SparseTimeSeries(t_unit=u.year, **kwargs), n_samples)
 
         with state.defining(self) as ctx:
             for catpath, contributors in state.sectoral_emissions_contributors.items():
                 any_CO2e_contributors = False
-                if contributors.get(GHG.CO2, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_CO2_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_CO2, t_unit=u.year))
-                    any_CO2e_contributors = True
-                if contributors.get(GHG.CH4, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_CH4_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_CH4, t_unit=u.year))
-                    any_CO2e_contributors = True
-                if contributors.get(GHG.N2O, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_N2O_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_N2O, t_unit=u.year))
-                    any_CO2e_contributors = True
-                if contributors.get(GHG.HFCs, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_HFC_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_HFC, t_unit=u.year))
-                    any_CO2e_contributors = True
-                if contributors.get(GHG.PFCs, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_PFC_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_PFC, t_unit=u.year))
-                    any_CO2e_contributors = True
-                if contributors.get(GHG.SF6, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_SF6_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_SF6, t_unit=u.year))
-                    any_CO2e_contributors = True
-                if contributors.get(GHG.NF3, []):
-                    setattr(ctx, f'Predicted_Annual_Emitted_NF3_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_NF3, t_unit=u.year))
-                    any_CO2e_contributors = True
+                for ghg, name, unit, _ in _tallied_ghgs:
+                    if contributors.get(ghg, []):
+                        setattr(ctx, f'Predicted_Annual_Emitted_{name}_mass_{catpath}',
+                                series(unit=unit))
+                        any_CO2e_contributors = True
                 if any_CO2e_contributors:
                     setattr(ctx, f'Predicted_Annual_Emitted_CO2e_mass_{catpath}',
-                            SparseTimeSeries(unit=u.kt_CO2e, t_unit=u.year))
-
-            ctx.Predicted_Annual_Emitted_CO2_mass = SparseTimeSeries(
-                unit=u.kt_CO2, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_CH4_mass = SparseTimeSeries(
-                unit=u.kt_CH4, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_N2O_mass = SparseTimeSeries(
-                unit=u.kt_N2O, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_HFC_mass = SparseTimeSeries(
-                unit=u.kt_HFC, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_PFC_mass = SparseTimeSeries(
-                unit=u.kt_PFC, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_SF6_mass = SparseTimeSeries(
-                unit=u.kt_SF6, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_NF3_mass = SparseTimeSeries(
-                unit=u.kt_NF3, interpolation='no_interpolation', t_unit=u.year)
-            ctx.Predicted_Annual_Emitted_CO2e_mass = SparseTimeSeries(
-                unit=u.kt_CO2e, interpolation='no_interpolation', t_unit=u.year)
+                            series(unit=u.kt_CO2e))
+
+            ctx.Predicted_Annual_Emitted_CO2_mass = series(
+                unit=u.kt_CO2, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_CH4_mass = series(
+                unit=u.kt_CH4, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_N2O_mass = series(
+                unit=u.kt_N2O, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_HFC_mass = series(
+                unit=u.kt_HFC, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_PFC_mass = series(
+                unit=u.kt_PFC, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_SF6_mass = series(
+                unit=u.kt_SF6, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_NF3_mass = series(
+                unit=u.kt_NF3, interpolation='no_interpolation')
+            ctx.Predicted_Annual_Emitted_CO2e_mass = series(
+                unit=u.kt_CO2e, interpolation='no_interpolation')
 
             # XXX : what year do these numbers represent? How can this be a default value
             # when the simulated years are a parameter of the state?
-            ctx.Atmospheric_CO2_conc = SparseTimeSeries(unit=u.ppm, default_value=400.0 * u.ppm, t_unit=u.year)
-            ctx.Atmospheric_CH4_conc = SparseTimeSeries(unit=u.ppb, default_value=1775.0 * u.ppb, t_unit=u.year)
-            ctx.Atmospheric_N2O_conc = SparseTimeSeries(unit=u.ppb, default_value=336.0 * u.ppb, t_unit=u.year)
+            ctx.Atmospheric_CO2_conc = series(unit=u.ppm, default_value=400.0 * u.ppm)
+            ctx.Atmospheric_CH4_conc = series(unit=u.ppb, default_value=1775.0 * u.ppb)
+            ctx.Atmospheric_N2O_conc = series(unit=u.ppb, default_value=336.0 * u.ppb)
 
             # Gemini says these data are from NOAA and are accurate for January 2026
-            ctx.Atmospheric_HFC_conc = SparseTimeSeries(unit=u.ppb, default_value=0.1345 * u.ppb, t_unit=u.year)
-            ctx.Atmospheric_PFC_conc = SparseTimeSeries(unit=u.ppb, default_value=0.0902 * u.ppb, t_unit=u.year)
-            ctx.Atmospheric_SF6_conc = SparseTimeSeries(unit=u.ppb, default_value=0.0124 * u.ppb, t_unit=u.year)
-            ctx.Atmospheric_NF3_conc = SparseTimeSeries(unit=u.ppb, default_value=0.0036 * u.ppb, t_unit=u.year)
-
-            ctx.DeltaF_CO2 = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_CH4 = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_N2O = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_HFC = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_PFC = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_SF6 = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_NF3 = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_forcing = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
-            ctx.DeltaF_feedback = SparseTimeSeries(unit=u.petawatt, t_unit=u.year)
+            ctx.Atmospheric_HFC_conc = series(unit=u.ppb, default_value=0.1345 * u.ppb)
+            ctx.Atmospheric_PFC_conc = series(unit=u.ppb, default_value=0.0902 * u.ppb)
+            ctx.Atmospheric_SF6_conc = series(unit=u.ppb, default_value=0.0124 * u.ppb)
+            ctx.Atmospheric_NF3_conc = series(unit=u.ppb, default_value=0.0036 * u.ppb)
+
+            ctx.DeltaF_CO2 = series(unit=u.petawatt)
+            ctx.DeltaF_CH4 = series(unit=u.petawatt)
+            ctx.DeltaF_N2O = series(unit=u.petawatt)
+            ctx.DeltaF_HFC = series(unit=u.petawatt)
+            ctx.DeltaF_PFC = series(unit=u.petawatt)
+            ctx.DeltaF_SF6 = series(unit=u.petawatt)
+            ctx.DeltaF_NF3 = series(unit=u.petawatt)
+            ctx.DeltaF_forcing = series(unit=u.petawatt)
+            ctx.DeltaF_feedback = series(unit=u.petawatt)
 
             # Heat Energy forcing is the heat equivalent to net annual cashflow, an annual integral
-            ctx.Annual_Heat_Energy_forcing = SparseTimeSeries(default_value=0 * u.exajoule, t_unit=u.year)
-            ctx.Cumulative_Heat_Energy_forcing = SparseTimeSeries(default_value=0 * u.exajoule, t_unit=u.year)
-            ctx.Heat_Energy_imbalance = SparseTimeSeries(unit=u.exajoule, t_unit=u.year)
-            ctx.Cumulative_Heat_Energy = SparseTimeSeries(default_value=0.0 * u.exajoule, t_unit=u.year)
-            ctx.Ocean_Temperature_Anomaly = SparseTimeSeries(default_value=1.3 * u.kelvin, t_unit=u.year)
+            ctx.Annual_Heat_Energy_forcing = series(default_value=0 * u.exajoule)
+            ctx.Cumulative_Heat_Energy_forcing = series(default_value=0 * u.exajoule)
+            ctx.Heat_Energy_imbalance = series(unit=u.exajoule)
+            ctx.Cumulative_Heat_Energy = series(default_value=0.0 * u.exajoule)
+            ctx.Ocean_Temperature_Anomaly = series(default_value=1.3 * u.kelvin)
 
+        self.compile_registry(state)
         return int(state.t_now.to(u.years).magnitude + 1) * u.years
 
-    def step(self, state, current):
-
-        # add up annual emissions from registry
-        annual_CO2_mass = 0 * u.kt_CO2
-        annual_CH4_mass = 0 * u.kt_CH4
-        annual_N2O_mass = 0 * u.kt_N2O
-        annual_HFC_mass = 0 * u.kt_HFC
-        annual_PFC_mass = 0 * u.kt_PFC
-        annual_SF6_mass = 0 * u.kt_SF6
-        annual_NF3_mass = 0 * u.kt_NF3
-
+    def compile_registry(self, state):
+        """Compile the (closed) emissions registry into a sparse incidence
+        matrix from contributor STS to (catpath, GHG) tallies, so that step
+        can add them all up with a few vector operations.
+        """
+        tally = state.stash(self)
+        # step bypasses StateCurrent, so check its permissions here instead
+        readable = state.project_requires_current[self.identifier]
+        writeable = state.project_writes[self.identifier]
+        contributor_cols = {} # sts_key -> column
+        cols, factors, row_starts = [], [], []
+        tally.contributors = [] # by column
+        tally.row_sts = [] # Predicted_Annual_Emitted_<GHG>_mass_<catpath>, by row
+        row_ghg = [] # index into _tallied_ghgs, by row
+        catpath_starts = [] # index of the first row of each of tally.catpath_sts
+        tally.catpath_sts = [] # Predicted_Annual_Emitted_CO2e_mass_<catpath>
         for catpath, contributors in state.sectoral_emissions_contributors.items():
-            catpath_CO2e_mass = 0 * u.kg_CO2e
-            any_CO2e_contributors = False
-
-            catpath_CO2_contributors = contributors.get(GHG.CO2, [])
-            if catpath_CO2_contributors:
-                catpath_CO2_mass = sum(getattr(current, sts_key) for sts_key in catpath_CO2_contributors)
-                try:
-                    setattr(current, f'Predicted_Annual_Emitted_CO2_mass_{catpath}', catpath_CO2_mass)
-                except:
-                    print(catpath_CO2_contributors)
-                    raise
-                catpath_CO2e_mass += catpath_CO2_mass * CO2_GWP_100
-                annual_CO2_mass += catpath_CO2_mass
-                any_CO2e_contributors = True
-
-            catpath_CH4_contributors = contributors.get(GHG.CH4, [])
-            if catpath_CH4_contributors:
-                catpath_CH4_mass = sum(getattr(current, sts_key) for sts_key in catpath_CH4_contributors)
-                try:
-                    setattr(current, f'Predicted_Annual_Emitted_CH4_mass_{catpath}', catpath_CH4_mass)
-                except:
-                    print(catpath_CH4_contributors)
-                    raise
-                catpath_CO2e_mass += catpath_CH4_mass * CH4_GWP_100
-                annual_CH4_mass += catpath_CH4_mass
-                any_CO2e_contributors = True
-
-            catpath_N2O_contributors = contributors.get(GHG.N2O, [])
-            if catpath_N2O_contributors:
-                catpath_N2O_mass = sum(getattr(current, sts_key) for sts_key in catpath_N2O_contributors)
-                try:
-                    setattr(current, f'Predicted_Annual_Emitted_N2O_mass_{catpath}', catpath_N2O_mass)
-                except:
-                    print(catpath_N2O_contributors)
-                    raise
-                catpath_CO2e_mass += catpath_N2O_mass * N2O_GWP_100
-                annual_N2O_mass += catpath_N2O_mass
-                any_CO2e_contributors = True
-
-            catpath_HFC_contributors = contributors.get(GHG.HFCs, [])
-            if catpath_HFC_contributors:
-                catpath_HFC_mass = sum(getattr(current, sts_key) for sts_key in catpath_HFC_contributors)
-                setattr(current, f'Predicted_Annual_Emitted_HFC_mass_{catpath}', catpath_HFC_mass)
-                catpath_CO2e_mass += catpath_HFC_mass * HFC_GWP_100
-                annual_HFC_mass += catpath_HFC_mass
-                any_CO2e_contributors = True
-
-            catpath_PFC_contributors = contributors.get(GHG.PFCs, [])
-            if catpath_PFC_contributors:
-                catpath_PFC_mass = sum(getattr(current, sts_key) for sts_key in catpath_PFC_contributors)
-                setattr(current, f'Predicted_Annual_Emitted_PFC_mass_{catpath}', catpath_PFC_mass)
-                catpath_CO2e_mass += catpath_PFC_mass * PFC_GWP_100
-                annual_PFC_mass += catpath_PFC_mass
-                any_CO2e_contributors = True
-
-            catpath_SF6_contributors = contributors.get(GHG.SF6, [])
-            if catpath_SF6_contributors:
-                catpath_SF6_mass = sum(getattr(current, sts_key) for sts_key in catpath_SF6_contributors)
-                setattr(current, f'Predicted_Annual_Emitted_SF6_mass_{catpath}', catpath_SF6_mass)
-                catpath_CO2e_mass += catpath_SF6_mass * SF6_GWP_100
-                annual_SF6_mass += catpath_SF6_mass
-                any_CO2e_contributors = True
-
-            catpath_NF3_contributors = contributors.get(GHG.NF3, [])
-            if catpath_NF3_contributors:
-                catpath_NF3_mass = sum(getattr(current, sts_key) for sts_key in catpath_NF3_contributors)
-                setattr(current, f'Predicted_Annual_Emitted_NF3_mass_{catpath}', catpath_NF3_mass)
-                catpath_CO2e_mass += catpath_NF3_mass * NF3_GWP_100
-                annual_NF3_mass += catpath_NF3_mass
-                any_CO2e_contributors = True
-
-            if any_CO2e_contributors:
-                setattr(current, f'Predicted_Annual_Emitted_CO2e_mass_{catpath}', catpath_CO2e_mass)
+            catpath_start = len(tally.row_sts)
+            for ghg_idx, (ghg, name, unit, _) in enumerate(_tallied_ghgs):
+                if not contributors.get(ghg, []):
+                    continue
+                row_starts.append(len(cols))
+                for sts_key in contributors[ghg]:
+                    assert sts_key in readable, ('Tallying undeclared contributor', sts_key)
+                    sts = state.sts[sts_key]
+                    if sts_key not in contributor_cols:
+                        contributor_cols[sts_key] = len(tally.contributors)
+                        tally.contributors.append(sts)
+                    cols.append(contributor_cols[sts_key])
+                    factors.append(conversion_factor(sts.v_unit, unit))
+                row_key = f'Predicted_Annual_Emitted_{name}_mass_{catpath}'
+                assert row_key in writeable, ('Tallying into non-writeable attr', row_key)
+                tally.row_sts.append(state.sts[row_key])
+                row_ghg.append(ghg_idx)
+            if len(tally.row_sts) > catpath_start:
+                catpath_key = f'Predicted_Annual_Emitted_CO2e_mass_{catpath}'
+                assert catpath_key in writeable, ('Tallying into non-writeable attr', catpath_key)
+                catpath_starts.append(catpath_start)
+                tally.catpath_sts.append(state.sts[catpath_key])
+
+        # the samples of ensembles are carried along a trailing axis
+        tally.n_samples = n_samples_of(*tally.contributors)
+        tally.sample_shape = () if tally.n_samples is None else (tally.n_samples,)
+        trailing = (1,) * len(tally.sample_shape)
+        tally.cols = np.asarray(cols, dtype=np.intp)
+        tally.factors = np.asarray(factors, dtype='d').reshape((-1,) + trailing)
+        tally.row_starts = np.asarray(row_starts, dtype=np.intp)
+        tally.catpath_starts = np.asarray(catpath_starts, dtype=np.intp)
+        tally.row_gwp = np.asarray(
+            [_tallied_ghgs[ii][3] for ii in row_ghg], dtype='d').reshape((-1,) + trailing)
+        # to add up the rows of each GHG (that has any rows)
+        row_ghg = np.asarray(row_ghg, dtype=np.intp)
+        tally.ghg_order = np.argsort(row_ghg, kind='stable')
+        tally.ghgs, tally.ghg_starts = np.unique(row_ghg[tally.ghg_order], return_index=True)
+        # to convert the simulation time (in years) to each contributor's t_unit
+        tally.t_factors = [conversion_factor(_years, sts.t_unit) for sts in tally.contributors]
+
+    def step(self, state, current):
 
+        # add up annual emissions from registry (see compile_registry)
+        tally = state.stash(self)
+        t_now = state.t_now.magnitude # in years
+        values = np.empty((len(tally.contributors),) + tally.sample_shape)
+        for ii, (sts, t_factor) in enumerate(zip(tally.contributors, tally.t_factors)):
+            values[ii] = sts.query_raw(t_now * t_factor)
+        annual_masses = np.zeros((len(_tallied_ghgs),) + tally.sample_shape)
+        if len(tally.row_sts):
+            # the rows and catpaths are each contiguous runs, so the sparse
+            # matrix products are segmented sums
+            row_masses = np.add.reduceat(
+                tally.factors * values[tally.cols], tally.row_starts, axis=0)
+            catpath_CO2e_masses = np.add.reduceat(
+                row_masses * tally.row_gwp, tally.catpath_starts, axis=0)
+            annual_masses[tally.ghgs] = np.add.reduceat(
+                row_masses[tally.ghg_order], tally.ghg_starts, axis=0)
+
+            # the tallies were all declared with t_unit years, and the units of _tallied_ghgs
+            if tally.n_samples is None:
+                row_masses = row_masses.tolist()
+                catpath_CO2e_masses = catpath_CO2e_masses.tolist()
+            for sts, mass in zip(tally.row_sts, row_masses):
+                sts.append_raw(t_now, mass)
+            for sts, mass in zip(tally.catpath_sts, catpath_CO2e_masses):
+                sts.append_raw(t_now, mass)
+
+        (annual_CO2_mass,
+         annual_CH4_mass,
+         annual_N2O_mass,
+         annual_HFC_mass,
+         annual_PFC_mass,
+         annual_SF6_mass,
+         annual_NF3_mass) = [
+            u.Quantity(mass, unit)
+            for mass, (_, _, unit, _) in zip(
+                annual_masses.tolist() if tally.n_samples is None else annual_masses,
+                _tallied_ghgs)]
 
         current.Predicted_Annual_Emitted_CO2_mass = annual_CO2_mass
         current.Predicted_Annual_Emitted_CH4_mass = annual_CH4_mass
@@ -690,15 +1105,8 @@ class AtmosphericChemistry(BaseScenarioProject):
         current.Predicted_Annual_Emitted_PFC_mass = annual_PFC_mass
         current.Predicted_Annual_Emitted_SF6_mass = annual_SF6_mass
         current.Predicted_Annual_Emitted_NF3_mass = annual_NF3_mass
-        current.Predicted_Annual_Emitted_CO2e_mass = (
-            CO2_GWP_100 * annual_CO2_mass
-            + CH4_GWP_100 * annual_CH4_mass
-            + N2O_GWP_100 * annual_N2O_mass
-            + HFC_GWP_100 * annual_HFC_mass
-            + PFC_GWP_100 * annual_PFC_mass
-            + SF6_GWP_100 * annual_SF6_mass
-            + NF3_GWP_100 * annual_NF3_mass
-        )
+        current.Predicted_Annual_Emitted_CO2e_mass = u.Quantity(
+            _tallied_gwps @ annual_masses, _kt_CO2e)
 
         fraction_of_emitted_CO2_that_becomes_atmospheric = .45
 
@@ -867,6 +1275,16 @@ class GeometricHumanPopulationForecast(BaseScenarioProject):
         current.human_population *= self.rate
         return state.t_now + self.stepsize
 
+    def step_range(self, state, t0, t1):
+        times, t_next = step_times(t0, t1, self.stepsize)
+        population = state.sts['human_population'].query_before(t0)
+        # cumprod multiplies in the same order as repeated step() calls
+        factors = np.full(len(times) + 1, self.rate)
+        factors[0] = population.magnitude
+        return times, {
+            'human_population': u.Quantity(np.cumprod(factors)[1:], population.u),
+        }, t_next
+
 
 class ProjectComparison(object):
     def __init__(self, state_A, state_B, present, project):
@@ -956,6 +1374,114 @@ class ProjectComparison(object):
         return rval
 
 
+def _redefine_sts(obj, sts):
+    """Make `obj` hold the data of `sts` (see State.resimulate), keeping its
+    identity, identifier, writer and readers
+    """
+    assert obj.__class__ is sts.__class__
+    if isinstance(obj, STS):
+        for name in STS.__slots__:
+            if name not in ('identifier', 'writer', 'current_readers', '_version'):
+                setattr(obj, name, getattr(sts, name))
+        obj._version += 1
+    else:
+        keep = dict(
+            identifier=obj.identifier,
+            writer=obj.writer,
+            current_readers=obj.current_readers)
+        obj.__dict__.update(sts.__dict__)
+        obj.__dict__.update(keep)
+
+
+# the states of the ProjectEvaluation being run, inherited by forked workers
+_fork_states = None
+
+
+def _run_forked_state(idx, t_stop):
+    state = _fork_states[idx]
+    state.run_until(t_stop)
+    return _state_result(state)
+
+
+def _state_result(state, names=None):
+    """Return the outcome of running `state` as plain data that is cheap to
+    pickle: the time and value buffers of each STS (or just those in
+    `names`), and the scheduling metadata, but none of the DynamicElements
+    that produced them.
+    """
+    series = {}
+    for name, obj in state.sts.items():
+        if names is not None and name not in names:
+            continue
+        series[name] = dict(
+            times=np.array(obj.times, dtype='d'),
+            values=np.array(obj.values, dtype='d'),
+            t_unit=obj.t_unit,
+            v_unit=obj.v_unit,
+            interpolation=obj.interpolation.value,
+            max_query_time=obj.max_query_time)
+    return dict(
+        tick=state._tick,
+        t_now=state.t_now,
+        project_t_next=dict(state.project_t_next),
+        heap=list(state._heap),
+        sts_id_counter=state.sts_id_counter,
+        sts=series)
+
+
+def _apply_state_result(state, result):
+    """Copy `result` (from _state_result) into `state`, updating existing
+    STS objects in place so that references to them stay valid
+    """
+    for name, series in result['sts'].items():
+        obj = state.sts.get(name)
+        if obj is None:
+            if series['values'].ndim == 2:
+                obj = EnsembleSTS.from_arrays(
+                    times=series['times'],
+                    values=series['values'],
+                    t_unit=series['t_unit'],
+                    v_unit=series['v_unit'],
+                    interpolation=series['interpolation'],
+                    identifier=name)
+            else:
+                obj = STS(
+                    times=array.array('d'),
+                    values=array.array('d'),
+                    t_unit=series['t_unit'],
+                    v_unit=series['v_unit'],
+                    interpolation=series['interpolation'],
+                    identifier=name)
+            state.sts[name] = obj
+        obj.times = array.array('d', series['times'].tobytes())
+        if isinstance(obj, EnsembleSTS):
+            obj._set_values(series['values'])
+        else:
+            obj.values = array.array('d', series['values'].tobytes())
+            obj._edited()
+        obj.max_query_time = series['max_query_time']
+    state._tick = result['tick']
+    state._t_now = result['t_now']
+    state.project_t_next = result['project_t_next']
+    state._heap = result['heap']
+    state.sts_id_counter = result['sts_id_counter']
+    state.ran_in_worker = True
+
+
+def _default_n_workers():
+    return int(os.environ.get('PLANZERO_WORKERS', '1'))
+
+
+def _fork_context():
+    """Return the 'fork' multiprocessing context, or None where it isn't
+    available (workers must inherit module state, rather than unpickle it)
+    """
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
 class ProjectEvaluation(object):
     def __init__(self, projects, common_projects, alt_project=None, present=None):
         self.projects = projects # dict
@@ -985,9 +1511,35 @@ class ProjectEvaluation(object):
                 self.states[state_A.name] = state_A
                 self.states[default_state.name] = default_state
 
-    def run_until(self, t_stop):
-        for state in self.states.values():
-            state.run_until(t_stop)
+    def run_until(self, t_stop, n_workers=None):
+        """Run every state until t_stop.
+
+        With more than one worker (default: $PLANZERO_WORKERS, else 1) the
+        states, which are independent, are run in forked worker processes,
+        which send back only their STS buffers. Results are copied into
+        self.states in order, so the outcome doesn't depend on which worker
+        finishes first, but those states can't then be run any further.
+        """
+        global _fork_states
+        if n_workers is None:
+            n_workers = _default_n_workers()
+        states = list(self.states.values())
+        mp_context = _fork_context()
+        if n_workers <= 1 or len(states) <= 1 or mp_context is None:
+            for state in states:
+                state.run_until(t_stop)
+            return
+        _fork_states = states
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(n_workers, len(states)),
+                    mp_context=mp_context) as pool:
+                futures = [pool.submit(_run_forked_state, idx, t_stop)
+                           for idx in range(len(states))]
+                for state, future in zip(states, futures):
+                    _apply_state_result(state, future.result())
+        finally:
+            _fork_states = None
 
     def all_sts_names(self):
         rval = set()
@@ -1096,16 +1648,36 @@ class IPCC_Transport_RoadTransportation_LightDutyGasolineTrucks(BaseScenarioProj
         state.register_emission('Transport/Road_Transportation/Light-Duty_Gasoline_Trucks', GHG.CO2, 'Government_LightDutyGasolineTrucks_CO2')
         return state.t_now + self.stepsize
 
-    def step(self, state, current):
+    def emissions(self, human_population, government_ZEV_fraction, other_ZEV_fraction):
+        """Return (government, other) CO2 emissions, for scalar inputs from
+        step() or arrays of them from step_range()
+        """
         coefficient = 1_200 * u.kg_CO2 / u.people
-        current.Government_LightDutyGasolineTrucks_CO2 = (
-            current.human_population * coefficient * .025
-            * (1 * u.dimensionless - current.Government_LightDutyGasolineTrucks_ZEV_fraction))
-        current.Other_LightDutyGasolineTrucks_CO2 = (
-            current.human_population * coefficient * .975
-            * (1 * u.dimensionless - current.Other_LightDutyGasolineTrucks_ZEV_fraction))
+        return (
+            human_population * coefficient * .025
+            * (1 * u.dimensionless - government_ZEV_fraction),
+            human_population * coefficient * .975
+            * (1 * u.dimensionless - other_ZEV_fraction))
+
+    def step(self, state, current):
+        (current.Government_LightDutyGasolineTrucks_CO2,
+         current.Other_LightDutyGasolineTrucks_CO2) = self.emissions(
+            current.human_population,
+            current.Government_LightDutyGasolineTrucks_ZEV_fraction,
+            current.Other_LightDutyGasolineTrucks_ZEV_fraction)
         return state.t_now + self.stepsize
 
+    def step_range(self, state, t0, t1):
+        times, t_next = step_times(t0, t1, self.stepsize)
+        government_CO2, other_CO2 = self.emissions(
+            state.sts['human_population'].query_batch(times),
+            state.sts['Government_LightDutyGasolineTrucks_ZEV_fraction'].query_batch(times),
+            state.sts['Other_LightDutyGasolineTrucks_ZEV_fraction'].query_batch(times))
+        return times, {
+            'Government_LightDutyGasolineTrucks_CO2': government_CO2,
+            'Other_LightDutyGasolineTrucks_CO2': other_CO2,
+        }, t_next
+
 
 class SubsidyAccounting(BaseScenarioProject):
     """Tally up annual subsidy amounts required by barriers and strategies."""
@@ -1113,25 +1685,38 @@ class SubsidyAccounting(BaseScenarioProject):
     def on_add_project(self, state):
         for sts_key in state.subsidy_requirements:
             state.declare_read_current_sts(self, sts_key)
+        n_samples = n_samples_of(*(state.sts[sts_key] for sts_key in state.subsidy_requirements))
         with state.defining(self) as ctx:
-            ctx.AnnualSubsidyTotal = STS(
+            ctx.AnnualSubsidyTotal = ensemble_like(STS(
                 times=array.array('d', []),
                 values=array.array('d', [float('nan')]),
                 t_unit=u.year,
                 v_unit=u.CAD,
-                interpolation='no_interpolation')
+                interpolation='no_interpolation'), n_samples)
         return state.t_now.to('year').magnitude * u.year
 
+    @staticmethod
+    def total(subtotals, total):
+        """Return `total` (a zero, or array of zeros, in CAD) plus the
+        `subtotals`, for scalars from step() or arrays from step_range()
+        """
+        for subtotal in subtotals:
+            assert np.all(subtotal >= 0 * u.CAD) # sign convention and nan-check
+            total = total + subtotal
+        return total
+
     def step(self, state, current):
-        zero = 0 * u.CAD
-        total = zero
-        for sts_key in state.subsidy_requirements:
-            subtotal = getattr(current, sts_key)
-            assert subtotal >= zero # sign convention and nan-check
-            total += subtotal
-        current.AnnualSubsidyTotal = total
+        current.AnnualSubsidyTotal = self.total(
+            (getattr(current, sts_key) for sts_key in state.subsidy_requirements),
+            0 * u.CAD)
         return state.t_now + 1 * u.year
 
+    def step_range(self, state, t0, t1):
+        times, t_next = step_times(t0, t1, 1 * u.year)
+        return times, {'AnnualSubsidyTotal': self.total(
+            (state.sts[sts_key].query_batch(times) for sts_key in state.subsidy_requirements),
+            np.zeros(len(times)) * u.CAD)}, t_next
+
 from . import ipcc_canada
 from . import ghgvalues
 
@@ -333,6 +333,7 @@ class Cattle_Population(Barrier):
                     if isinstance(hc, sts.STS):
                         hc = hc.copy()
                         hc.values[0] = 0 # assume 0 instead of undefined
+                        hc._edited()
 
                         # extend by model rollout
                         for step in range(valid_steps):
@@ -411,18 +412,19 @@ class Bovaer_Adoption_Limit(Barrier):
         with state.requiring_current(self) as ctx:
             ctx.bovine_population_fraction_on_bovaer = sts.SparseTimeSeries(
                 default_value=0 * u.dimensionless, t_unit=u.years)
+        n_samples = sts.n_samples_of(state.sts['bovine_population_fraction_on_bovaer'])
 
         with state.defining(self) as ctx:
-            ctx.max_fraction_of_cattle_on_bovaer = sts.SparseTimeSeries(
-                default_value=0 * u.dimensionless)
-            ctx.too_many_cattle_on_bovaer = sts.SparseTimeSeries(
-                default_value=0 * u.dimensionless)
+            ctx.max_fraction_of_cattle_on_bovaer = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.dimensionless), n_samples)
+            ctx.too_many_cattle_on_bovaer = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.dimensionless), n_samples)
         # use syntax ctx.too_many_cattle_on_bovaer = Monitor(sts.SparseTimeSeries(...))
         #state.register_monitor('too_many_cattle_on_bovaer')
         return 2025 * u.years
 
     def step(self, state, current):
-        current.max_fraction_of_cattle_on_bovaer = min(
+        current.max_fraction_of_cattle_on_bovaer = np.minimum(
             (current.bovine_population_fraction_on_bovaer
              + self.max_increase_rate * 1.0 * u.year),
             (1 - self.organic_fraction) * u.dimensionless)
@@ -520,6 +522,11 @@ class Cattle_Enteric_Emissions(Barrier):
             for hc in hc_by_livestock_pt.values():
                 state.declare_sts(self, hc, need_current=True)
 
+        # the outputs are ensembles if the inputs of step() are (see sts.EnsembleSTS)
+        n_samples = sts.n_samples_of(
+            state.sts['bovine_population_fraction_on_bovaer'],
+            state.sts['bovaer_production_CO2_per_methane_abated'])
+
         with state.defining(self) as ctx:
             emfac = table_A3p4_11()
             stash.headcounts = []
@@ -553,10 +560,14 @@ class Cattle_Enteric_Emissions(Barrier):
                 else:
                     bovine_methane += hc * emfac[livestock]
 
-            ctx.bovine_methane_rate = bovine_methane.to(u.kt_CH4 / u.year)
-            ctx.bovaer_cost = sts.SparseTimeSeries(default_value=0 * u.mega_CAD / u.year, t_unit=u.year)
-            ctx.bovaer_cost_annual = sts.SparseTimeSeries(default_value=0 * u.mega_CAD, t_unit=u.year)
-            ctx.bovaer_headcount = sts.SparseTimeSeries(default_value=0 * u.cattle, t_unit=u.year)
+            ctx.bovine_methane_rate = sts.ensemble_like(
+                bovine_methane.to(u.kt_CH4 / u.year), n_samples)
+            ctx.bovaer_cost = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.mega_CAD / u.year, t_unit=u.year), n_samples)
+            ctx.bovaer_cost_annual = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.mega_CAD, t_unit=u.year), n_samples)
+            ctx.bovaer_headcount = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.cattle, t_unit=u.year), n_samples)
 
             last_complete_year = int(bovine_methane.times[-1])
 
@@ -567,7 +578,8 @@ class Cattle_Enteric_Emissions(Barrier):
             #     in this simulation, the reported totals for e.g. 2023 should be associated
             #     with the time point 2024 * u.years, because that's the
             #     trailing integral boundary.
-            ctx.bovine_methane_annual = correct.delay(1 * u.year).to(u.kt_CH4)
+            ctx.bovine_methane_annual = sts.ensemble_like(
+                correct.delay(1 * u.year).to(u.kt_CH4), n_samples)
 
             # TODO: we shouldn't get ahead of ourselves. The cattle population might be
             # forecast out to 2028, but the strategy of administering Bovaer might start
@@ -581,11 +593,11 @@ class Cattle_Enteric_Emissions(Barrier):
             # input variables, and not advance past that point?
             # (^^ This seems like the right way.)
 
-            ctx.bovaer_production_CO2 = sts.SparseTimeSeries(
-                default_value=0 * u.kt_CO2 / u.year)
-            ctx.bovaer_production_CO2_annual = sts.SparseTimeSeries(
+            ctx.bovaer_production_CO2 = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.kt_CO2 / u.year), n_samples)
+            ctx.bovaer_production_CO2_annual = sts.ensemble_like(sts.SparseTimeSeries(
                 default_value=0 * u.kt_CO2,
-                t_unit=u.year)
+                t_unit=u.year), n_samples)
 
         state.register_emission('Enteric_Fermentation', 'CH4',
                                 'bovine_methane_annual')
@@ -614,7 +626,7 @@ class Cattle_Enteric_Emissions(Barrier):
         for ob, hc, livestock in zip(stash.on_bovaer, stash.headcounts, stash.livestock_type):
             hc_now = hc.query(state.t_now)
             ob_now = hc_now * frac
-            assert 0 <= frac <= 1
+            assert np.all((0 <= frac) & (frac <= 1))
             ob.append(state.t_now, ob_now)
             emfac_now = emfac[livestock].query(state.t_now)
             methane_potential = hc_now * emfac_now
@@ -706,12 +718,13 @@ class Bovaer_Monitoring(Barrier):
     def on_add_project(self, state):
         with state.requiring_current(self) as ctx:
             ctx.bovaer_headcount = sts.SparseTimeSeries(default_value=0 * u.cattle, t_unit=u.year)
+        n_samples = sts.n_samples_of(state.sts['bovaer_headcount'])
 
         with state.defining(self) as ctx:
-            ctx.bovaer_monitoring_cost_annual_total = sts.SparseTimeSeries(
-                default_value=0 * u.mega_CAD, t_unit=u.year)
-            ctx.bovaer_farmer_subsidy_annual_total = sts.SparseTimeSeries(
-                default_value=0 * u.mega_CAD, t_unit=u.year)
+            ctx.bovaer_monitoring_cost_annual_total = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.mega_CAD, t_unit=u.year), n_samples)
+            ctx.bovaer_farmer_subsidy_annual_total = sts.ensemble_like(sts.SparseTimeSeries(
+                default_value=0 * u.mega_CAD, t_unit=u.year), n_samples)
 
         state.register_subsidy_requirement('bovaer_monitoring_cost_annual_total')
 
@@ -597,7 +597,7 @@ class Est_Energy_SCS_OilAndGas_Extraction(object):
                     = nse[:,
                           naics_code,
                           EmissionSource.StationaryFuelCombustion
-                         ]
+                         ].dense()
 
     def init_petrinex_SK(self):
         from .petrinex import (
@@ -677,6 +677,7 @@ class Est_Energy_SCS_OilAndGas_Extraction(object):
         assert idx_2022 > 2
         emissions[GHG.CO2, PT.AB].values[1:idx_2022] \
                 = array.array('d', [emissions[GHG.CO2, PT.AB].values[idx_2022]] * (idx_2022 - 1))
+        emissions[GHG.CO2, PT.AB]._edited()
 
         ch4_factors = sts.annual_report2(
             years=eccc_nir_annex6.df_a6_1_4.Year,
@@ -746,7 +747,8 @@ class Est_Energy_SCS_OilAndGas_Extraction(object):
             stacked_series=[
                 EChartSeriesStackElem(
                     name=label,
-                    data=_rstrip_data((GWP_100 @ emissions).sum(PT).to(u.Mt_CO2e)))
+                    data=_rstrip_data(objtensor.contract(
+                        GWP_100, sts.lazy(emissions), over=(GHG, PT)).to(u.Mt_CO2e)))
                 for label, emissions in self.emissions_by_label.items()
             ],
             other_series=[
@@ -801,7 +803,8 @@ class Est_SCS_Residential(object):
             stacked_series=[
                 EChartSeriesStackElem(
                     name=label,
-                    data=_rstrip_data((GWP_100 @ emissions).sum(PT).to(u.Mt_CO2e)))
+                    data=_rstrip_data(objtensor.contract(
+                        GWP_100, sts.lazy(emissions), over=(GHG, PT)).to(u.Mt_CO2e)))
                 for label, emissions in self.emissions_by_label.items()
             ],
             other_series=[
@@ -836,7 +839,8 @@ class Est_Transport(object):
             stacked_series=[
                 EChartSeriesStackElem(
                     name=label,
-                    data=_rstrip_data((GWP_100 @ emissions).sum(PT).to(u.Mt_CO2e)))
+                    data=_rstrip_data(objtensor.contract(
+                        GWP_100, sts.lazy(emissions), over=(GHG, PT)).to(u.Mt_CO2e)))
                 for label, emissions in self.emissions_by_label.items()
             ],
             other_series=[
@@ -996,7 +1000,8 @@ class Est_EntericFermentation(object):
             stacked_series=[
                 EChartSeriesStackElem(
                     name=label,
-                    data=_rstrip_data((GWP_100 @ emissions).sum(PT).to(u.Mt_CO2e)))
+                    data=_rstrip_data(objtensor.contract(
+                        GWP_100, sts.lazy(emissions), over=(GHG, PT)).to(u.Mt_CO2e)))
                 for label, emissions in self.emissions_by_label.items()
             ],
             other_series=[
@@ -1027,7 +1032,8 @@ class EstSectorEmissions(object):
 
     def max_gap_2005(self, thresh_Mt=1000):
         a9_2005_total = eccc_nir_annex9.emissions_by_IPCC_sector(2005, 'Total_CO2e')
-        estimate = GWP_100 @ self.sectoral_emissions.sum(enums.PT)
+        estimate = objtensor.contract(
+            GWP_100, self.sectoral_emissions, over=(GHG, enums.PT))
         gaps = []
         for keys, buf_offset in estimate.ravel_keys_offsets():
             sector, = keys
@@ -295,7 +295,8 @@ class EstForestAndHarvestedWoodProducts(object):
 
         fig, (ax0, ax1) = plt.subplots(1, 2)
 
-        forest = (GWP_100 @ self.forest_emissions.sum(PT)).to(u.kt_CO2e)
+        forest = objtensor.contract(
+            GWP_100, self.forest_emissions, over=(GHG, PT)).to(u.kt_CO2e)
         ax0.scatter(
             forest.times,
             forest.values[1:],
@@ -307,7 +308,8 @@ class EstForestAndHarvestedWoodProducts(object):
             label='NIR')
         ax0.set_title('Forest')
 
-        hwp = (GWP_100 @ self.HWP_emissions.sum(PT)).to(u.kt_CO2e)
+        hwp = objtensor.contract(
+            GWP_100, self.HWP_emissions, over=(GHG, PT)).to(u.kt_CO2e)
         ax1.scatter(
             hwp.times,
             hwp.values[1:],
@@ -329,7 +331,7 @@ class EstForestAndHarvestedWoodProducts(object):
         years = ipcc_canada.echart_years()
         values = _echart_reference_NIR_values('Forest Land')
 
-        forest_co2e = GWP_100 @ self.forest_emissions.sum(PT)
+        forest_co2e = objtensor.contract(GWP_100, self.forest_emissions, over=(GHG, PT))
 
         return StackedAreaEChart(
             div_id='ipcc_chart_forest_land',
@@ -357,13 +359,13 @@ class EstForestAndHarvestedWoodProducts(object):
         values = _echart_reference_NIR_values('Harvested Wood Products')
 
         ts_dict = {
-            (rpc, 'captured'): -GWP_100 @ self.HWP_captured[:, rpc].sum(PT)
+            (rpc, 'captured'): -objtensor.contract(GWP_100, self.HWP_captured[:, rpc], over=(GHG, PT))
             for rpc in RPC if rpc != RPC.Fuelwood_and_Firewood}
         ts_dict.update({
-            (rpc, 'released'): GWP_100 @ self.HWP_released[:, rpc].sum(PT)
+            (rpc, 'released'): objtensor.contract(GWP_100, self.HWP_released[:, rpc], over=(GHG, PT))
             for rpc in RPC if True or rpc != RPC.Fuelwood_and_Firewood})
 
-        net_emissions = GWP_100 @ self.HWP_emissions.sum(PT)
+        net_emissions = objtensor.contract(GWP_100, self.HWP_emissions, over=(GHG, PT))
 
         return StackedAreaEChart(
             div_id='ipcc_chart_hwp',
@@ -53,7 +53,7 @@ def from_ghgrp():
         EmissionSource.IndustrialProcess,
         EmissionSource.Wastewater,
     )
-    rval = nse[:, oil_and_gas, arguably_venting].sum(2).sum(1)
+    rval = nse[:, oil_and_gas, arguably_venting].sum(2).sum(1).dense()
     return rval
 
 
@@ -78,6 +78,7 @@ def from_st60b():
         new_times = list(range(2004, 2020))
         ch4_vt.times[0:0] = array.array('d', new_times)
         ch4_vt.values[1:1] = array.array('d', [ch4_vt.values[1]] * len(new_times))
+        ch4_vt._edited()
         rval[label] = ch4_vt
     return rval
 
@@ -155,7 +156,7 @@ class EstFugitive_OilandNaturalGas_Venting(object):
             PT.SK, include_ghgrp=False).sum(FacilityType)
         # I don't really know what all the activities mean
         # but Vent may be the only emission type for the IPCC Venting category
-        self.vSK = self.petrinex_SK[self.SK_venting_products, ActivityID.Vent]
+        self.vSK = self.petrinex_SK[self.SK_venting_products, ActivityID.Vent].dense()
         emissions = GHG_PT_zeros()
         emissions[:, PT.SK] = (factors * self.vSK).sum(1)
         self.emissions_by_label['Petrinex Vent (Saskatchewan)'] = emissions
@@ -241,7 +242,8 @@ class EstFugitive_OilandNaturalGas_Venting(object):
             stacked_series=[
                 EChartSeriesStackElem(
                     name=label,
-                    data=_rstrip_data((GWP_100 @ emissions).sum(PT).to(u.Mt_CO2e)))
+                    data=_rstrip_data(objtensor.contract(
+                        GWP_100, emissions, over=(GHG, PT)).to(u.Mt_CO2e)))
                 for label, emissions in self.emissions_by_label.items()
                 if label != 'Historical modelling gap'
             ],
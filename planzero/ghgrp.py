@@ -341,9 +341,8 @@ def GHG_NAICS_source_emissions(
     This is better for emissions accounting than facility_source_emissions in
     principle because a facility's NAICS code may change from year to year.
     """
-    rval = objtensor.empty(GHG, NAICS6, EmissionSource, PT)
-    for ghg in GHG:
-        rval[ghg].fill(0 * kt_by_ghg[ghg])
+    zero = objtensor.from_dict({ghg: 0 * kt_by_ghg[ghg] for ghg in GHG})
+    rval = objtensor.sparse(GHG, NAICS6, EmissionSource, PT, zero=zero[:, None, None, None])
     source_emission_dict = source_emission_dict or _NAICS_source_emission_dict(nan_value_as_zero)
     basis_years = list(range(min_year_inclusive, max_year_exclusive))
     for (naics, em_src, es_ghg, pt), val_by_year in source_emission_dict.items():
@@ -358,7 +357,7 @@ def GHG_NAICS_source_emissions(
         quant = quant_by_ESKey[es_ghg]
         rval[ESKeyGHGs[es_ghg], naics, em_src, pt] = sts.annual_report2(
             years=years,
-            values=[vv * quant.magnitude for vv in values],
+            values=np.asarray(values, dtype='d') * quant.magnitude,
             v_unit=quant.u)
     return rval
 
@@ -91,8 +91,15 @@ class EChartSeriesBase(BaseModel):
     data: list[float | EChartSeriesDataElem]
 
 
-def EChartSeriesData(sts, times, v_unit, url):
-    values = sts.query(times).to(v_unit).magnitude
+def EChartSeriesData(sts, times, v_unit, url, quantile=None):
+    # for an ensemble (sts.EnsembleSTS), chart a quantile over samples,
+    # e.g. quantile=0.05 and 0.95 for a p5-p95 band (default: median)
+    if hasattr(sts, 'quantile_batch'):
+        values = sts.quantile_batch(
+            times, 0.5 if quantile is None else quantile).to(v_unit).magnitude
+    else:
+        assert quantile is None
+        values = sts.query(times).to(v_unit).magnitude
     return [{'value': float(vv) if vv == vv else 0, 'url': url}
             for vv in values]
 
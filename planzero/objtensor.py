@@ -1,9 +1,12 @@
 import enum
 import itertools
+import operator
 
 import numpy as np
 import pint
 
+from .ureg import ureg, conversion_factor
+
 def print_dims(msg, dims):
     for ii, dim in enumerate(dims):
         print(msg, ii, dim)
@@ -71,18 +74,164 @@ def squeeze_dims_strides(dims, strides, axis=None):
         return new_dims, new_strides
 
 
-def ravel_keys_offsets(dims, strides, offset):
+# Dims are interned: as_dims returns one shared dict per distinct ordered
+# key tuple, and getitem_helper one shared view per (dim, key subset), so
+# that compatibility checks and plan lookups can usually compare identities.
+# N.B. dims must never be modified in place.
+# The tables are keyed by (type, key) pairs because str-valued Enum members
+# of different classes compare and hash equal, and they are dropped
+# wholesale once they reach _MAX_INTERNED entries; dims interned before
+# that keep working, they just take the uncached paths.
+_MAX_INTERNED = 10000
+_canonical_dims = {}  # typed key tuple -> dim
+_canonical_ids = {}   # id(dim) -> dim, for the above
+_subset_dims = {}     # (id(dim), typed subset) -> view of dim
+_interned = {}        # id(dim) -> dim, for all of the above
+_keysets = {}         # id(dim) -> frozenset of its keys
+_take_idxs = {}       # (id(dim), id(r_dim)) -> index of r_dim's keys in dim
+
+
+def _is_interned(dim):
+    return _interned.get(id(dim)) is dim
+
+
+def _typed_keys(keys):
+    return tuple((type(key), key) for key in keys)
+
+
+def _clear_interned():
+    # the id-keyed caches are only valid while the tables keep their dims
+    # alive, so everything goes at once
+    for table in (_canonical_dims, _canonical_ids, _subset_dims, _interned,
+                  _keysets, _take_idxs, _ravel_keys, _ravel_plans):
+        table.clear()
+
+
+def intern_dim(keys):
+    """Return the canonical dim (a dict from key to index) for the
+    ordered `keys`, which may be an Enum class, sequence, or dim
+    """
+    if _canonical_ids.get(id(keys)) is keys:
+        return keys
+    keys = tuple(keys)
+    typed_keys = _typed_keys(keys)
+    try:
+        return _canonical_dims[typed_keys]
+    except KeyError:
+        pass
+    if len(_interned) >= _MAX_INTERNED:
+        _clear_interned()
+    dim = _canonical_dims[typed_keys] = {key: ii for ii, key in enumerate(keys)}
+    _canonical_ids[id(dim)] = _interned[id(dim)] = dim
+    return dim
+
+
+def subset_dim(dim, subset):
+    """Return `dim` restricted to the keys in `subset` (an Enum class or
+    sequence of keys), keeping their indexes into dim
+    """
+    if not _is_interned(dim):
+        return {key: dim[key] for key in subset}
+    cache_key = (id(dim), subset if isinstance(subset, type) else _typed_keys(subset))
+    try:
+        return _subset_dims[cache_key]
+    except KeyError:
+        pass
+    if len(_interned) >= _MAX_INTERNED:
+        _clear_interned()
+        return {key: dim[key] for key in subset}
+    view = _subset_dims[cache_key] = {key: dim[key] for key in subset}
+    _interned[id(view)] = view
+    return view
+
+
+def dim_keyset(dim):
+    if _is_interned(dim):
+        try:
+            return _keysets[id(dim)]
+        except KeyError:
+            rval = _keysets[id(dim)] = frozenset(dim)
+            return rval
+    return frozenset(dim)
+
+
+def same_keys(a_dim, b_dim):
+    return a_dim is b_dim or dim_keyset(a_dim) == dim_keyset(b_dim)
+
+
+def take_idxs(dim, r_dim):
+    """Return an intp ndarray of the indexes in `dim` of the keys of `r_dim`"""
+    cacheable = _is_interned(dim) and _is_interned(r_dim)
+    if cacheable:
+        try:
+            return _take_idxs[id(dim), id(r_dim)]
+        except KeyError:
+            pass
+    rval = np.fromiter((dim[key] for key in r_dim), dtype=np.intp, count=len(r_dim))
+    if cacheable:
+        rval.flags.writeable = False
+        if len(_take_idxs) >= _MAX_INTERNED:
+            _take_idxs.clear()
+        _take_idxs[id(dim), id(r_dim)] = rval
+    return rval
+
+
+# ravel plans depend only on the layout, so they are compiled once per
+# (dims, strides) and shared by every tensor with that layout
+_MAX_RAVEL_PLANS = 10000
+_ravel_keys = {}
+_ravel_plans = {}
+
+
+def _dims_signature(dims):
+    if all(dim_i is None or _is_interned(dim_i) for dim_i in dims):
+        return tuple(None if dim_i is None else id(dim_i) for dim_i in dims)
+    return tuple(None if dim_i is None else tuple((type(key), key, idx) for key, idx in dim_i.items())
+                 for dim_i in dims)
+
+
+def ravel_plan(dims, strides):
+    """Return (keys, offsets) of the elements of a tensor with `dims` and
+    `strides` at offset 0, in ravel (sorted-key) order.
+
+    `keys` is a tuple shared by all plans whose dims have the same keys in
+    the same order, and `offsets` is an intp ndarray.
+    """
+    dims_sig = _dims_signature(dims)
+    plan_sig = (dims_sig, tuple(strides))
+    try:
+        return _ravel_plans[plan_sig]
+    except KeyError:
+        pass
+    if len(_ravel_plans) >= _MAX_RAVEL_PLANS:
+        _ravel_keys.clear()
+        _ravel_plans.clear()
     no_none_dims, no_none_strides = squeeze_dims_strides(dims, strides)
+    keys = []
+    offsets = []
     for key_idx_tuple in itertools.product(*[sorted(dim_i.items()) for dim_i in no_none_dims]):
         key, idx_offset = key_idx_dot(key_idx_tuple, no_none_strides)
-        yield tuple(key), (offset + idx_offset)
+        keys.append(tuple(key))
+        offsets.append(idx_offset)
+    keys = _ravel_keys.setdefault(dims_sig, tuple(keys))
+    plan = _ravel_plans[plan_sig] = (keys, np.asarray(offsets, dtype=np.intp))
+    return plan
+
+
+def ravel_keys_offsets(dims, strides, offset):
+    keys, offsets = ravel_plan(dims, strides)
+    return zip(keys, (offsets + offset).tolist())
 
 
 def ravel_multi(*ots):
-    for key_offs in zip(*[ot.ravel_keys_offsets() for ot in ots]):
-        keys, offs = zip(*key_offs)
-        key, = set(keys)
-        yield key, offs
+    plans = [ravel_plan(ot.dims, ot.strides) for ot in ots]
+    keys = plans[0][0]
+    for other_keys, _ in plans[1:]:
+        # same dims share one keys tuple, so the usual case skips comparing
+        if other_keys is not keys and other_keys != keys:
+            raise DimsMismatch(ots[0].dims, ots[1:])
+    offs = [(offsets + ot.offset).tolist() for ot, (_, offsets) in zip(ots, plans)]
+    return zip(keys, zip(*offs))
 
 
 def dims_are_ravel_compatible(aa_dims, bb_dims, cc_dims=None):
@@ -91,7 +240,7 @@ def dims_are_ravel_compatible(aa_dims, bb_dims, cc_dims=None):
     for aa_dim_i, bb_dim_i, cc_dim_i in zip(aa_dims, bb_dims, cc_dims):
         if aa_dim_i is None and bb_dim_i is None and cc_dim_i is None:
             continue
-        if set(aa_dim_i) == set(bb_dim_i) == set(cc_dim_i):
+        if same_keys(aa_dim_i, bb_dim_i) and same_keys(bb_dim_i, cc_dim_i):
             continue
         return False
     return True
@@ -113,7 +262,7 @@ def elemwise_binary_op_dims(a_dims, b_dims):
         elif a_dim is not None and b_dim is None:
             r_dims.append(a_dim)
         else:
-            if set(a_dim) == set(b_dim):
+            if same_keys(a_dim, b_dim):
                 r_dims.append(a_dim)
             else:
                 raise DimsMismatch(a_dim, b_dim)
@@ -124,6 +273,164 @@ class DimsMismatch(Exception):
     pass
 
 
+def _is_pint_scalar(obj):
+    return isinstance(obj, pint.Quantity) and isinstance(obj.magnitude, (int, float))
+
+
+def sum_objs(objs):
+    """Return the sum of `objs`, or None if there are none.
+
+    Pint scalars are summed as floats in the units of the first one, with one
+    cached conversion factor per unit, rather than via Quantity.__add__.
+    """
+    objs = list(objs)
+    if not objs:
+        return None
+    if all(_is_pint_scalar(obj) for obj in objs):
+        unit = objs[0].u
+        total = 0.0
+        for obj in objs:
+            total += obj.magnitude * conversion_factor(obj.u, unit)
+        return total * unit
+    for obj in objs:
+        if not _is_pint_scalar(obj):
+            accumulate = _accumulators.get(obj.__class__)
+            if accumulate is not None:
+                rval = accumulate(objs)
+                if rval is not NotImplemented:
+                    return rval
+            break
+    rval = objs[0]
+    for obj in objs[1:]:
+        rval += obj
+    return rval
+
+
+_unit_products = {}
+_unit_quotients = {}
+
+
+def _unit_array(unit):
+    """Return a 0-d object ndarray holding `unit`"""
+    rval = np.empty((), dtype=object)
+    rval[()] = unit
+    return rval
+
+
+def _units_mul(a_units, b_units):
+    """Elementwise product of two (broadcastable) object ndarrays of pint Units"""
+    a_units, b_units = np.broadcast_arrays(a_units, b_units)
+    rval = np.empty(a_units.shape, dtype=object)
+    rval_flat = rval.reshape(-1)
+    for ii, (ua, ub) in enumerate(zip(a_units.flat, b_units.flat)):
+        try:
+            rval_flat[ii] = _unit_products[ua, ub]
+        except KeyError:
+            rval_flat[ii] = _unit_products[ua, ub] = ua * ub
+    return rval
+
+
+def _units_div(a_units, b_units):
+    """Elementwise quotient of two (broadcastable) object ndarrays of pint Units"""
+    a_units, b_units = np.broadcast_arrays(a_units, b_units)
+    rval = np.empty(a_units.shape, dtype=object)
+    rval_flat = rval.reshape(-1)
+    for ii, (ua, ub) in enumerate(zip(a_units.flat, b_units.flat)):
+        try:
+            rval_flat[ii] = _unit_quotients[ua, ub]
+        except KeyError:
+            rval_flat[ii] = _unit_quotients[ua, ub] = ua / ub
+    return rval
+
+
+def _conversion_factors(src_units, dst_units):
+    """Elementwise conversion_factor of two (broadcastable) object ndarrays of pint Units"""
+    src_units, dst_units = np.broadcast_arrays(src_units, dst_units)
+    rval = np.empty(src_units.shape)
+    rval_flat = rval.reshape(-1)
+    for ii, (src, dst) in enumerate(zip(src_units.flat, dst_units.flat)):
+        rval_flat[ii] = 1.0 if src is dst else conversion_factor(src, dst)
+    return rval
+
+
+class NumericBuffer(object):
+    """A list-like buffer for ObjectTensor that stores pint scalars as a float
+    ndarray of magnitudes plus an object ndarray of their units.
+
+    Storing anything other than a pint scalar converts the buffer (in place,
+    so that views see it too) to a plain list of objects; see `is_numeric`.
+    """
+
+    def __init__(self, mags, units):
+        self.mags = mags
+        self.units = units
+        self.objs = None
+
+    @classmethod
+    def from_objs(cls, objs):
+        """Return a NumericBuffer of `objs` if they are all pint scalars, else None"""
+        if not objs or not all(_is_pint_scalar(obj) for obj in objs):
+            return None
+        units = np.empty(len(objs), dtype=object)
+        units[:] = [obj.u for obj in objs]
+        return cls(
+            mags=np.asarray([obj.magnitude for obj in objs], dtype='d'),
+            units=units)
+
+    @property
+    def is_numeric(self):
+        return self.objs is None
+
+    def spill(self):
+        """Convert to a plain list of objects"""
+        if self.objs is None:
+            self.objs = [mm * uu for mm, uu in zip(self.mags.tolist(), self.units)]
+            self.mags = None
+            self.units = None
+        return self.objs
+
+    def __len__(self):
+        if self.objs is None:
+            return len(self.mags)
+        return len(self.objs)
+
+    def __getitem__(self, idx):
+        if self.objs is not None:
+            return self.objs[idx]
+        if isinstance(idx, slice):
+            return [mm * uu for mm, uu in zip(self.mags[idx].tolist(), self.units[idx])]
+        return float(self.mags[idx]) * self.units[idx]
+
+    def __setitem__(self, idx, value):
+        if self.objs is None and not isinstance(idx, slice) and _is_pint_scalar(value):
+            self.mags[idx] = value.magnitude
+            self.units[idx] = value.u
+        else:
+            self.spill()[idx] = value
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f'NumericBuffer({self[:]})'
+
+
+def _is_numeric(ot):
+    return isinstance(ot.buf, NumericBuffer) and ot.buf.is_numeric
+
+
+def _as_numeric_scalar(other):
+    """Return (magnitude, unit) for a number or pint scalar, else None"""
+    if _is_pint_scalar(other):
+        return float(other.magnitude), other.u
+    elif isinstance(other, (int, float)) and not isinstance(other, bool):
+        return float(other), None
+    return None
+
+
 class ObjectTensor(object):
 
     # Pydantic BaseModel was slightly comforting, but
@@ -143,6 +450,8 @@ class ObjectTensor(object):
         assert len(strides) == len(dims)
 
     def copy(self):
+        if _is_numeric(self):
+            return self._numeric_gather(self.dims)
         rval = ObjectTensor.empty(*self.dims)
         rval.update(self)
         return rval
@@ -182,7 +491,7 @@ class ObjectTensor(object):
             if dim is None:
                 unpacked_dims.append(None)
             else:
-                unpacked_dims.append({dimval:ii for ii, dimval in enumerate(dim)})
+                unpacked_dims.append(intern_dim(dim))
         return unpacked_dims
 
     @classmethod
@@ -201,8 +510,92 @@ class ObjectTensor(object):
         size = size_from_dims(dims)
         strides = strides_from_dims(dims)
         buf = list(dct.values())
+        buf = NumericBuffer.from_objs(buf) or buf
         return cls(dims=dims, strides=strides, offset=0, buf=buf)
 
+    def packed(self):
+        """Return a contiguous copy backed by a NumericBuffer if all elements
+        are pint scalars, or else self.
+        """
+        if _is_numeric(self):
+            return self
+        objs = list(self.ravel())
+        buf = NumericBuffer.from_objs(objs)
+        if buf is None:
+            return self
+        dims = self.as_dims(self.dims)
+        rval = ObjectTensor(dims=dims, strides=strides_from_dims(dims), offset=0, buf=buf)
+        # ravel() goes in sorted-key order, which may differ from dims order
+        for (key, off), obj in zip(rval.ravel_keys_offsets(), objs):
+            rval.buf[off] = obj
+        return rval
+
+    def _numeric_offsets(self, r_dims):
+        """Return an ndarray (shaped like `r_dims`) of offsets into self.buf
+        of the elements at each position of a contiguous tensor with dims
+        `r_dims`, to which self must already be broadcast.
+        """
+        assert len(r_dims) == len(self.dims)
+        offsets = np.full(shape_from_dims(r_dims), self.offset, dtype=np.intp)
+        for ii, (r_dim, dim_i, stride_i) in enumerate(zip(r_dims, self.dims, self.strides)):
+            if r_dim is None or stride_i == 0:
+                continue
+            idxs = take_idxs(dim_i, r_dim)
+            shape = [1] * len(r_dims)
+            shape[ii] = len(r_dim)
+            offsets = offsets + (idxs * stride_i).reshape(shape)
+        return offsets
+
+    def _numeric_gather(self, r_dims):
+        """Return (mags, units) ndarrays shaped like `r_dims`"""
+        offsets = self._numeric_offsets(r_dims)
+        return self.buf.mags[offsets], self.buf.units[offsets]
+
+    @classmethod
+    def _from_numeric(cls, r_dims, mags, units):
+        dims = cls.as_dims(r_dims)
+        shape = shape_from_dims(dims)
+        buf = NumericBuffer(
+            mags=np.ascontiguousarray(np.broadcast_to(mags, shape), dtype='d').reshape(-1),
+            units=np.array(np.broadcast_to(units, shape), dtype=object).reshape(-1))
+        return cls(dims=dims, strides=strides_from_dims(dims), offset=0, buf=buf)
+
+    def _numeric_binary(self, other, op):
+        """Return self `op` other via ndarrays if both are numeric, else None"""
+        if not _is_numeric(self):
+            return None
+        if isinstance(other, ObjectTensor):
+            if not _is_numeric(other):
+                return None
+            r_dims = elemwise_binary_op_dims(self.dims, other.dims)
+            a_mags, a_units = self.broadcast_to_dims(r_dims)._numeric_gather(r_dims)
+            b_mags, b_units = other.broadcast_to_dims(r_dims)._numeric_gather(r_dims)
+        else:
+            scalar = _as_numeric_scalar(other)
+            if scalar is None:
+                return None
+            r_dims = self.dims
+            a_mags, a_units = self._numeric_gather(r_dims)
+            b_mags, b_unit = scalar
+            if b_unit is None and op in ('add', 'sub'):
+                # numbers add to dimensionless quantities
+                b_unit = ureg.dimensionless
+            b_units = None if b_unit is None else _unit_array(b_unit)
+        if op in ('add', 'sub'):
+            # like pint, the sum takes the units of the left operand
+            b_mags = b_mags * _conversion_factors(b_units, a_units)
+            mags = a_mags + b_mags if op == 'add' else a_mags - b_mags
+            units = a_units
+        elif op == 'mul':
+            mags = a_mags * b_mags
+            units = a_units if b_units is None else _units_mul(a_units, b_units)
+        elif op == 'truediv':
+            mags = a_mags / b_mags
+            units = a_units if b_units is None else _units_div(a_units, b_units)
+        else:
+            raise NotImplementedError(op)
+        return self._from_numeric(r_dims, mags, units)
+
     def getitem_helper(self, item):
         if isinstance(item, int):
             item = item,
@@ -238,13 +631,13 @@ class ObjectTensor(object):
                 dim_i = view_dims.pop(0)
                 stride_i = view_strides.pop(0)
                 #idx.append([dim_i[item_ij] for item_ij in item_i]) # stride multipliers
-                keep_dims.append({item_ij: dim_i[item_ij] for item_ij in item_i}) # dim_i, restricted to the enum elements in item_i
+                keep_dims.append(subset_dim(dim_i, item_i)) # dim_i, restricted to the enum elements in item_i
                 keep_strides.append(stride_i)
             elif isinstance(item_i, (list, tuple, dict)):
                 dim_i = view_dims.pop(0)
                 stride_i = view_strides.pop(0)
                 #idx.append([dim_i[item_ij] for item_ij in item_i])
-                keep_dims.append({item_ij: dim_i[item_ij] for item_ij in item_i})
+                keep_dims.append(subset_dim(dim_i, item_i))
                 keep_strides.append(stride_i)
             else:
                 dim_i = view_dims.pop(0)
@@ -335,6 +728,11 @@ class ObjectTensor(object):
             self.buf[offset] = value
 
     def __mul__(self, other):
+        if isinstance(other, _types_to_defer_to):
+            return NotImplemented
+        rval = self._numeric_binary(other, 'mul')
+        if rval is not None:
+            return rval
         if isinstance(other, ObjectTensor):
             r_dims = elemwise_binary_op_dims(self.dims, other.dims)
             rval = ObjectTensor.empty(*r_dims)
@@ -352,6 +750,11 @@ class ObjectTensor(object):
     __rmul__ = __mul__
 
     def __truediv__(self, other):
+        if isinstance(other, _types_to_defer_to):
+            return NotImplemented
+        rval = self._numeric_binary(other, 'truediv')
+        if rval is not None:
+            return rval
         if isinstance(other, ObjectTensor):
             r_dims = elemwise_binary_op_dims(self.dims, other.dims)
             rval = ObjectTensor.empty(*r_dims)
@@ -367,6 +770,8 @@ class ObjectTensor(object):
             return rval
 
     def __matmul__(self, other):
+        if isinstance(other, _types_to_defer_to):
+            return NotImplemented
         if self.ndim == 0 or other.ndim == 0:
             return self * other
         elif self.ndim == 1 and other.ndim == 1:
@@ -379,6 +784,11 @@ class ObjectTensor(object):
             raise NotImplementedError(self.ndim, other.ndim)
 
     def __add__(self, other):
+        if isinstance(other, _types_to_defer_to):
+            return NotImplemented
+        rval = self._numeric_binary(other, 'add')
+        if rval is not None:
+            return rval
         if isinstance(other, ObjectTensor):
             def fn(x, y):
                 return x + y
@@ -391,6 +801,11 @@ class ObjectTensor(object):
     __radd__ = __add__
 
     def __sub__(self, other):
+        if isinstance(other, _types_to_defer_to):
+            return NotImplemented
+        rval = self._numeric_binary(other, 'sub')
+        if rval is not None:
+            return rval
         if isinstance(other, ObjectTensor):
             def fn(x, y):
                 return x - y
@@ -401,6 +816,9 @@ class ObjectTensor(object):
             return apply_elemwise(fn, [self])
 
     def __neg__(self):
+        rval = self._numeric_binary(-1, 'mul')
+        if rval is not None:
+            return rval
         def fn(x):
             return -x
         return apply_elemwise(fn, [self])
@@ -424,15 +842,31 @@ class ObjectTensor(object):
                 return True
         return False
 
+    def _numeric_sum(self, axis=None):
+        """Return the sum over `axis` (or all) via ndarrays. Like sum_objs,
+        terms are converted to the units of the first term.
+        """
+        mags, units = self._numeric_gather(self.dims)
+        # the position of the first term in ravel (sorted-key) order
+        firsts = [0 if dim_i is None else list(dim_i).index(min(dim_i))
+                  for dim_i in self.dims]
+        if axis is None:
+            if not mags.size:
+                return None
+            first_unit = units[tuple(firsts)]
+            total = (mags * _conversion_factors(units, _unit_array(first_unit))).sum()
+            return float(total) * first_unit
+        first_units = np.take(units, [firsts[axis]], axis=axis)
+        total = (mags * _conversion_factors(units, first_units)).sum(axis=axis)
+        dims = list(self.dims)
+        dims.pop(axis)
+        return self._from_numeric(dims, total, first_units.squeeze(axis))
+
     def sum(self, sum_dim=None, keep_dim=False):
         if sum_dim is None:
-            rval = None
-            for key, off in self.ravel_keys_offsets():
-                if rval is None:
-                    rval = self.buf[off]
-                else:
-                    rval += self.buf[off]
-            return rval
+            if _is_numeric(self):
+                return self._numeric_sum()
+            return sum_objs(self.ravel())
 
         elif isinstance(sum_dim, int):
             # rename to suggest it's an int, not a dim
@@ -441,6 +875,8 @@ class ObjectTensor(object):
 
             dims = list(self.dims)
             summed_dim = dims.pop(sum_dim_idx)
+            if dims and _is_numeric(self) and not keep_dim:
+                return self._numeric_sum(sum_dim_idx)
             if dims:
                 rval = ObjectTensor.empty(*dims)
                 rval_unsq = rval.unsqueeze(sum_dim_idx, dim=summed_dim)
@@ -448,11 +884,11 @@ class ObjectTensor(object):
                 for ld, rd in zip(self.dims, rval_unsq.dims):
                     assert set(ld.keys()) == set(rd.keys())
                 assert len(rval.dims) == len(self.dims) - 1
+                terms = {}
                 for key, (my_offset, rval_offset) in ravel_multi(self, rval_unsq):
-                    if rval_unsq.buf[rval_offset] is None:
-                        rval_unsq.buf[rval_offset] = self.buf[my_offset]
-                    else:
-                        rval_unsq.buf[rval_offset] += self.buf[my_offset]
+                    terms.setdefault(rval_offset, []).append(self.buf[my_offset])
+                for rval_offset, objs in terms.items():
+                    rval_unsq.buf[rval_offset] = sum_objs(objs)
                 if keep_dim:
                     return rval_unsq
                 else:
@@ -465,7 +901,7 @@ class ObjectTensor(object):
             for ii, dim in enumerate(self.dims):
                 if dim == sum_dim_d:
                     return self.sum(ii)
-                if set(dim.keys()) == set(sum_dim):
+                if dim is not None and dim_keyset(dim) == frozenset(sum_dim):
                     return self.sum(ii)
             raise IndexError(sum_dim)
 
@@ -510,11 +946,330 @@ class ObjectTensor(object):
         return apply_elemwise(fn, [self])
 
 
+def _lookup_table(ot, n_dims):
+    """Return (axes, table) for the ObjectTensor `ot` right-aligned into
+    `n_dims` dims: its non-None axes and a dict from keys over those axes
+    to its elements.
+    """
+    n_lead = n_dims - len(ot.dims)
+    axes = tuple(n_lead + ii for ii, dim_i in enumerate(ot.dims) if dim_i is not None)
+    return axes, {key: ot.buf[off] for key, off in ot.ravel_keys_offsets()}
+
+
+class _DeferredZero(object):
+    """An implicit zero of a SparseObjectTensor whose computation raised
+    (e.g. 0 / 0), so it is recomputed, and raises, only where it is read
+    """
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def resolve(self):
+        return self.fn(*[_resolve_zero(arg) for arg in self.args])
+
+
+def _resolve_zero(obj):
+    if isinstance(obj, _DeferredZero):
+        return obj.resolve()
+    return obj
+
+
+def _zero_op(fn, *args):
+    """Return fn(*args) for implicit zeros, or a _DeferredZero if it raises"""
+    try:
+        return fn(*[_resolve_zero(arg) for arg in args])
+    except ArithmeticError:
+        return _DeferredZero(fn, *args)
+
+
+def _sum_zeros(*objs):
+    return sum_objs(objs)
+
+
+class SparseObjectTensor(object):
+    """An ObjectTensor of mostly-zero elements, stored as a dict from full
+    key tuples to the explicit entries.
+
+    Every other element is an implicit zero, looked up in a small table over
+    a subset of the axes (e.g. `0 * kt_by_ghg[ghg]` varies only by GHG), so
+    that indexing, `sum`, `*` and `@` cost time proportional to the number
+    of entries rather than the size of the dense tensor. `dense()` converts
+    to an ObjectTensor.
+    """
+
+    def __init__(self, *, dims, entries, zero_axes, zeros):
+        self.dims = dims
+        self.entries = entries
+        self.zero_axes = zero_axes
+        self.zeros = zeros
+
+    @classmethod
+    def empty(cls, *dims, zero=None):
+        """Return a tensor of zeros. `zero` is either one object for all
+        elements or an ObjectTensor broadcastable to `dims`, typically with
+        None for the axes along which the zero does not vary.
+        """
+        dims = ObjectTensor.as_dims(dims)
+        if None in dims:
+            raise NotImplementedError('None dims')
+        if isinstance(zero, ObjectTensor):
+            zero_axes, zeros = _lookup_table(zero, len(dims))
+        else:
+            zero_axes, zeros = (), {(): zero}
+        return cls(dims=dims, entries={}, zero_axes=zero_axes, zeros=zeros)
+
+    @property
+    def ndim(self):
+        return len(self.dims)
+
+    @property
+    def shape(self):
+        return shape_from_dims(self.dims)
+
+    def __len__(self):
+        return len(self.dims[0])
+
+    @property
+    def nnz(self):
+        return len(self.entries)
+
+    def _zero_at(self, key):
+        return _resolve_zero(self.zeros[tuple(key[ii] for ii in self.zero_axes)])
+
+    def _like(self, dims, entries, zero_axes, zeros):
+        return SparseObjectTensor(dims=dims, entries=entries, zero_axes=zero_axes, zeros=zeros)
+
+    def dense(self):
+        rval = ObjectTensor.empty(*self.dims)
+        for key, off in rval.ravel_keys_offsets():
+            try:
+                rval.buf[off] = self.entries[key]
+            except KeyError:
+                rval.buf[off] = self._zero_at(key)
+        return rval
+
+    def _parse_item(self, item):
+        """Return a list with, for each axis, None to keep it, a set of keys
+        to keep a subset, or a key to index it away.
+        """
+        if not isinstance(item, tuple):
+            item = item,
+        if len(item) > self.ndim:
+            raise IndexError(item)
+        rval = []
+        for dim_i, item_i in zip(self.dims, item):
+            if item_i is None:
+                raise NotImplementedError('None in SparseObjectTensor index')
+            elif item_i == slice(None):
+                rval.append(None)
+            elif _issubclass(item_i, enum.Enum) or isinstance(item_i, (list, tuple, dict)):
+                rval.append(list(item_i))
+            else:
+                if item_i not in dim_i:
+                    raise KeyError(item_i)
+                rval.append(item_i)
+        rval.extend([None] * (self.ndim - len(item)))
+        return rval
+
+    @staticmethod
+    def _select(key, axes, parsed):
+        """Return `key` (over `axes`) with indexed axes dropped, or None if
+        it falls outside the selection
+        """
+        rval = []
+        for key_i, axis in zip(key, axes):
+            sel = parsed[axis]
+            if sel is None:
+                rval.append(key_i)
+            elif isinstance(sel, set):
+                if key_i not in sel:
+                    return None
+                rval.append(key_i)
+            elif key_i != sel:
+                return None
+        return tuple(rval)
+
+    def __getitem__(self, item):
+        parsed = self._parse_item(item)
+        dims = []
+        for ii, (dim_i, sel) in enumerate(zip(self.dims, parsed)):
+            if sel is None:
+                dims.append(dim_i)
+            elif isinstance(sel, list):
+                dims.append(intern_dim(sel))
+                parsed[ii] = set(sel)
+        if not dims:
+            key = tuple(parsed)
+            try:
+                return self.entries[key]
+            except KeyError:
+                return self._zero_at(key)
+        all_axes = range(self.ndim)
+        entries = {}
+        for key, obj in self.entries.items():
+            new_key = self._select(key, all_axes, parsed)
+            if new_key is not None:
+                entries[new_key] = obj
+        new_axis = {}
+        for axis, sel in enumerate(parsed):
+            if sel is None or isinstance(sel, set):
+                new_axis[axis] = len(new_axis)
+        zeros = {}
+        for key, obj in self.zeros.items():
+            new_key = self._select(key, self.zero_axes, parsed)
+            if new_key is not None:
+                zeros[new_key] = obj
+        zero_axes = tuple(new_axis[axis] for axis in self.zero_axes if axis in new_axis)
+        return self._like(dims, entries, zero_axes, zeros)
+
+    def __setitem__(self, item, value):
+        parsed = self._parse_item(item)
+        if any(sel is None or isinstance(sel, list) for sel in parsed):
+            raise NotImplementedError('SparseObjectTensor only sets single elements')
+        self.entries[tuple(parsed)] = value
+
+    def _axis_of(self, sum_dim):
+        if isinstance(sum_dim, int):
+            return sum_dim
+        for ii, dim in enumerate(self.dims):
+            if dim_keyset(dim) == frozenset(sum_dim):
+                return ii
+        raise IndexError(sum_dim)
+
+    def sum(self, sum_dim=None):
+        if sum_dim is None:
+            if self.entries:
+                return sum_objs(obj for key, obj in sorted(self.entries.items()))
+            return sum_objs(_resolve_zero(obj) for key, obj in sorted(self.zeros.items()))
+        axis = self._axis_of(sum_dim)
+        dims = list(self.dims)
+        dims.pop(axis)
+        if not dims:
+            return self.sum()
+        terms = {}
+        for key, obj in sorted(self.entries.items()):
+            terms.setdefault(key[:axis] + key[axis + 1:], []).append(obj)
+        entries = {key: sum_objs(objs) for key, objs in terms.items()}
+        # the zeros sum to the zero of the first key along `axis`
+        zero_terms = {}
+        for key, obj in sorted(self.zeros.items()):
+            if axis in self.zero_axes:
+                pos = self.zero_axes.index(axis)
+                key = key[:pos] + key[pos + 1:]
+            zero_terms.setdefault(key, []).append(obj)
+        zeros = {key: _zero_op(_sum_zeros, *objs) for key, objs in zero_terms.items()}
+        zero_axes = tuple(ii if ii < axis else ii - 1 for ii in self.zero_axes if ii != axis)
+        return self._like(dims, entries, zero_axes, zeros)
+
+    def _binary(self, other, fn, reflected=False):
+        """Return fn(self, other) elementwise, assuming that fn maps
+        implicit zeros to implicit zeros (e.g. mul, truediv).
+
+        Implicit zeros for which fn raises (e.g. 0 / 0) are deferred, so
+        that only reading those elements raises, as it would for dense().
+        """
+        if isinstance(other, SparseObjectTensor):
+            other = other.dense()
+        if isinstance(other, ObjectTensor):
+            r_dims = elemwise_binary_op_dims(self.dims, other.dims)
+            o_axes, o_table = _lookup_table(other, len(r_dims))
+        else:
+            r_dims = self.dims
+            o_axes, o_table = (), {(): other}
+        n_lead = len(r_dims) - self.ndim
+        lead_keys = list(itertools.product(*[sorted(dim_i) for dim_i in r_dims[:n_lead]]))
+        if n_lead and None in r_dims[:n_lead]:
+            raise NotImplementedError('None dims')
+        if reflected:
+            def op(a, b):
+                return fn(b, a)
+        else:
+            op = fn
+
+        entries = {}
+        for lead_key in lead_keys:
+            for key, obj in self.entries.items():
+                r_key = lead_key + key
+                entries[r_key] = op(obj, o_table[tuple(r_key[ii] for ii in o_axes)])
+
+        zero_axes = tuple(sorted(set(n_lead + ii for ii in self.zero_axes) | set(o_axes)))
+        zeros = {}
+        for z_key in itertools.product(*[sorted(r_dims[ii]) for ii in zero_axes]):
+            by_axis = dict(zip(zero_axes, z_key))
+            zero = self.zeros[tuple(by_axis[n_lead + ii] for ii in self.zero_axes)]
+            zeros[z_key] = _zero_op(op, zero, o_table[tuple(by_axis[ii] for ii in o_axes)])
+        dims = [dim_i if ii < n_lead else self.dims[ii - n_lead]
+                for ii, dim_i in enumerate(r_dims)]
+        return self._like(dims, entries, zero_axes, zeros)
+
+    def __mul__(self, other):
+        return self._binary(other, lambda a, b: a * b)
+
+    def __rmul__(self, other):
+        return self._binary(other, lambda a, b: a * b, reflected=True)
+
+    def __truediv__(self, other):
+        return self._binary(other, lambda a, b: a / b)
+
+    def __neg__(self):
+        return self * -1
+
+    def __add__(self, other):
+        if isinstance(other, SparseObjectTensor) and other.dims == self.dims and other.zero_axes == self.zero_axes:
+            entries = dict(self.entries)
+            for key, obj in other.entries.items():
+                entries[key] = entries[key] + obj if key in entries else self._zero_at(key) + obj
+            for key in self.entries.keys() - other.entries.keys():
+                entries[key] = entries[key] + other._zero_at(key)
+            zeros = {key: _zero_op(operator.add, obj, other.zeros[key])
+                     for key, obj in self.zeros.items()}
+            return self._like(list(self.dims), entries, self.zero_axes, zeros)
+        if isinstance(other, SparseObjectTensor):
+            other = other.dense()
+        return self.dense() + other
+
+    def __radd__(self, other):
+        return other + self.dense()
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return other - self.dense()
+
+    def __matmul__(self, other):
+        if self.ndim == 1 and other.ndim == 1:
+            return (self * other).sum()
+        elif self.ndim == 2 and other.ndim == 1:
+            return (self * other).sum(1)
+        else:
+            raise NotImplementedError(self.ndim, other.ndim)
+
+    def __rmatmul__(self, other):
+        if other.ndim == 1 and self.ndim == 1:
+            return (other * self).sum()
+        elif other.ndim == 1 and self.ndim == 2:
+            return (other[:, None] * self).sum(0)
+        elif other.ndim == 2 and self.ndim == 1:
+            return (other * self).sum(1)
+        else:
+            raise NotImplementedError(other.ndim, self.ndim)
+
+
 empty = ObjectTensor.empty
 from_dict = ObjectTensor.from_dict
+sparse = SparseObjectTensor.empty
 
 # sts.py adds SparseTimeSeries to this
-_types_for_pint_to_ignore = (ObjectTensor,)
+_types_for_pint_to_ignore = (ObjectTensor, SparseObjectTensor)
+
+# Functions that sum a list of objects of a given type (and pint scalars)
+# in one pass, or return NotImplemented; sts.py adds STS to this
+_accumulators = {}
+
+# Types whose reflected operators handle ObjectTensor operands
+_types_to_defer_to = (SparseObjectTensor,)
 
 # This seems to work for mul
 def _no_pint_operators(value, *args, **kwargs):
@@ -557,3 +1312,140 @@ def apply_elemwise(fn, ot_args):
         return rval
     else:
         raise NotImplementedError()
+
+
+def _dim_name(dim):
+    """Return the Enum class of the keys of `dim`, by which `contract`
+    matches dims across operands"""
+    key_types = set(type(key) for key in dim)
+    if len(key_types) != 1:
+        raise ValueError('contract needs each dim keyed by one Enum class', key_types)
+    key_type, = key_types
+    if not _issubclass(key_type, enum.Enum):
+        raise ValueError('contract cannot match dims keyed by non-Enum keys', key_type)
+    return key_type
+
+
+def _contract_term(ot):
+    """Return (names, dims, table) for `ot` with its None dims squeezed
+    out, where table maps key tuples to elements in ravel order
+    """
+    if isinstance(ot, SparseObjectTensor):
+        ot = ot.dense()
+    dims = [dim_i for dim_i in ot.dims if dim_i is not None]
+    names = tuple(_dim_name(dim_i) for dim_i in dims)
+    if len(set(names)) < len(names):
+        raise NotImplementedError('contract with a repeated dim', names)
+    table = {key: ot.buf[off] for key, off in ot.ravel_keys_offsets()}
+    return names, dict(zip(names, dims)), table
+
+
+def _contract_pair(a, b, out_names):
+    """Return the term of a * b summed over the names in either that are
+    not in `out_names`, without materializing the products as a tensor
+    """
+    a_names, a_dims, a_table = a
+    b_names, b_dims, b_table = b
+    shared = [name for name in a_names if name in b_dims]
+    for name in shared:
+        if not same_keys(a_dims[name], b_dims[name]):
+            raise DimsMismatch(a_dims[name], b_dims[name])
+    names = tuple(name for name in a_names + b_names if name in out_names)
+    names = tuple(dict.fromkeys(names))
+    dims = {name: a_dims.get(name) or b_dims[name] for name in names}
+    a_shared = [a_names.index(name) for name in shared]
+    b_shared = [b_names.index(name) for name in shared]
+    b_by_shared = {}
+    for b_key, b_obj in b_table.items():
+        b_by_shared.setdefault(tuple(b_key[ii] for ii in b_shared), []).append((b_key, b_obj))
+    a_pos = {name: ii for ii, name in enumerate(a_names)}
+    b_pos = {name: ii for ii, name in enumerate(b_names)}
+    terms = {}
+    for a_key, a_obj in a_table.items():
+        for b_key, b_obj in b_by_shared.get(tuple(a_key[ii] for ii in a_shared), ()):
+            key = tuple(a_key[a_pos[name]] if name in a_pos else b_key[b_pos[name]]
+                        for name in names)
+            terms.setdefault(key, []).append(a_obj * b_obj)
+    return names, dims, {key: sum_objs(objs) for key, objs in terms.items()}
+
+
+def _contract_sum(term, out_names):
+    """Return `term` summed over its names that are not in `out_names`"""
+    names, dims, table = term
+    if all(name in out_names for name in names):
+        return term
+    keep = [ii for ii, name in enumerate(names) if name in out_names]
+    terms = {}
+    for key, obj in table.items():
+        terms.setdefault(tuple(key[ii] for ii in keep), []).append(obj)
+    names = tuple(names[ii] for ii in keep)
+    return names, {name: dims[name] for name in names}, {
+        key: sum_objs(objs) for key, objs in terms.items()}
+
+
+def _contract_order(sizes, names_list, over):
+    """Return (cost, [(ii, jj), ...]), the order of pairwise contractions of
+    terms with dims `names_list` (whose sizes are in `sizes`) that minimizes
+    the total number of elementwise products.
+
+    Contracted terms are appended to the end of the list, and every
+    contracted dim that only one term still has is summed out before it
+    is multiplied.
+    """
+    if len(names_list) == 1:
+        return 0, []
+    best = None
+    for ii, jj in itertools.combinations(range(len(names_list)), 2):
+        a, b = names_list[ii], names_list[jj]
+        cost = 1
+        for name in set(a) | set(b):
+            cost *= sizes[name]
+        rest = [names for kk, names in enumerate(names_list) if kk not in (ii, jj)]
+        needed = set(name for names in rest for name in names)
+        out = tuple(name for name in dict.fromkeys(a + b)
+                    if name not in over or name in needed)
+        rest_cost, rest_order = _contract_order(sizes, rest + [out], over)
+        if best is None or cost + rest_cost < best[0]:
+            best = cost + rest_cost, [(ii, jj)] + rest_order
+    return best
+
+
+def contract(*operands, over=()):
+    """Return the elementwise product of `operands` summed over the dims in
+    `over`.
+
+    Dims are matched across operands by Enum class (None dims broadcast), so
+    e.g. contract(GWP_100, emissions, over=(GHG, PT)) for emissions with
+    dims (GHG, IPCC, PT) is (GWP_100 @ emissions.sum(PT)), by IPCC.
+
+    Dims that only one operand has are summed out before multiplying, and
+    the remaining operands are multiplied pairwise in the order that needs
+    the fewest products. No intermediate ObjectTensors are created.
+    """
+    over = set(over)
+    terms = [_contract_term(ot) for ot in operands]
+    out_names = tuple(name for name in dict.fromkeys(
+        name for names, _, _ in terms for name in names) if name not in over)
+
+    def needed_by_others(idx, terms):
+        return set(out_names).union(*[
+            names for kk, (names, _, _) in enumerate(terms) if kk != idx])
+
+    terms = [_contract_sum(term, needed_by_others(ii, terms))
+             for ii, term in enumerate(terms)]
+    sizes = {name: len(dim) for _, dims, _ in terms for name, dim in dims.items()}
+    _, order = _contract_order(sizes, [names for names, _, _ in terms], over)
+    for ii, jj in order:
+        a, b = terms[ii], terms[jj]
+        rest = [term for kk, term in enumerate(terms) if kk not in (ii, jj)]
+        needed = set(out_names).union(*[names for names, _, _ in rest])
+        terms = rest + [_contract_pair(a, b, needed)]
+    term, = terms
+    names, dims, table = _contract_sum(term, out_names)
+    if not names:
+        return table[()]
+    rval = ObjectTensor.empty(*[dims[name] for name in out_names])
+    pos = [out_names.index(name) for name in names]
+    for key, off in rval.ravel_keys_offsets():
+        rval.buf[off] = table[tuple(key[ii] for ii in pos)]
+    return rval
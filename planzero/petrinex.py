@@ -291,7 +291,8 @@ class VolumeSummary(pydantic.BaseModel):
 
 @cache
 def petrinex_annual_summary(pt, include_ghgrp, large_emitter_cutoff=None):
-    rval = objtensor.empty(ProductID, ActivityID, FacilityType)
+    zero = objtensor.from_dict({pid: 0 * UoM_by_ProdId.get(pid, u.m3) for pid in ProductID})
+    rval = objtensor.sparse(ProductID, ActivityID, FacilityType, zero=zero[:, None, None])
     tmp = {}
     basis_years = [2022, 2023, 2024]
     for year in basis_years:
@@ -307,8 +308,6 @@ def petrinex_annual_summary(pt, include_ghgrp, large_emitter_cutoff=None):
                         tmp[aid][pid].setdefault(ft, {})
                         tmp[aid][pid][ft].setdefault(year, 0 * UoM_by_ProdId.get(pid, u.m3))
                         tmp[aid][pid][ft][year] += amt * UoM_by_ProdId.get(pid, u.m3)
-    for pid in ProductID:
-        rval[pid] = 0 * UoM_by_ProdId.get(pid, u.m3)
     for aid in tmp:
         for pid in tmp[aid]:
             for ft in tmp[aid][pid]:
@@ -318,7 +317,7 @@ def petrinex_annual_summary(pt, include_ghgrp, large_emitter_cutoff=None):
                 v_unit = values[0].u
                 rval[pid, aid, ft] = sts.annual_report2(
                     years=years,
-                    values=[vv.to(v_unit).magnitude for vv in values],
+                    values=values, # converted to v_unit in bulk
                     v_unit=v_unit)
     return rval
 
@@ -1,5 +1,3 @@
-import functools
-
 import pandas as pd
 import numpy as np
 
@@ -34,10 +32,14 @@ def set_ptxx(rval_pt, rval_ca):
     for key in rval_ca.dims[0]:
         eps = 1e-4
         try:
-            # sum up the values listed for provinces and territories
-            times = sts.union_times(rval_pt[key, _actual_PTs])
-            pt_total = rval_pt[key, _actual_PTs].apply(
-                functools.partial(sts.with_default_zero, times=times)).sum()
+            # sum up the values listed for provinces and territories,
+            # counting missing entries as 0, in one pass over a shared grid
+            objs = list(rval_pt[key, _actual_PTs].ravel())
+            pt_total = sts.sum_aligned(objs, fill_zero=True)
+            if pt_total is NotImplemented:
+                times = sts.union_times(objs)
+                pt_total = objtensor.sum_objs(
+                    sts.with_default_zero(obj, times) for obj in objs)
             xx = rval_ca[key] - pt_total
             # xx may be a pint quantity of a SparseTimeSeries
             if isinstance(xx, sts.STS):
@@ -1,3 +1,5 @@
+import concurrent.futures
+import threading
 
 from .my_functools import cache
 from functools import cached_property
@@ -7,6 +9,7 @@ import numpy as np
 
 from .ureg import u
 from .base import State
+from .base import _default_n_workers, _fork_context, _state_result, _apply_state_result
 
 from .html import (
     EChartTitle,
@@ -191,30 +194,192 @@ from .base import (
     Other_NIR_Historical_Actuals,
     )
 
+# the STS that the strategy pages compare between baseline and ablations;
+# ablations run in worker processes send back only these
+ablation_sts_names = ('Predicted_Annual_Emitted_CO2e_mass', 'AnnualSubsidyTotal')
+
+# scenario_name -> [n_runs_done, n_runs_total] of a sim_scenario in progress
+_progress = {}
+
+
+def sim_progress(scenario_name):
+    """Return (n_done, n_total) simulation runs of sim_scenario(scenario_name)
+    (the baseline and one per strategy), or None if this process hasn't
+    started simulating it.
+    """
+    progress = _progress.get(scenario_name)
+    return None if progress is None else tuple(progress)
+
+
+# the worker processes that sim_scenario runs ablations in (see start_workers)
+_pool = None
+
+
+def start_workers(n_workers=None):
+    """Fork the worker processes that sim_scenario runs ablations in
+    ($PLANZERO_WORKERS of them by default), if there are to be more than one,
+    and return the pool (or None).
+
+    Call this before any threads are started (e.g. from app.py, before the
+    server starts), because forking a multithreaded process is unsafe;
+    sim_scenario never forks workers itself. The workers inherit the
+    scenarios defined at that point.
+    """
+    global _pool
+    n_workers = _default_n_workers() if n_workers is None else n_workers
+    mp_context = _fork_context()
+    if _pool is None and n_workers > 1 and mp_context is not None:
+        _pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=mp_context)
+        # with the fork method, the first submit forks all of the workers
+        _pool.submit(int).result()
+    return _pool
+
+
+def stop_workers():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+# runs sim_scenario off the request threads (see start_sim_scenario)
+_sim_thread = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+_sim_futures = {} # scenario_name -> Future of sim_scenario
+_sim_futures_lock = threading.Lock()
+
+
+def start_sim_scenario(scenario_name):
+    """Return a Future of sim_scenario(scenario_name), which runs in a
+    background thread (started by the first call, or again after a failure),
+    so that request handlers can await it and sim_progress stays reachable.
+    """
+    with _sim_futures_lock:
+        future = _sim_futures.get(scenario_name)
+        if future is None or (future.done() and future.exception() is not None):
+            future = _sim_futures[scenario_name] = _sim_thread.submit(
+                sim_scenario, scenario_name)
+        return future
+
+
+def _new_state(scenario_name, exclude_name=None):
+    scenario = scenarios.scenarios[scenario_name]
+    state = State(
+        name=f'State_{scenario_name}' + (f'_minus_{exclude_name}' if exclude_name else ''),
+        t_start=scenario.t_start_year * u.years)
+    if exclude_name:
+        dynelems = [d for d in scenario.dynelems if d.__class__.__name__ != exclude_name]
+    else:
+        dynelems = scenario.dynelems
+    state.add_projects(dynelems)
+    state.add_project(Other_NIR_Historical_Actuals())
+    state.add_project(AtmosphericChemistry())
+    state.add_project(SubsidyAccounting())
+    return state
+
+
+def _baseline_state(scenario_name):
+    """Return a new state of the scenario, run until the first of its
+    strategies starts, and whether ablations can be forked from it (if no
+    strategy starts right away)
+    """
+    state = _new_state(scenario_name)
+    t_starts = [state.project_t_next[d.identifier] for d in _strategies(scenario_name)]
+    t_starts = [tt for tt in t_starts if tt is not None]
+    if t_starts and min(t_starts) > state.t_now:
+        state.run_before(min(t_starts))
+        return state, True
+    return state, False
+
+
+def _ablated_state(prefix, scenario_name, strategy):
+    """Return a state that runs the scenario without `strategy`, forked from
+    `prefix` if there is one and State.fork can leave the strategy out of it
+    """
+    name = strategy.__class__.__name__
+    if prefix is None:
+        return _new_state(scenario_name, exclude_name=name)
+    try:
+        return prefix.fork(
+            name=f'State_{scenario_name}_minus_{name}',
+            without=[strategy.identifier])
+    except ValueError:
+        return _new_state(scenario_name, exclude_name=name)
+
+
+# scenario_name -> the baseline prefix (or None) that this worker process
+# forks ablations from; forking leaves it as it is
+_worker_prefixes = {}
+
+
+def _run_ablation(scenario_name, idx):
+    try:
+        prefix = _worker_prefixes[scenario_name]
+    except KeyError:
+        state, forkable = _baseline_state(scenario_name)
+        prefix = _worker_prefixes[scenario_name] = state if forkable else None
+    strategy = _strategies(scenario_name)[idx]
+    state = _ablated_state(prefix, scenario_name, strategy)
+    state.run_until(2100 * u.years)
+    return state.name, _state_result(state, names=ablation_sts_names)
+
+
+def _strategies(scenario_name):
+    return [d for d in scenarios.scenarios[scenario_name].dynelems
+            if 'strategy' in d.tags]
+
+
 @cache
 def sim_scenario(scenario_name):
+    """Simulate the scenario, and once more without each of its strategies.
+
+    The years before the first strategy starts are simulated once, and each
+    ablation is forked from there where State.fork can leave the strategy
+    out. Otherwise (e.g. if a strategy starts right away, or has registered
+    emissions) the ablation is set up from scratch, without the strategy's
+    series and registrations.
+
+    If start_workers has forked worker processes, the ablations run there
+    (each worker simulating the years before the first strategy once) while
+    the baseline runs here, and each ablated state holds only the
+    `ablation_sts_names` series. Request handlers should go through
+    start_sim_scenario rather than call this directly. See sim_progress.
+    """
+    return _sim_scenario(scenario_name, _pool)
+
+
+def _sim_scenario(scenario_name, pool):
     scenario = scenarios.scenarios[scenario_name]
+    strategies = _strategies(scenario_name)
+    progress = _progress[scenario_name] = [0, 1 + len(strategies)]
+
+    baseline_state, forkable = _baseline_state(scenario_name)
 
-    def run_sim(exclude_name=None):
-        state = State(
-            name=f'State_{scenario_name}' + (f'_minus_{exclude_name}' if exclude_name else ''),
-            t_start=scenario.t_start_year * u.years)
-        if exclude_name:
-            dynelems = [d for d in scenario.dynelems if d.__class__.__name__ != exclude_name]
-        else:
-            dynelems = scenario.dynelems
-        state.add_projects(dynelems)
-        state.add_project(Other_NIR_Historical_Actuals())
-        state.add_project(AtmosphericChemistry())
-        state.add_project(SubsidyAccounting())
-        state.run_until(2100 * u.years)
-        return state
-
-    baseline_state = run_sim()
     ablations = {}
-    for d in scenario.dynelems:
-        if 'strategy' in d.tags:
-            name = d.__class__.__name__
-            ablations[name] = run_sim(exclude_name=name)
+    if pool is None or not strategies:
+        prefix = baseline_state if forkable else None
+        for d in strategies:
+            ablations[d.__class__.__name__] = _ablated_state(prefix, scenario_name, d)
+        baseline_state.run_until(2100 * u.years)
+        progress[0] += 1
+        for state in ablations.values():
+            state.run_until(2100 * u.years)
+            progress[0] += 1
+    else:
+        futures = {pool.submit(_run_ablation, scenario_name, idx): d.__class__.__name__
+                   for idx, d in enumerate(strategies)}
+        baseline_state.run_until(2100 * u.years)
+        progress[0] += 1
+        for future in concurrent.futures.as_completed(futures):
+            state_name, result = future.result()
+            state = State(
+                name=state_name,
+                t_start=scenario.t_start_year * u.years)
+            _apply_state_result(state, result)
+            ablations[futures[future]] = state
+            progress[0] += 1
+        ablations = {d.__class__.__name__: ablations[d.__class__.__name__]
+                     for d in strategies}
 
     return SimulationResult.from_state_scenario(baseline_state, scenario, ablations=ablations)
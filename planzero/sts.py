@@ -1,18 +1,71 @@
 import array
 import bisect
 import builtins
+import collections
+import copy
 from enum import Enum
 import functools
+import math
+import weakref
 
 import numpy as np
 import pint
 from pydantic import BaseModel
 
 from .ureg import ureg as u
+from .ureg import conversion_factor
 from . import objtensor
 
 
-_seconds_per_year = (1 * u.year).to(u.second).magnitude
+def _as_float_array(buf):
+    """Return `buf` (array.array('d'), list, or ndarray) as a float64 ndarray.
+
+    N.B. for array.array this is a view, and the array.array cannot be resized
+    while the view is alive, so don't hang on to the return value.
+    """
+    if isinstance(buf, np.ndarray):
+        return buf
+    return np.asarray(buf, dtype='d')
+
+
+def _magnitudes(qs, dst_unit, src_unit=None):
+    """Return `qs` as an ndarray of magnitudes in `dst_unit`, converting
+    units once for the whole batch rather than per element.
+
+    `qs` may be a pint array, a sequence of pint scalars, or
+    (if `src_unit` is given) raw magnitudes expressed in `src_unit`.
+    """
+    if src_unit is not None:
+        if isinstance(src_unit, str):
+            src_unit = getattr(u, src_unit)
+        rval = np.asarray(qs, dtype='d')
+        if src_unit != dst_unit:
+            rval = rval * conversion_factor(src_unit, dst_unit)
+        return rval
+    if isinstance(qs, pint.Quantity):
+        return _magnitudes(qs.magnitude, dst_unit, qs.u)
+    units = set(qq.u for qq in qs)
+    if len(units) == 1:
+        src_unit, = units
+        return _magnitudes([qq.magnitude for qq in qs], dst_unit, src_unit)
+    return np.asarray([qq.magnitude * conversion_factor(qq.u, dst_unit)
+                       for qq in qs], dtype='d')
+
+
+def _buf_extend(buf, values):
+    """Extend `buf` (array.array('d') or list) by the float ndarray `values`"""
+    if isinstance(buf, array.array):
+        buf.frombytes(np.ascontiguousarray(values, dtype='d').tobytes())
+    else:
+        buf.extend(values.tolist())
+
+
+def _array_d(values):
+    """Return a new array.array('d') holding a copy of `values`"""
+    rval = array.array('d')
+    rval.frombytes(np.ascontiguousarray(values, dtype='d').tobytes())
+    return rval
+
 
 class InterpolationMode(str, Enum):
     # queries with exact matches will return the corresponding value
@@ -26,26 +79,22 @@ class InterpolationMode(str, Enum):
     # queries with exact matches will return the corresponding value
     # queries without exact matches will return a linear interpolation
     # between immediate neighbours, like numpy.interp
-    # linear = 'linear'
+    # (so queries before the first time return the first value, and the
+    # default value is only returned when there are no times)
+    linear = 'linear'
 
-    # TODO: how to support uncertainty in value measurements?
-    #       idea: rename STS "SparseTimeSeries" -> TS "TimeSeries"
-    #             create new STS "StochasticTimeSeries" class
+    # N.B. uncertainty in values is represented by EnsembleSTS
 
 
-class STS(BaseModel):
-    """A data structure of (time, value) pairs (stored separately) representing
-    a timeseries. It may or not have a default value.
-    It is unit-aware.
-    It may be defined by interpolation for all time, some time, or only
-    specific times.
+class STSModel(BaseModel):
+    """Pydantic schema of an STS, for validation and serialization at the
+    boundaries (caching, templates). See `STS.model_dump` and
+    `STS.model_validate`.
     """
 
     t_unit:object
     v_unit:object
 
-    # TODO: rename to e.g. raw_times, so that `times` can be a property
-    # with the units attached
     times:object # will be a double-precision float array
     values:object # will be a double-precision float array
 
@@ -58,6 +107,114 @@ class STS(BaseModel):
 
     max_query_time: float | None = None
 
+
+class STS(object):
+    """A data structure of (time, value) pairs (stored separately) representing
+    a timeseries. It may or not have a default value.
+    It is unit-aware.
+    It may be defined by interpolation for all time, some time, or only
+    specific times.
+
+    Arithmetic creates many of these, so this is a plain __slots__ class;
+    the pydantic schema is STSModel.
+    """
+
+    __slots__ = (
+        't_unit',
+        'v_unit',
+        # TODO: rename to e.g. raw_times, so that `times` can be a property
+        # with the units attached
+        'times', # will be a double-precision float array
+        'values', # will be a double-precision float array
+        'current_readers', # DynamicElement identifiers (globally unique)
+        'writer',          # DynamicElement identifiers (globally unique)
+        'identifier',      # STS identifier (unique within a State)
+        'interpolation',
+        'max_query_time',
+        # Prefix-sum index for integrals of current-interpolated series:
+        # _cumint[j] is the integral from times[0] to times[j] (of the finite
+        # segments), and _cumbad[j] counts the non-finite segments in that range.
+        # Built lazily by _cumulative_integral, then maintained by append.
+        '_cumint',
+        '_cumbad',
+        # True while times and values may be shared with a fork (see fork),
+        # in which case they are copied before being modified in place.
+        '_shared',
+        # Incremented by every change to times or values, so that cached
+        # LazySTS values can tell whether their leaves changed.
+        # N.B. code that edits times or values in place (rather than through
+        # the methods here) must call _edited() afterward.
+        '_version',
+        )
+
+    _fields = (
+        't_unit',
+        'v_unit',
+        'times',
+        'values',
+        'current_readers',
+        'writer',
+        'identifier',
+        'interpolation',
+        'max_query_time',
+        )
+
+    def __init__(self, *, t_unit, v_unit, times, values, interpolation,
+                 current_readers=None, writer=None, identifier=None,
+                 max_query_time=None):
+        self.t_unit = t_unit
+        self.v_unit = v_unit
+        self.times = times
+        self.values = values
+        if interpolation.__class__ is not InterpolationMode:
+            interpolation = InterpolationMode(interpolation)
+        self.interpolation = interpolation
+        self.current_readers = [] if current_readers is None else current_readers
+        self.writer = writer
+        self.identifier = identifier
+        self.max_query_time = max_query_time
+        self._cumint = None
+        self._cumbad = None
+        self._shared = False
+        self._version = 0
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'STS({fields})'
+
+    def __eq__(self, other):
+        if not isinstance(other, STS):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        self._shared = False
+        self._version = 0
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def model_dump(self, **kwargs):
+        """Return the fields as a dict, as pydantic would (see STSModel)"""
+        return self.as_model().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs):
+        return self.as_model().model_dump_json(**kwargs)
+
+    def as_model(self):
+        return STSModel(**{name: getattr(self, name) for name in self._fields})
+
+    @classmethod
+    def model_validate(cls, obj):
+        """Return a new STS from a dict (or STSModel), validated by STSModel"""
+        if not isinstance(obj, STSModel):
+            obj = STSModel.model_validate(obj)
+        return cls(**{name: getattr(obj, name) for name in cls._fields})
+
     @classmethod
     def zero_one(cls, time, interpolation=InterpolationMode.current, v_unit=None):
         rval = cls(
@@ -104,11 +261,15 @@ class STS(BaseModel):
         N.B. that this function can return different values after appending or
         extending the timeseries.
         """
-        ts = t_query.to(self.t_unit).magnitude
+        ts = t_query.magnitude * conversion_factor(t_query.u, self.t_unit)
+        return self._idx_of_raw_time(ts)
+
+    def _idx_of_raw_time(self, ts):
+        """`_idx_of_time` for a time `ts` already expressed in `self.t_unit`"""
         self.max_query_time = (
             ts if self.max_query_time is None
             else max(ts, self.max_query_time))
-        if self.times:
+        if len(self.times):
             if ts > self.times[-1]:
                 if self.interpolation == InterpolationMode.no_interpolation:
                     index = 0
@@ -136,17 +297,83 @@ class STS(BaseModel):
             valid = (self.interpolation != InterpolationMode.no_interpolation)
         return index, valid
 
+    def _idxs_of_raw_times(self, ts):
+        """Vectorized `_idx_of_time` for an ndarray `ts` of times that are
+        already expressed in `self.t_unit`.
+
+        Returns (indexes, valids) as ndarrays.
+        """
+        ts = np.asarray(ts, dtype='d')
+        if len(ts):
+            ts_max = float(ts.max())
+            self.max_query_time = (
+                ts_max if self.max_query_time is None
+                else max(ts_max, self.max_query_time))
+        times = _as_float_array(self.times)
+        idxs = np.searchsorted(times, ts, side='right')
+        if self.interpolation == InterpolationMode.no_interpolation:
+            valids = np.zeros(ts.shape, dtype=bool)
+            has_prev = idxs > 0
+            valids[has_prev] = times[idxs[has_prev] - 1] == ts[has_prev]
+            idxs[~valids] = 0
+        elif self.interpolation == InterpolationMode.current:
+            valids = np.ones(ts.shape, dtype=bool)
+        else:
+            # see _linear_values
+            raise NotImplementedError(self.interpolation)
+        return idxs, valids
+
+    def _linear_values(self, ts):
+        """Return the linearly-interpolated values at an ndarray `ts` of times
+        that are already expressed in `self.t_unit`, as an ndarray.
+        """
+        assert self.interpolation == InterpolationMode.linear
+        ts = np.asarray(ts, dtype='d')
+        if len(ts):
+            ts_max = float(ts.max())
+            self.max_query_time = (
+                ts_max if self.max_query_time is None
+                else max(ts_max, self.max_query_time))
+        values = _as_float_array(self.values)
+        if not len(self.times):
+            return np.full(ts.shape, values[0])
+        return np.interp(ts, _as_float_array(self.times), values[1:])
+
+    def _raw_times(self, t_query, t_unit=None):
+        """Return `t_query` as an ndarray of magnitudes in `self.t_unit`
+        (see `_magnitudes`).
+        """
+        return _magnitudes(t_query, self.t_unit, t_unit)
+
+    def query_batch(self, t_query, t_unit=None):
+        """Return the values at many times at once, as a pint array.
+
+        Queries without a valid value (see `InterpolationMode`) come back
+        as NaN rather than raising.
+        """
+        ts = self._raw_times(t_query, t_unit)
+        if self.interpolation == InterpolationMode.linear:
+            return self._linear_values(ts) * self.v_unit
+        idxs, valids = self._idxs_of_raw_times(ts)
+        rval = _as_float_array(self.values)[idxs]
+        rval[~valids] = float('nan')
+        return rval * self.v_unit
+
     def query(self, t_query):
-        try:
-            n_queries = len(t_query)
-        except:
-            n_queries = 1
+        if self.interpolation == InterpolationMode.linear:
+            if isinstance(t_query, pint.Quantity) and not np.shape(t_query.magnitude):
+                ts = t_query.magnitude * conversion_factor(t_query.u, self.t_unit)
+                return float(self._linear_values([ts])[0]) * self.v_unit
+            return self.query_batch(t_query)
+        if isinstance(t_query, pint.Quantity) and not np.shape(t_query.magnitude):
+            n_queries = 1 # the common case during simulation
+        else:
+            try:
+                n_queries = len(t_query)
+            except:
+                n_queries = 1
         if n_queries > 1:
-            idxs, valids = zip(*[self._idx_of_time(tqi) for tqi in t_query])
-            values = [self.values[idx] for idx in idxs]
-            rval = np.asarray(values)
-            rval[~np.asarray(valids)] = float('nan')
-            return rval * self.v_unit
+            return self.query_batch(t_query)
         else:
             idx, valid = self._idx_of_time(t_query)
             if valid:
@@ -155,27 +382,116 @@ class STS(BaseModel):
                 assert valid
                 return float('nan') * self.v_unit
 
+    def query_before(self, t_query):
+        """Return the value in effect just before time `t_query` (the limit
+        from the left), which is what State.latest reads.
+        """
+        ts = t_query.magnitude * conversion_factor(t_query.u, self.t_unit)
+        # the largest time before ts, in the units of self.times
+        return self.query_raw(math.nextafter(ts, -math.inf)) * self.v_unit
+
+    def query_raw(self, ts):
+        """`query` for a time that is already a float in `self.t_unit`,
+        returning a float in `self.v_unit`
+        """
+        if self.interpolation == InterpolationMode.linear:
+            return float(self._linear_values([ts])[0])
+        idx, valid = self._idx_of_raw_time(ts)
+        assert valid
+        return self.values[idx]
+
+    def fork(self):
+        """Return a copy of self, for a forked State, that shares the times
+        and values buffers copy-on-write: whichever of the two is modified
+        first copies them.
+        """
+        rval = self.__class__(
+            times=self.times,
+            values=self.values,
+            t_unit=self.t_unit,
+            v_unit=self.v_unit,
+            interpolation=self.interpolation,
+            current_readers=list(self.current_readers),
+            writer=self.writer,
+            identifier=self.identifier,
+            max_query_time=self.max_query_time)
+        self._shared = rval._shared = True
+        return rval
+
+    def _unshare(self):
+        if self._shared:
+            self.times = copy.copy(self.times)
+            self.values = copy.copy(self.values)
+            self._shared = False
+
+    def _edited(self):
+        """Note that times or values were modified in place"""
+        self._cumint = None
+        self._version += 1
+
     def append(self, t, v):
-        if t.u == self.t_unit:
-            tt = t.magnitude
-        elif t.u == u.year and self.t_unit == u.second:
-            tt = t.magnitude * _seconds_per_year
-        else:
-            tt = t.to(self.t_unit).magnitude
+        self.append_raw(
+            t.magnitude * conversion_factor(t.u, self.t_unit),
+            v.magnitude * conversion_factor(v.u, self.v_unit))
+
+    def append_raw(self, tt, vv):
+        """`append` for a time and value that are already floats in
+        `self.t_unit` and `self.v_unit`
+        """
         if len(self.times):
             assert tt > self.times[-1]
-        vv = v.to(self.v_unit).magnitude
+        self._unshare()
+        if self._cumint is not None and len(self._cumint) == len(self.times):
+            if len(self.times):
+                if self.interpolation == InterpolationMode.linear:
+                    seg = (tt - self.times[-1]) * 0.5 * (self.values[-1] + vv)
+                else:
+                    seg = (tt - self.times[-1]) * self.values[-1]
+                if math.isfinite(seg):
+                    self._cumint.append(self._cumint[-1] + seg)
+                    self._cumbad.append(self._cumbad[-1])
+                else:
+                    self._cumint.append(self._cumint[-1])
+                    self._cumbad.append(self._cumbad[-1] + 1)
+            else:
+                self._cumint.append(0.0)
+                self._cumbad.append(0.0)
         if self.max_query_time is not None and tt <= self.max_query_time:
-            print(f'Warning: append({t}, {v}) to STS {self.identifier} risks invalidating previously-queried value for time {self.max_query_time} for which we did not record the queried value')
+            print(f'Warning: append({tt} {self.t_unit}, {vv} {self.v_unit}) to STS {self.identifier} risks invalidating previously-queried value for time {self.max_query_time} for which we did not record the queried value')
         self.times.append(tt)
         self.values.append(vv)
+        self._version += 1
 
     def extend(self, times, values, skip_nan_values=False):
         assert len(times) == len(values)
-        for t, v in zip(times, values):
-            if skip_nan_values and np.isnan(v.magnitude):
-                continue
-            self.append(t, v)
+        self.extend_array(times, values, skip_nan_values=skip_nan_values)
+
+    def extend_array(self, times, values, t_unit=None, v_unit=None, skip_nan_values=False):
+        """Append many (time, value) pairs at once.
+
+        `times` and `values` may be pint arrays, sequences of pint scalars, or
+        raw magnitudes (e.g. ndarrays) in the given `t_unit` and `v_unit`.
+        Units are converted once, ordering is checked once, and the data are
+        appended by buffer copy, rather than going through `append` per element.
+        """
+        ts = _magnitudes(times, self.t_unit, t_unit)
+        vs = _magnitudes(values, self.v_unit, v_unit)
+        assert ts.shape == vs.shape, (ts.shape, vs.shape)
+        if skip_nan_values:
+            keep = ~np.isnan(vs)
+            ts = ts[keep]
+            vs = vs[keep]
+        if not len(ts):
+            return
+        assert np.all(ts[1:] > ts[:-1])
+        if len(self.times):
+            assert ts[0] > self.times[-1]
+        if self.max_query_time is not None and ts[0] <= self.max_query_time:
+            print(f'Warning: extend_array from time {ts[0]} {self.t_unit} to STS {self.identifier} risks invalidating previously-queried value for time {self.max_query_time} for which we did not record the queried value')
+        self._unshare()
+        _buf_extend(self.times, ts)
+        _buf_extend(self.values, vs)
+        self._version += 1
 
     def plot(self, t_unit=None, annotate=True, **kwargs):
         import matplotlib.pyplot as plt
@@ -185,7 +501,7 @@ class STS(BaseModel):
         elif t_unit is None:
             t_unit = self.t_unit
         if t_unit != self.t_unit:
-            t_scalar = (1.0 * self.t_unit / t_unit).to('dimensionless').magnitude
+            t_scalar = conversion_factor(self.t_unit, t_unit)
             times = [tt * t_scalar for tt in self.times]
         else:
             times = self.times
@@ -202,20 +518,12 @@ class STS(BaseModel):
     def to(self, v_unit):
         if isinstance(v_unit, str):
             v_unit = getattr(u, v_unit)
-        scalar = (1.0 * self.v_unit / v_unit).to('dimensionless').magnitude
-        default_value = (
-            None
-            if self.interpolation == InterpolationMode.no_interpolation
-            else self.values[0] * scalar * v_unit)
-        rval = SparseTimeSeries(
-            times=[tt * self.t_unit for tt in self.times],
-            values=[v * scalar * v_unit for v in self.values[1:]],
-            default_value=default_value,
+        return _from_arrays(
+            times=self.times,
+            values=_as_float_array(self.values) * conversion_factor(self.v_unit, v_unit),
             t_unit=self.t_unit,
-            unit=v_unit,
-            identifier=None,
+            v_unit=v_unit,
             interpolation=self.interpolation)
-        return rval
 
     def annotate_plot(self, t_unit=None, **kwargs):
         """Called once per variable name in comparison plots"""
@@ -231,6 +539,10 @@ class STS(BaseModel):
             if self.v_unit != u.dimensionless:
                 raise TypeError(other)
             return add_scalar(self, other)
+        elif isinstance(other, LazySTS):
+            return lazy(self) + other
+        elif isinstance(other, EnsembleSTS):
+            return _ensemble_binary('add', self, other)
 
         self_nointerp = (self.interpolation == InterpolationMode.no_interpolation)
         other_nointerp = (other.interpolation == InterpolationMode.no_interpolation)
@@ -249,6 +561,32 @@ class STS(BaseModel):
     def __radd__(self, other):
         return self.__add__(other)
 
+    def iadd_aligned(self, other, fill_zero=False):
+        """Add the STS `other` into self in place, evaluating it at
+        self.times, which must already include every time at which `other`
+        is defined or changes value (e.g. a grid prepared by sum_aligned).
+
+        Where a no_interpolation `other` is not defined, the sum is NaN, or
+        unchanged if `fill_zero` is true.
+        """
+        if self.t_unit != other.t_unit:
+            raise NotImplementedError()
+        scalar = conversion_factor(other.v_unit, self.v_unit)
+        other_values, valids = _values_at(other, _as_float_array(self.times))
+        other_values = other_values * scalar
+        other_values[~valids] = 0 if fill_zero else float('nan')
+        self._unshare()
+        values = _as_float_array(self.values)
+        if isinstance(self.values, list):
+            values = values.copy()
+        values[0] += scalar * other.values[0]
+        values[1:] += other_values
+        if isinstance(self.values, list):
+            self.values[:] = values.tolist()
+        del values
+        self._edited()
+        return self
+
     def __neg__(self):
         return scale(self, -1)
 
@@ -259,19 +597,14 @@ class STS(BaseModel):
         return (other + (-self))
 
     def __truediv__(self, other):
-        default_value = (
-            None
-            if self.interpolation == InterpolationMode.no_interpolation
-            else self.values[0] * self.v_unit / other)
-        rval = SparseTimeSeries(
-            times=[tt * self.t_unit for tt in self.times],
-            values=[v / other * self.v_unit for v in self.values[1:]],
-            default_value=default_value,
+        # one pint operation for the whole series
+        v_coef = 1.0 * self.v_unit / other
+        return _from_arrays(
+            times=self.times,
+            values=_as_float_array(self.values) * v_coef.magnitude,
             t_unit=self.t_unit,
-            unit=(self.v_unit / other).u,
-            identifier=None,
+            v_unit=v_coef.u,
             interpolation=self.interpolation)
-        return rval
 
     def __rtruediv__(self, other):
         raise NotImplementedError()
@@ -279,6 +612,10 @@ class STS(BaseModel):
     def __mul__(self, other):
         if isinstance(other, STS):
             return mul_sts_sts(self, other)
+        elif isinstance(other, LazySTS):
+            return lazy(self) * other
+        elif isinstance(other, EnsembleSTS):
+            return _ensemble_binary('mul', self, other)
         elif isinstance(other, (int, float)):
             return scale(self, other)
         elif isinstance(other, pint.Quantity) and isinstance(other.magnitude, (int, float)):
@@ -297,56 +634,113 @@ class STS(BaseModel):
         rval = sum(self.values[1:]) * self.v_unit
         return rval
 
+    def _cumulative_integral(self):
+        """Return the (_cumint, _cumbad) prefix-sum index, (re)building it
+        if it is missing or out of date.
+        """
+        n_times = len(self.times)
+        if self._cumint is None or len(self._cumint) != n_times:
+            if n_times:
+                times = _as_float_array(self.times)
+                values = _as_float_array(self.values)
+                if self.interpolation == InterpolationMode.linear:
+                    # exact trapezoids
+                    segs = np.diff(times) * 0.5 * (values[1:n_times] + values[2:n_times + 1])
+                else:
+                    segs = np.diff(times) * values[1:n_times]
+                bad = ~np.isfinite(segs)
+                segs[bad] = 0
+                self._cumint = _array_d(np.concatenate([[0.0], np.cumsum(segs)]))
+                self._cumbad = _array_d(np.concatenate([[0.0], np.cumsum(bad)]))
+            else:
+                self._cumint = array.array('d')
+                self._cumbad = array.array('d')
+        return self._cumint, self._cumbad
+
+    def _integrals_to(self, ts):
+        """Return (integrals, n_bad) ndarrays: the integral from times[0]
+        (or from 0 if there are no times) up to each of the native times `ts`,
+        and the number of non-finite whole segments in that range.
+
+        The difference of two integrals is the integral between them,
+        which is only valid if the n_bad values are equal.
+        """
+        ts = np.asarray(ts, dtype='d')
+        values = _as_float_array(self.values)
+        if not len(self.times):
+            return ts * values[0], np.zeros(ts.shape)
+        cumint, cumbad = self._cumulative_integral()
+        times = _as_float_array(self.times)
+        idxs = np.searchsorted(times, ts, side='right')
+        prev_idxs = np.maximum(idxs - 1, 0)
+        dts = ts - times[prev_idxs]
+        if self.interpolation == InterpolationMode.linear:
+            # trapezoid from the previous time (or constant before the first)
+            seg_values = 0.5 * (values[1:][prev_idxs] + np.interp(ts, times, values[1:]))
+        else:
+            seg_values = values[idxs]
+        with np.errstate(invalid='ignore'):
+            # zero-length partial segments contribute 0 even if their value is not finite
+            partials = np.where(dts == 0, 0.0, dts * seg_values)
+        integrals = np.where(
+            idxs > 0,
+            _as_float_array(cumint)[prev_idxs] + partials,
+            partials)
+        n_bad = np.where(idxs > 0, _as_float_array(cumbad)[prev_idxs], 0)
+        return integrals, n_bad
+
+    def _bin_integrals_raw(self, boundaries):
+        """Return the integrals over the intervals between consecutive native
+        times in `boundaries` (which must be sorted), as an ndarray.
+        """
+        integrals, n_bad = self._integrals_to(boundaries)
+        rval = np.diff(integrals)
+        rval[np.diff(n_bad) != 0] = float('nan')
+        return rval
+
     def bin_integral(self, start_time, end_time):
+        """Return the time-integral of the series from `start_time` to `end_time`.
+
+        Cost is two binary searches into a prefix-sum index that is maintained
+        incrementally as values are appended.
+        """
         if self.interpolation == InterpolationMode.no_interpolation:
             raise NotImplementedError()
-        i0, v0 = self._idx_of_time(start_time)
-        i1, v1 = self._idx_of_time(end_time)
-        assert v0 and v1
-        assert i0 >= 0
-        idxs = list(range(i0, i1)) + [i1]
-        values = [self.values[ii] for ii in idxs]
-        times = [self.times[ii - 1] for ii in idxs]
-        # clip to range
-        times[0] = start_time.to(self.t_unit).magnitude
-        times[-1] = end_time.to(self.t_unit).magnitude
-        rval = 0
-        for t0, t1, vv in zip(times, times[1:], values):
-            rval += (t1 - t0) * vv
-        return rval * self.t_unit * self.v_unit
+        t0 = start_time.magnitude * conversion_factor(start_time.u, self.t_unit)
+        t1 = end_time.magnitude * conversion_factor(end_time.u, self.t_unit)
+        assert t0 <= t1
+        self.max_query_time = (
+            t1 if self.max_query_time is None
+            else max(t1, self.max_query_time))
+        rval, = self._bin_integrals_raw([t0, t1])
+        return float(rval) * self.t_unit * self.v_unit
 
     def bin_integrals(self, bin_boundaries,
                       default_value=float('nan'),
                       interpolation=InterpolationMode.no_interpolation):
-        native_boundaries = [tt.to(self.t_unit).magnitude
-                             for tt in sorted(bin_boundaries)]
-        # Time integrals over bins
+        """Return an STS with the time-integral over each bin, at the start time
+        of each bin. The last boundary closes the last bin.
+        """
         if self.interpolation == InterpolationMode.no_interpolation:
             raise NotImplementedError()
-        tmp = self.native_interp(bin_boundaries)
-        bin_sums = {tt: 0 for tt in native_boundaries}
-        current_bin = native_boundaries[0]
-        for t0, t1, vv in zip(tmp.times, tmp.times[1:], tmp.values[1:]):
-            if t0 < current_bin: # cuts out times before bins begin
-                continue
-            bin_sums[current_bin] += (t1 - t0) * vv
-            if t1 in bin_sums:
-                if t1 == native_boundaries[-1]:
-                    break
-                else:
-                    current_bin = t1
-        times, values = zip(*sorted(bin_sums.items()))
-        # trimming off the last times and values because the upper limit wasn't actually a bin
-        return STS(
-            times=array.array('d', times[:-1]),
+        boundaries = np.sort(self._raw_times(bin_boundaries))
+        if len(boundaries):
+            t_last = float(boundaries[-1])
+            self.max_query_time = (
+                t_last if self.max_query_time is None
+                else max(t_last, self.max_query_time))
+        values = np.empty(max(len(boundaries), 1))
+        values[0] = default_value
+        values[1:] = self._bin_integrals_raw(boundaries)
+        return _from_arrays(
+            times=boundaries[:-1],
+            values=values,
             t_unit=self.t_unit,
-            values=array.array('d', [default_value] + list(values[:-1])),
             v_unit=self.t_unit * self.v_unit,
-            interpolation=interpolation,
-            )
+            interpolation=interpolation)
 
     def delay(self, amount):
-        native_amount = amount.to(self.t_unit).magnitude
+        native_amount = amount.magnitude * conversion_factor(amount.u, self.t_unit)
         return self.__class__(
             times=array.array('d', [tt + native_amount for tt in self.times]),
             values=array.array('d', self.values),
@@ -358,12 +752,13 @@ class STS(BaseModel):
         assert self.interpolation == InterpolationMode.no_interpolation
         as_d = dict(zip(self.times, self.values[1:]))
         for ttu in times:
-            tt = ttu.to(self.t_unit).magnitude
+            tt = ttu.magnitude * conversion_factor(ttu.u, self.t_unit)
             as_d.setdefault(tt, val)
         times, values = zip(*list(sorted(as_d.items())))
         self.times = array.array('d', times)
         self.values = array.array('d', self.values[:1])
         self.values.extend(values)
+        self._edited()
         return self
 
     def setdefault_zero(self, times):
@@ -381,8 +776,7 @@ class STS(BaseModel):
         return self._setdefault_scalar(times, 0)
 
     def interp(self, times): # TODO: rename this linear_interp
-        raw_times = [tt.to(self.t_unit).magnitude for tt in times]
-        raw_times.sort()
+        raw_times = sorted(self._raw_times(times))
         if self.interpolation == InterpolationMode.no_interpolation:
             values = np.interp(
                 x=raw_times,
@@ -413,6 +807,29 @@ class STS(BaseModel):
             interpolation=self.interpolation)
 
 
+def _from_arrays(times, values, t_unit, v_unit, interpolation):
+    """Return a new STS from raw `times` and `values` (including the default
+    value at values[0]), copying them rather than appending element by element.
+    """
+    return STS(
+        times=_array_d(times),
+        values=_array_d(values),
+        t_unit=t_unit,
+        v_unit=v_unit,
+        interpolation=interpolation)
+
+
+def _values_at(self, raw_times):
+    """Return (values, valids) ndarrays of `self` at `raw_times`, which must
+    be expressed in self.t_unit.
+    """
+    if self.interpolation == InterpolationMode.linear:
+        values = self._linear_values(raw_times)
+        return values, np.ones(values.shape, dtype=bool)
+    idxs, valids = self._idxs_of_raw_times(raw_times)
+    return _as_float_array(self.values)[idxs], valids
+
+
 def SparseTimeSeries(times=None, values=None, unit=None, identifier=None, t_unit=u.seconds,
                      default_value=None,
                      interpolation='current',
@@ -451,7 +868,7 @@ def SparseTimeSeries(times=None, values=None, unit=None, identifier=None, t_unit
     if default_value is None:
         self.values.append(float('nan'))
     else:
-        self.values.append(default_value.to(self.v_unit).magnitude)
+        self.values.append(default_value.magnitude * conversion_factor(default_value.u, self.v_unit))
     if times is not None:
         self.extend(times, values, skip_nan_values=skip_nan_values)
 
@@ -469,24 +886,26 @@ def annual_report2(years, values, v_unit, include_nan_values=True,
                    identifier=None,
                    interpolation=InterpolationMode.no_interpolation):
     # This is a faster implementation of annual_report
-    array_values = array.array('d', [float('nan')])
-    array_times = array.array('d')
+    # `values` may be raw (in v_unit) or pint quantities
     assert len(years) == len(values)
-    if include_nan_values:
-        array_times.extend(years)
-        array_values.extend(values)
-    else:
-        for tt, vv in zip(years, values):
-            if not np.isnan(vv):
-                array_times.append(tt)
-                array_values.append(vv)
-    return STS(
+    rval = STS(
         t_unit=u.years,
         v_unit=v_unit,
-        times=array_times,
-        values=array_values,
+        times=array.array('d'),
+        values=array.array('d', [float('nan')]),
         identifier=identifier,
         interpolation=interpolation)
+    if len(values) and isinstance(values[0], pint.Quantity):
+        raw_values = _magnitudes(values, v_unit)
+    else:
+        raw_values = np.asarray(values, dtype='d')
+    # N.B. this checks that years are increasing, which previously went unchecked
+    rval.extend_array(
+        years, raw_values,
+        t_unit=u.years,
+        v_unit=v_unit,
+        skip_nan_values=not include_nan_values)
+    return rval
 
 
 def annual_report_decay(self, timescale, horizon):
@@ -521,45 +940,27 @@ def add_nointerp_nointerp(self, other):
     assert self.interpolation == InterpolationMode.no_interpolation
     assert other.interpolation == InterpolationMode.no_interpolation
 
-    default_value = None
-    interpolation = InterpolationMode.no_interpolation
     if self.t_unit != other.t_unit:
         raise NotImplementedError()
-    t_unit = self.t_unit
-    other_as_dict = {tt:vv for tt, vv in zip(other.times, other.values[1:])}
-    times = []
-    self_values = []
-    other_values = []
-    for tt, vv in zip(self.times, self.values[1:]):
-        try:
-            other_values.append(other_as_dict[tt])
-            times.append(tt)
-            self_values.append(vv)
-        except KeyError:
-            continue
-    rval_values = array.array('d', [float('nan')])
-    rval_times = array.array('d', times)
-    if times:
-        typed_self_values = np.asarray(self_values) * self.v_unit
-        typed_other_values = np.asarray(other_values) * other.v_unit
-        typed_rval_values = typed_self_values + typed_other_values
-        rval_values.extend(typed_rval_values.magnitude)
-        rval = STS(
-            times=rval_times,
-            values=rval_values,
-            t_unit=t_unit,
-            v_unit=typed_rval_values.u,
-            identifier=None,
-            interpolation=InterpolationMode.no_interpolation)
-    else:
-        rval = STS(
-            times=rval_times,
-            values=rval_values,
-            t_unit=t_unit,
-            v_unit=self.v_unit,
-            identifier=None,
-            interpolation=InterpolationMode.no_interpolation)
-    return rval
+    times, self_idxs, other_idxs = np.intersect1d(
+        _as_float_array(self.times),
+        _as_float_array(other.times),
+        assume_unique=True,
+        return_indices=True)
+    values = np.empty(len(times) + 1)
+    values[0] = float('nan')
+    if len(times):
+        # like pint, the sum takes the units of the left operand
+        scalar = conversion_factor(other.v_unit, self.v_unit)
+        values[1:] = (
+            _as_float_array(self.values)[1:][self_idxs]
+            + scalar * _as_float_array(other.values)[1:][other_idxs])
+    return _from_arrays(
+        times=times,
+        values=values,
+        t_unit=self.t_unit,
+        v_unit=self.v_unit,
+        interpolation=InterpolationMode.no_interpolation)
 
 
 def add_nointerp_interp(self, other):
@@ -568,24 +969,18 @@ def add_nointerp_interp(self, other):
 
     if self.t_unit != other.t_unit:
         raise NotImplementedError()
-    t_unit = self.t_unit
-    times = [tt * t_unit for tt in self.times]
-    other_values_at_times = other.query(times)
-    values = [vv * self.v_unit + ov
-              for vv, ov in zip(self.values[1:], other_values_at_times)]
-    if values:
-        v_unit = values[0].u
-    else:
-        v_unit = (1 * self.v_unit + 1 * other.v_unit).u
-    rval = SparseTimeSeries(
+    scalar = conversion_factor(other.v_unit, self.v_unit)
+    times = _as_float_array(self.times)
+    other_values, _ = _values_at(other, times)
+    values = np.empty(len(times) + 1)
+    values[0] = float('nan')
+    values[1:] = _as_float_array(self.values)[1:] + scalar * other_values
+    return _from_arrays(
         times=times,
         values=values,
-        default_value=None,
-        t_unit=t_unit,
-        unit=v_unit,
-        identifier=None,
+        t_unit=self.t_unit,
+        v_unit=self.v_unit,
         interpolation=InterpolationMode.no_interpolation)
-    return rval
 
 def add_scalar(self, other):
     # other may be number or pint quantity
@@ -659,7 +1054,9 @@ def interleave(args, t_unit=None):
 
 def with_default_zero(self, times):
     # times may be ndarray
-    if len(times) and isinstance(self, STS):
+    if len(times) and isinstance(self, LazySTS):
+        return self.with_default_zero(times)
+    elif len(times) and isinstance(self, STS):
         rval = self.copy()
         rval.setdefault_zero(times)
         return rval
@@ -672,119 +1069,157 @@ def with_default_zero(self, times):
 def mul_no_interp_no_interp(a, b):
     if a.t_unit != b.t_unit:
         raise NotImplementedError()
-    t_unit = a.t_unit
-    v_unit = a.v_unit * b.v_unit
 
     # no interpolation means no default value
     assert np.isnan(a.values[0])
     assert np.isnan(b.values[0])
 
-    a_d = dict(zip(a.times, a.values[1:]))
-    c_d = dict()
-    for b_t, b_v in zip(b.times, b.values[1:]):
-        if b_t in a_d:
-            c_d[b_t] = b_v * a_d[b_t]
-
-    c_times, c_values = zip(*sorted(c_d.items()))
-
-    rval = SparseTimeSeries(
-        times=[tt * t_unit for tt in c_times],
-        values=[vv * v_unit for vv in c_values],
-        default_value=None,
-        t_unit=t_unit,
-        unit=v_unit,
-        identifier=None,
-        interpolation='no_interpolation')
-    return rval
+    times, a_idxs, b_idxs = np.intersect1d(
+        _as_float_array(a.times),
+        _as_float_array(b.times),
+        assume_unique=True,
+        return_indices=True)
+    values = np.empty(len(times) + 1)
+    values[0] = float('nan')
+    values[1:] = (
+        _as_float_array(a.values)[1:][a_idxs]
+        * _as_float_array(b.values)[1:][b_idxs])
+    return _from_arrays(
+        times=times,
+        values=values,
+        t_unit=a.t_unit,
+        v_unit=a.v_unit * b.v_unit,
+        interpolation=InterpolationMode.no_interpolation)
 
 
 def mul_no_interp_sts(a, b):
     if a.t_unit != b.t_unit:
         raise NotImplementedError()
-    t_unit = a.t_unit
-    v_unit = a.v_unit * b.v_unit
 
     # no interpolation means no default value
     assert np.isnan(a.values[0])
 
-    c_times = []
-    c_values = []
-    for a_t, a_v_nounit in zip(a.times, a.values[1:]):
-        b_v = b.query(a_t * t_unit) # has b unit
-        c_times.append(a_t * t_unit)
-        c_values.append(a_v_nounit * b_v * a.v_unit)
-
-    rval = SparseTimeSeries(
-        times=c_times,
-        values=c_values,
-        default_value=None,
-        t_unit=t_unit,
-        unit=v_unit,
-        identifier=None,
-        interpolation='no_interpolation')
-    return rval
+    times = _as_float_array(a.times)
+    b_values, b_valids = _values_at(b, times)
+    assert b_valids.all()
+    values = np.empty(len(times) + 1)
+    values[0] = float('nan')
+    values[1:] = _as_float_array(a.values)[1:] * b_values
+    return _from_arrays(
+        times=times,
+        values=values,
+        t_unit=a.t_unit,
+        v_unit=a.v_unit * b.v_unit,
+        interpolation=InterpolationMode.no_interpolation)
 
 
 def add_interp_interp(a, b):
     if a.t_unit != b.t_unit:
         raise NotImplementedError()
-    else:
-        t_unit = a.t_unit
-    if a.v_unit != b.v_unit:
-        raise NotImplementedError()
-    else:
-        v_unit = a.v_unit
     assert a.interpolation != InterpolationMode.no_interpolation
     assert b.interpolation != InterpolationMode.no_interpolation
-    if a.interpolation == b.interpolation == InterpolationMode.current:
-        interpolation = InterpolationMode.current
+    if a.interpolation == b.interpolation:
+        interpolation = a.interpolation
     else:
+        # steps in linear series are not representable
         raise NotImplementedError()
 
-    raw_times = sorted(set(list(a.times) + list(b.times)))
-    times = [tt * t_unit for tt in raw_times]
-    interp_a = a.native_interp(times)
-    interp_b = b.native_interp(times)
-    assert len(interp_a.times) == len(interp_b.times)
-    assert len(interp_a.values) == len(interp_b.values)
-    raw_values = [av + bv for av, bv in zip(interp_a.values, interp_b.values)]
+    scalar = conversion_factor(b.v_unit, a.v_unit)
+    times = np.union1d(_as_float_array(a.times), _as_float_array(b.times))
+    a_values, _ = _values_at(a, times)
+    b_values, _ = _values_at(b, times)
+    values = np.empty(len(times) + 1)
+    values[0] = a.values[0] + scalar * b.values[0]
+    values[1:] = a_values + scalar * b_values
+    return _from_arrays(
+        times=times,
+        values=values,
+        t_unit=a.t_unit,
+        v_unit=a.v_unit,
+        interpolation=interpolation)
 
-    rval = STS(
-        times=array.array('d', raw_times),
-        t_unit=t_unit,
-        values=array.array('d', raw_values),
-        v_unit=v_unit,
+
+def sum_aligned(objs, fill_zero=False):
+    """Return the sum of `objs` (STS and zero pint scalars) in one pass,
+    by accumulating every series into one STS on a shared time grid with
+    iadd_aligned, or NotImplemented if that would differ from summing
+    them left to right.
+
+    If `fill_zero` is true, no_interpolation series count as zero where
+    they are not defined, as if with_default_zero had been applied to each
+    at the union of their times.
+    """
+    series = []
+    for obj in objs:
+        if obj.__class__ is STS:
+            series.append(obj)
+        elif objtensor._is_pint_scalar(obj) and obj.magnitude == 0:
+            continue
+        else:
+            return NotImplemented
+    if not series:
+        return NotImplemented
+    first = series[0]
+    if any(obj.t_unit != first.t_unit for obj in series):
+        return NotImplemented
+    nointerp = [obj for obj in series
+                if obj.interpolation == InterpolationMode.no_interpolation]
+    if nointerp:
+        interpolation = InterpolationMode.no_interpolation
+        # without fill_zero, the sum is only defined where every
+        # no_interpolation term is
+        combine = np.union1d if fill_zero else np.intersect1d
+        times = functools.reduce(
+            combine, [_as_float_array(obj.times) for obj in nointerp])
+    else:
+        interpolation = first.interpolation
+        if any(obj.interpolation != interpolation for obj in series):
+            return NotImplemented
+        # like __add__, skip terms that are all zero
+        series = [first] + [obj for obj in series[1:]
+                             if not all(vv == 0 for vv in obj.values)]
+        times = functools.reduce(
+            np.union1d, [_as_float_array(obj.times) for obj in series])
+    rval = _from_arrays(
+        times=times,
+        values=np.zeros(len(times) + 1),
+        t_unit=first.t_unit,
+        # as for __add__, which keeps the units of the left operand, unless
+        # only the right one is no_interpolation
+        v_unit=nointerp[0].v_unit if nointerp else first.v_unit,
         interpolation=interpolation)
+    for obj in series:
+        rval.iadd_aligned(obj, fill_zero=fill_zero)
+    if nointerp:
+        rval.values[0] = float('nan')
     return rval
 
 
 def mul_interp_interp(a, b):
     if a.t_unit != b.t_unit:
         raise NotImplementedError()
-    t_unit = a.t_unit
-    v_unit = a.v_unit * b.v_unit
     assert a.interpolation != InterpolationMode.no_interpolation
     assert b.interpolation != InterpolationMode.no_interpolation
-    if a.interpolation == b.interpolation == InterpolationMode.current:
-        interpolation = InterpolationMode.current
+    if a.interpolation == b.interpolation:
+        # N.B. the product of linear series is only evaluated at the
+        # breakpoints of either, not densified
+        interpolation = a.interpolation
     else:
+        # steps in linear series are not representable
         raise NotImplementedError()
 
-    raw_times = sorted(set(list(a.times) + list(b.times)))
-    times = [tt * t_unit for tt in raw_times]
-    interp_a = a.native_interp(times)
-    interp_b = b.native_interp(times)
-    assert len(interp_a.times) == len(interp_b.times)
-    assert len(interp_a.values) == len(interp_b.values)
-    raw_values = [av * bv for av, bv in zip(interp_a.values, interp_b.values)]
-
-    rval = STS(
-        times=array.array('d', raw_times),
-        t_unit=t_unit,
-        values=array.array('d', raw_values),
-        v_unit=v_unit,
+    times = np.union1d(_as_float_array(a.times), _as_float_array(b.times))
+    a_values, _ = _values_at(a, times)
+    b_values, _ = _values_at(b, times)
+    values = np.empty(len(times) + 1)
+    values[0] = a.values[0] * b.values[0]
+    values[1:] = a_values * b_values
+    return _from_arrays(
+        times=times,
+        values=values,
+        t_unit=a.t_unit,
+        v_unit=a.v_unit * b.v_unit,
         interpolation=interpolation)
-    return rval
 
 
 def mul_sts_sts(self, other):
@@ -804,37 +1239,825 @@ def mul_sts_sts(self, other):
 
 def scale(self, amount):
     assert isinstance(amount, (float, int))
-    rval_times = array.array('d', self.times)
-    rval_values = array.array('d', [vv * amount for vv in self.values])
-    rval = STS(
-        times=rval_times,
-        values=rval_values,
+    return _from_arrays(
+        times=self.times,
+        values=_as_float_array(self.values) * amount,
         t_unit=self.t_unit,
         v_unit=self.v_unit,
         interpolation=self.interpolation)
-    return rval
 
 
 def scale_convert(self, amount):
+    # one pint operation for the whole series
     v_coef = amount * self.v_unit
-    if self.interpolation == InterpolationMode.no_interpolation:
-        default_value = None
-    else:
-        default_value = self.values[0] * v_coef
-    rval = SparseTimeSeries(
-        times=[tt * self.t_unit for tt in self.times],
-        values=[vv * v_coef for vv in self.values[1:]],
-        default_value=default_value,
+    return _from_arrays(
+        times=self.times,
+        values=_as_float_array(self.values) * v_coef.magnitude,
         t_unit=self.t_unit,
-        unit=v_coef.u,
-        identifier=None,
+        v_unit=v_coef.u,
         interpolation=self.interpolation)
+
+class EnsembleSTS(object):
+    """A time series whose values are an ensemble of `n_samples` samples,
+    for carrying many uncertainty samples through a calculation in one pass.
+
+    Times are shared by all samples. Queries, arithmetic, integrals and sums
+    broadcast over the sample axis, and deterministic operands (numbers,
+    pint scalars, STS) are broadcast to every sample.
+    Use `quantile` or `quantile_batch` to summarize the ensemble.
+    Only current and no_interpolation modes are supported.
+    """
+
+    def __init__(self, n_samples, t_unit, v_unit,
+                 interpolation=InterpolationMode.current,
+                 default_value=float('nan'),
+                 identifier=None):
+        if isinstance(t_unit, str):
+            t_unit = getattr(u, t_unit)
+        if isinstance(v_unit, str):
+            v_unit = getattr(u, v_unit)
+        self.n_samples = n_samples
+        self.t_unit = t_unit
+        self.v_unit = v_unit
+        self.interpolation = InterpolationMode(interpolation)
+        if self.interpolation == InterpolationMode.linear:
+            raise NotImplementedError('EnsembleSTS does not support linear interpolation')
+        self.identifier = identifier
+        self.current_readers = []
+        self.writer = None
+        self.max_query_time = None
+        self.times = array.array('d')
+        self._set_values(self._samples_like(default_value, v_unit)[:, None])
+
+    @classmethod
+    def from_arrays(cls, times, values, t_unit, v_unit, interpolation, identifier=None):
+        """Return a new EnsembleSTS from raw `times` (n_times,) and `values`
+        (n_samples, n_times + 1), where values[:, 0] is the default value.
+        """
+        values = np.asarray(values, dtype='d')
+        rval = cls(
+            n_samples=values.shape[0],
+            t_unit=t_unit,
+            v_unit=v_unit,
+            interpolation=interpolation,
+            identifier=identifier)
+        rval.times = _array_d(times)
+        rval._set_values(values)
+        return rval
+
+    @classmethod
+    def from_sts(cls, sts, n_samples):
+        """Return an ensemble of `n_samples` identical copies of `sts`"""
+        values = np.broadcast_to(_as_float_array(sts.values), (n_samples, len(sts.values)))
+        return cls.from_arrays(
+            times=sts.times,
+            values=values,
+            t_unit=sts.t_unit,
+            v_unit=sts.v_unit,
+            interpolation=sts.interpolation)
+
+    def __repr__(self):
+        return f'EnsembleSTS(id={self.identifier}, n_samples={self.n_samples}, n_times={len(self.times)}, v_unit={self.v_unit})'
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def values(self):
+        """The (n_samples, n_times + 1) ndarray of values.
+
+        This is a view of a buffer with room to append more columns, so it
+        does not see values appended later.
+        """
+        return self._buf[:, :self._n]
+
+    def _set_values(self, values):
+        # column-major, so that each appended column is contiguous
+        self._buf = np.array(values, dtype='d', order='F')
+        self._n = self._buf.shape[1]
+        self._shared = False
+
+    def _append_samples(self, samples):
+        if self._shared or self._n == self._buf.shape[1]:
+            # grow geometrically, so that appending is amortized O(n_samples)
+            buf = np.empty((self.n_samples, max(2 * self._n, 8)), order='F')
+            buf[:, :self._n] = self.values
+            self._buf = buf
+            self._shared = False
+        self._buf[:, self._n] = samples
+        self._n += 1
+
+    def _samples_like(self, v, v_unit=None):
+        """Return `v` (scalar or array, pint or raw in `v_unit`) as
+        an ndarray of n_samples raw values in self.v_unit
+        """
+        if isinstance(v, pint.Quantity):
+            v = np.asarray(v.magnitude, dtype='d') * conversion_factor(v.u, self.v_unit)
+        else:
+            v = np.asarray(v, dtype='d')
+            if v_unit is not None and v_unit != self.v_unit:
+                v = v * conversion_factor(v_unit, self.v_unit)
+        return np.array(np.broadcast_to(v, (self.n_samples,)))
+
+    def times_with_units(self):
+        return [tt * self.t_unit for tt in self.times]
+
+    def fork(self):
+        """Return a copy of self, for a forked State, that shares the values
+        buffer copy-on-write (see STS.fork)
+        """
+        rval = self.__class__.__new__(self.__class__)
+        rval.__dict__.update(self.__dict__)
+        rval.current_readers = list(self.current_readers)
+        rval.times = array.array('d', self.times)
+        self._shared = rval._shared = True
+        return rval
+
+    def append(self, t, v):
+        """Append time `t` with value `v`, which may be a pint array with one
+        value per sample, or a pint scalar shared by all samples.
+        """
+        self.append_raw(
+            t.magnitude * conversion_factor(t.u, self.t_unit),
+            self._samples_like(v))
+
+    def append_raw(self, tt, vv):
+        """`append` for a time that is already a float in `self.t_unit`, and
+        a value (a float, or an ndarray with one value per sample) that is
+        already in `self.v_unit`
+        """
+        if len(self.times):
+            assert tt > self.times[-1]
+        if self.max_query_time is not None and tt <= self.max_query_time:
+            print(f'Warning: append({tt} {self.t_unit}, ...) to EnsembleSTS {self.identifier} risks invalidating previously-queried value for time {self.max_query_time} for which we did not record the queried value')
+        self.times.append(tt)
+        self._append_samples(vv)
+
+    def _raw_times(self, t_query, t_unit=None):
+        return _magnitudes(t_query, self.t_unit, t_unit)
+
+    def _idxs_of_raw_times(self, ts):
+        return STS._idxs_of_raw_times(self, ts)
+
+    def query_batch(self, t_query, t_unit=None):
+        """Return the values at many times, as a pint array of shape
+        (n_samples, n_queries), with NaN where there is no valid value.
+        """
+        ts = self._raw_times(t_query, t_unit)
+        idxs, valids = self._idxs_of_raw_times(ts)
+        rval = self.values[:, idxs]
+        rval[:, ~valids] = float('nan')
+        return rval * self.v_unit
+
+    def query(self, t_query):
+        """Return the samples at time `t_query`, as a pint array"""
+        if isinstance(t_query, pint.Quantity) and not np.shape(t_query.magnitude):
+            ts = np.asarray([t_query.magnitude * conversion_factor(t_query.u, self.t_unit)])
+            idxs, valids = self._idxs_of_raw_times(ts)
+            assert valids[0]
+            return self._buf[:, idxs[0]] * self.v_unit
+        return self.query_batch(t_query)
+
+    def query_before(self, t_query):
+        """Return the samples in effect just before time `t_query`, as a
+        pint array (see STS.query_before)
+        """
+        ts = t_query.magnitude * conversion_factor(t_query.u, self.t_unit)
+        return self.query_raw(math.nextafter(ts, -math.inf)) * self.v_unit
+
+    def query_raw(self, ts):
+        """`query` for a time that is already a float in `self.t_unit`,
+        returning an ndarray of samples in `self.v_unit`
+        """
+        idxs, valids = self._idxs_of_raw_times(np.asarray([ts]))
+        assert valids[0]
+        return self._buf[:, idxs[0]].copy()
+
+    def quantile_batch(self, t_query, q, t_unit=None):
+        """Return quantile(s) `q` over samples at times `t_query`, as a pint
+        array of shape (n_queries,) or (len(q), n_queries)
+        """
+        samples = self.query_batch(t_query, t_unit=t_unit).magnitude
+        return np.quantile(samples, q, axis=0) * self.v_unit
+
+    def quantile(self, q):
+        """Return quantile `q` over samples, as an STS"""
+        return _from_arrays(
+            times=self.times,
+            values=np.quantile(self.values, q, axis=0),
+            t_unit=self.t_unit,
+            v_unit=self.v_unit,
+            interpolation=self.interpolation)
+
+    def mean(self):
+        """Return the mean over samples, as an STS"""
+        return _from_arrays(
+            times=self.times,
+            values=self.values.mean(axis=0),
+            t_unit=self.t_unit,
+            v_unit=self.v_unit,
+            interpolation=self.interpolation)
+
+    def sample(self, ii):
+        """Return sample `ii` as an STS"""
+        return _from_arrays(
+            times=self.times,
+            values=self.values[ii],
+            t_unit=self.t_unit,
+            v_unit=self.v_unit,
+            interpolation=self.interpolation)
+
+    def plot(self, t_unit=None, annotate=True, **kwargs):
+        import matplotlib.pyplot as plt
+        label = kwargs.pop('label', self.identifier)
+        self.quantile(0.5).plot(t_unit=t_unit, annotate=annotate, label=label, **kwargs)
+        t_unit = t_unit or self.t_unit
+        lo, hi = np.quantile(self.values[:, 1:], [0.05, 0.95], axis=0)
+        plt.fill_between(
+            _as_float_array(self.times) * conversion_factor(self.t_unit, t_unit),
+            lo, hi,
+            step='post' if self.interpolation == InterpolationMode.current else None,
+            alpha=0.25)
+
+    def sum(self):
+        """Return the sum over times, as a pint array with one value per sample"""
+        assert self.interpolation == InterpolationMode.no_interpolation
+        return self.values[:, 1:].sum(axis=1) * self.v_unit
+
+    def _integrals_to(self, ts):
+        """Per-sample version of STS._integrals_to: returns (integrals, n_bad)
+        ndarrays of shape (n_samples, len(ts)).
+        """
+        ts = np.asarray(ts, dtype='d')
+        values = self.values
+        if not len(self.times):
+            integrals = values[:, :1] * ts
+            return integrals, np.zeros(integrals.shape)
+        times = _as_float_array(self.times)
+        segs = np.diff(times) * values[:, 1:len(times)]
+        bad = ~np.isfinite(segs)
+        segs[bad] = 0
+        zeros = np.zeros((self.n_samples, 1))
+        cumint = np.concatenate([zeros, np.cumsum(segs, axis=1)], axis=1)
+        cumbad = np.concatenate([zeros, np.cumsum(bad, axis=1)], axis=1)
+        idxs = np.searchsorted(times, ts, side='right')
+        prev_idxs = np.maximum(idxs - 1, 0)
+        dts = ts - times[prev_idxs]
+        with np.errstate(invalid='ignore'):
+            partials = np.where(dts == 0, 0.0, dts * values[:, idxs])
+        integrals = np.where(idxs > 0, cumint[:, prev_idxs] + partials, partials)
+        n_bad = np.where(idxs > 0, cumbad[:, prev_idxs], 0)
+        return integrals, n_bad
+
+    def _bin_integrals_raw(self, boundaries):
+        integrals, n_bad = self._integrals_to(boundaries)
+        rval = np.diff(integrals, axis=1)
+        rval[np.diff(n_bad, axis=1) != 0] = float('nan')
+        return rval
+
+    def bin_integral(self, start_time, end_time):
+        """Return the time-integral from `start_time` to `end_time`, as a pint
+        array with one value per sample
+        """
+        if self.interpolation == InterpolationMode.no_interpolation:
+            raise NotImplementedError()
+        t0 = start_time.magnitude * conversion_factor(start_time.u, self.t_unit)
+        t1 = end_time.magnitude * conversion_factor(end_time.u, self.t_unit)
+        assert t0 <= t1
+        self.max_query_time = (
+            t1 if self.max_query_time is None
+            else max(t1, self.max_query_time))
+        return self._bin_integrals_raw([t0, t1])[:, 0] * self.t_unit * self.v_unit
+
+    def bin_integrals(self, bin_boundaries,
+                      default_value=float('nan'),
+                      interpolation=InterpolationMode.no_interpolation):
+        """Per-sample version of STS.bin_integrals"""
+        if self.interpolation == InterpolationMode.no_interpolation:
+            raise NotImplementedError()
+        boundaries = np.sort(self._raw_times(bin_boundaries))
+        if len(boundaries):
+            t_last = float(boundaries[-1])
+            self.max_query_time = (
+                t_last if self.max_query_time is None
+                else max(t_last, self.max_query_time))
+        values = np.empty((self.n_samples, max(len(boundaries), 1)))
+        values[:, 0] = default_value
+        values[:, 1:] = self._bin_integrals_raw(boundaries)
+        return EnsembleSTS.from_arrays(
+            times=boundaries[:-1],
+            values=values,
+            t_unit=self.t_unit,
+            v_unit=self.t_unit * self.v_unit,
+            interpolation=interpolation)
+
+    def to(self, v_unit):
+        if isinstance(v_unit, str):
+            v_unit = getattr(u, v_unit)
+        return self._like(self.values * conversion_factor(self.v_unit, v_unit), v_unit)
+
+    def copy(self):
+        return self._like(self.values.copy(), self.v_unit)
+
+    def _like(self, values, v_unit):
+        return EnsembleSTS.from_arrays(
+            times=self.times,
+            values=values,
+            t_unit=self.t_unit,
+            v_unit=v_unit,
+            interpolation=self.interpolation)
+
+    def __add__(self, other):
+        if isinstance(other, pint.Quantity):
+            return self._like(
+                self.values + np.asarray(other.magnitude)[..., None] * conversion_factor(other.u, self.v_unit),
+                self.v_unit)
+        elif isinstance(other, (float, int)):
+            if self.v_unit != u.dimensionless:
+                raise TypeError(other)
+            return self._like(self.values + other, self.v_unit)
+        elif isinstance(other, (STS, EnsembleSTS)):
+            return _ensemble_binary('add', self, other)
+        return NotImplemented
+
+    def __radd__(self, other):
+        if isinstance(other, STS):
+            return _ensemble_binary('add', other, self)
+        return self.__add__(other)
+
+    def __neg__(self):
+        return self._like(-self.values, self.v_unit)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return self._like(self.values * other, self.v_unit)
+        elif isinstance(other, pint.Quantity):
+            # pint arrays are treated as one scalar per sample
+            v_coef = other * self.v_unit
+            return self._like(
+                self.values * np.asarray(v_coef.magnitude)[..., None], v_coef.u)
+        elif isinstance(other, (STS, EnsembleSTS)):
+            return _ensemble_binary('mul', self, other)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if isinstance(other, STS):
+            return _ensemble_binary('mul', other, self)
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        v_coef = 1.0 * self.v_unit / other
+        return self._like(
+            self.values * np.asarray(v_coef.magnitude)[..., None], v_coef.u)
+
+
+def n_samples_of(*objs):
+    """Return the n_samples of the EnsembleSTS among `objs`, or None if
+    there are none (all the ensembles must have the same n_samples)
+    """
+    n_samples = set(obj.n_samples for obj in objs if isinstance(obj, EnsembleSTS))
+    if not n_samples:
+        return None
+    rval, = n_samples
     return rval
 
-if SparseTimeSeries not in objtensor._types_for_pint_to_ignore:
+
+def ensemble_like(sts, n_samples):
+    """Return `sts`, or if `n_samples` is not None, an ensemble of that many
+    copies of it; for a DynamicElement to declare outputs that are
+    ensembles if its inputs are (see `n_samples_of`).
+    """
+    if n_samples is None or isinstance(sts, EnsembleSTS):
+        return sts
+    return EnsembleSTS.from_sts(sts, n_samples)
+
+
+def _ensemble_binary(op, a, b):
+    """Return `a` `op` `b` as an EnsembleSTS, where `a` and `b` are
+    EnsembleSTS or STS (broadcast to every sample).
+    """
+    if a.t_unit != b.t_unit:
+        raise NotImplementedError()
+    a_nointerp = (a.interpolation == InterpolationMode.no_interpolation)
+    b_nointerp = (b.interpolation == InterpolationMode.no_interpolation)
+    a_times = _as_float_array(a.times)
+    b_times = _as_float_array(b.times)
+    if a_nointerp and b_nointerp:
+        times = np.intersect1d(a_times, b_times, assume_unique=True)
+    elif a_nointerp:
+        times = a_times.copy()
+    elif b_nointerp:
+        times = b_times.copy()
+    elif a.interpolation == b.interpolation == InterpolationMode.current:
+        times = np.union1d(a_times, b_times)
+    else:
+        raise NotImplementedError()
+    interpolation = (InterpolationMode.no_interpolation
+                     if a_nointerp or b_nointerp
+                     else InterpolationMode.current)
+
+    def values_on(x):
+        # (n_samples or 1, len(times) + 1), including the default
+        idxs, _ = x._idxs_of_raw_times(times)
+        values = np.asarray(x.values, dtype='d')
+        if values.ndim == 1:
+            values = values[None, :]
+        return np.concatenate([values[:, :1], values[:, idxs]], axis=1)
+
+    a_values = values_on(a)
+    b_values = values_on(b)
+    if op == 'add':
+        # like pint, the sum takes the units of the left operand
+        values = a_values + conversion_factor(b.v_unit, a.v_unit) * b_values
+        v_unit = a.v_unit
+    elif op == 'mul':
+        values = a_values * b_values
+        v_unit = a.v_unit * b.v_unit
+    else:
+        raise NotImplementedError(op)
+    if interpolation == InterpolationMode.no_interpolation:
+        values[:, 0] = float('nan')
+    return EnsembleSTS.from_arrays(
+        times=times,
+        values=values,
+        t_unit=a.t_unit,
+        v_unit=v_unit,
+        interpolation=interpolation)
+
+
+# Lazy expressions
+# ----------------
+# Wrapping series with `lazy(...)` makes arithmetic build a DAG of LazySTS
+# nodes instead of materializing an STS at every step. Nodes are hash-consed,
+# so rebuilding the same expression (e.g. on every echart() call) returns the
+# same node and its cached value. Evaluation walks the DAG once, works out the
+# time support of the result, and then evaluates every element-wise node
+# directly on that support, so no intermediate STS is ever constructed.
+#
+# The result agrees pointwise with eager evaluation, but it can carry extra
+# breakpoints where eager arithmetic had special cases (e.g. adding an
+# all-zero series).
+
+_lazy_nodes = weakref.WeakValueDictionary()
+
+# strong references to recently-evaluated nodes, so that their cached values
+# survive between rebuilds of the same expression
+_lazy_recent = collections.OrderedDict()
+_lazy_recent_maxlen = 1024
+
+_lazy_elemwise_ops = ('add', 'mul', 'scale', 'add_scalar')
+
+
+class LazySTS(object):
+    """A node in a lazily-evaluated expression over STS values.
+
+    Construct leaves with `lazy(...)`. The units, time unit and interpolation
+    mode of every node are worked out when it is built, but the values are
+    only computed by `evaluate()`, which is called implicitly by queries,
+    plotting, and declaration into a `State`.
+    """
+
+    def __init__(self, op, args, params, key, t_unit, v_unit, interpolation):
+        self.op = op
+        self.args = args
+        self.params = params
+        self.key = key
+        self.t_unit = t_unit
+        self.v_unit = v_unit
+        self.interpolation = interpolation
+        self._value = None
+        self._leaf_versions = None
+
+    def __repr__(self):
+        return f'LazySTS(op={self.op}, v_unit={self.v_unit}, interpolation={self.interpolation.value})'
+
+    def leaves(self):
+        """Return the distinct STS leaves of the expression"""
+        rval = {}
+        seen = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if node.op == 'leaf':
+                rval[id(node.args[0])] = node.args[0]
+            else:
+                stack.extend(node.args)
+        return list(rval.values())
+
+    def _is_fresh(self):
+        return (self._value is not None
+                and self._leaf_versions == tuple(leaf._version for leaf in self.leaves()))
+
+    def evaluate(self):
+        """Return the value of the expression as an STS (cached)"""
+        if self.op == 'leaf':
+            leaf, = self.args
+            return leaf
+        if not self._is_fresh():
+            self._value = _lazy_evaluate(self)
+            self._leaf_versions = tuple(leaf._version for leaf in self.leaves())
+        _lazy_recent[self.key] = self
+        _lazy_recent.move_to_end(self.key)
+        while len(_lazy_recent) > _lazy_recent_maxlen:
+            _lazy_recent.popitem(last=False)
+        return self._value
+
+    def as_sts(self):
+        return self.evaluate()
+
+    # Materialized accessors
+
+    @property
+    def times(self):
+        return self.evaluate().times
+
+    @property
+    def values(self):
+        return self.evaluate().values
+
+    def __len__(self):
+        return len(self.evaluate())
+
+    def times_with_units(self):
+        return self.evaluate().times_with_units()
+
+    def query(self, t_query):
+        return self.evaluate().query(t_query)
+
+    def query_batch(self, t_query, t_unit=None):
+        return self.evaluate().query_batch(t_query, t_unit=t_unit)
+
+    def max(self):
+        return self.evaluate().max()
+
+    def sum(self):
+        return self.evaluate().sum()
+
+    def bin_integral(self, start_time, end_time):
+        return self.evaluate().bin_integral(start_time, end_time)
+
+    def bin_integrals(self, *args, **kwargs):
+        return self.evaluate().bin_integrals(*args, **kwargs)
+
+    def plot(self, *args, **kwargs):
+        return self.evaluate().plot(*args, **kwargs)
+
+    def copy(self):
+        return self.evaluate().copy()
+
+    # Expression building
+
+    def to(self, v_unit):
+        if isinstance(v_unit, str):
+            v_unit = getattr(u, v_unit)
+        if v_unit == self.v_unit:
+            return self
+        return _lazy_scale(self, conversion_factor(self.v_unit, v_unit), v_unit)
+
+    def with_default_zero(self, times):
+        assert self.interpolation == InterpolationMode.no_interpolation
+        raw_times = tuple(sorted(set(_magnitudes(times, self.t_unit).tolist())))
+        return _lazy_node(
+            'setdefault_zero', (self,), raw_times,
+            t_unit=self.t_unit,
+            v_unit=self.v_unit,
+            interpolation=self.interpolation)
+
+    def __add__(self, other):
+        if isinstance(other, pint.Quantity):
+            if other.magnitude == 0:
+                # TODO: check units (as in STS.__add__)
+                return self
+            raise NotImplementedError()
+        elif isinstance(other, (float, int)):
+            if self.v_unit != u.dimensionless:
+                raise TypeError(other)
+            return _lazy_node(
+                'add_scalar', (self,), float(other),
+                t_unit=self.t_unit,
+                v_unit=self.v_unit,
+                interpolation=self.interpolation)
+        elif isinstance(other, STS):
+            other = lazy(other)
+        elif not isinstance(other, LazySTS):
+            return NotImplemented
+        return _lazy_binary('add', self, other, self.v_unit)
+
+    def __radd__(self, other):
+        if isinstance(other, STS):
+            return lazy(other) + self
+        return self.__add__(other)
+
+    def __neg__(self):
+        return _lazy_scale(self, -1.0, self.v_unit)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return _lazy_scale(self, float(other), self.v_unit)
+        elif isinstance(other, pint.Quantity) and isinstance(other.magnitude, (int, float)):
+            v_coef = other * self.v_unit
+            return _lazy_scale(self, float(v_coef.magnitude), v_coef.u)
+        elif isinstance(other, STS):
+            other = lazy(other)
+        elif not isinstance(other, LazySTS):
+            return NotImplemented
+        return _lazy_binary('mul', self, other, self.v_unit * other.v_unit)
+
+    def __rmul__(self, other):
+        if isinstance(other, STS):
+            return lazy(other) * self
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        v_coef = 1.0 * self.v_unit / other
+        return _lazy_scale(self, float(v_coef.magnitude), v_coef.u)
+
+
+def lazy(obj):
+    """Return `obj` with STS values wrapped as LazySTS leaves.
+
+    `obj` may be an STS, an ObjectTensor (whose STS elements
+    are wrapped), or anything else (which is returned as is).
+    """
+    if isinstance(obj, LazySTS):
+        return obj
+    elif isinstance(obj, STS):
+        return _lazy_node(
+            'leaf', (obj,), id(obj),
+            t_unit=obj.t_unit,
+            v_unit=obj.v_unit,
+            interpolation=obj.interpolation)
+    elif isinstance(obj, objtensor.ObjectTensor):
+        return obj.apply(lazy)
+    return obj
+
+
+def evaluate(obj):
+    """Inverse of `lazy`: return `obj` with LazySTS values evaluated"""
+    if isinstance(obj, LazySTS):
+        return obj.evaluate()
+    elif isinstance(obj, objtensor.ObjectTensor):
+        return obj.apply(evaluate)
+    return obj
+
+
+def _lazy_node(op, args, params, t_unit, v_unit, interpolation):
+    if op == 'leaf':
+        key = ('leaf', params)
+    else:
+        key = (op, params) + tuple(arg.key for arg in args)
+    try:
+        return _lazy_nodes[key]
+    except KeyError:
+        pass
+    rval = LazySTS(op, args, params, key,
+                   t_unit=t_unit,
+                   v_unit=v_unit,
+                   interpolation=interpolation)
+    _lazy_nodes[key] = rval
+    return rval
+
+
+def _lazy_scale(self, amount, v_unit):
+    return _lazy_node(
+        'scale', (self,), (amount, str(v_unit)),
+        t_unit=self.t_unit,
+        v_unit=v_unit,
+        interpolation=self.interpolation)
+
+
+def _lazy_binary(op, a, b, v_unit):
+    if a.t_unit != b.t_unit:
+        raise NotImplementedError()
+    if op == 'add':
+        # like pint, the sum takes the units of the left operand
+        params = conversion_factor(b.v_unit, a.v_unit)
+    else:
+        params = None
+    if (a.interpolation == InterpolationMode.no_interpolation
+            or b.interpolation == InterpolationMode.no_interpolation):
+        interpolation = InterpolationMode.no_interpolation
+    elif a.interpolation == b.interpolation:
+        interpolation = a.interpolation
+    else:
+        raise NotImplementedError()
+    return _lazy_node(op, (a, b), params,
+                      t_unit=a.t_unit,
+                      v_unit=v_unit,
+                      interpolation=interpolation)
+
+
+def _lazy_evaluate(root):
+    """Return the value of the LazySTS `root` as a new STS, in a single pass
+    over its element-wise nodes.
+    """
+    # Nodes that are not element-wise (leaves, barriers, and nodes with an
+    # up-to-date cached value) are materialized as STS inputs to the pass.
+    inputs = {}
+    order = []
+    seen = set()
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if node is not root and node.op in _lazy_elemwise_ops and node._is_fresh():
+            inputs[id(node)] = node._value
+        elif node.op == 'leaf':
+            inputs[id(node)] = node.evaluate()
+        elif node.op == 'setdefault_zero':
+            value = node.args[0].evaluate().copy()
+            value._setdefault_scalar([tt * node.t_unit for tt in node.params], 0)
+            inputs[id(node)] = value
+        else:
+            stack.append((node, True))
+            stack.extend((arg, False) for arg in node.args)
+    if id(root) in inputs:
+        return inputs[id(root)]
+
+    # the time support of each node: where it is defined for no_interpolation
+    # nodes, and where it has breakpoints otherwise
+    support = {}
+    for key, value in inputs.items():
+        support[key] = _as_float_array(value.times)
+    for node in order:
+        if node.op in ('add', 'mul'):
+            a, b = node.args
+            a_nointerp = (a.interpolation == InterpolationMode.no_interpolation)
+            b_nointerp = (b.interpolation == InterpolationMode.no_interpolation)
+            if a_nointerp and b_nointerp:
+                support[id(node)] = np.intersect1d(support[id(a)], support[id(b)], assume_unique=True)
+            elif a_nointerp:
+                support[id(node)] = support[id(a)]
+            elif b_nointerp:
+                support[id(node)] = support[id(b)]
+            else:
+                support[id(node)] = np.union1d(support[id(a)], support[id(b)])
+        else:
+            support[id(node)] = support[id(node.args[0])]
+
+    # the values of each node on the support of the root,
+    # as (default, values) where default is the value before the first time
+    times = support[id(root)]
+    evaluated = {}
+    for key, value in inputs.items():
+        evaluated[key] = (value.values[0], _values_at(value, times)[0])
+    for node in order:
+        if node.op == 'add':
+            (a0, a1), (b0, b1) = [evaluated[id(arg)] for arg in node.args]
+            evaluated[id(node)] = (a0 + node.params * b0, a1 + node.params * b1)
+        elif node.op == 'mul':
+            (a0, a1), (b0, b1) = [evaluated[id(arg)] for arg in node.args]
+            evaluated[id(node)] = (a0 * b0, a1 * b1)
+        elif node.op == 'scale':
+            a0, a1 = evaluated[id(node.args[0])]
+            amount, _ = node.params
+            evaluated[id(node)] = (a0 * amount, a1 * amount)
+        elif node.op == 'add_scalar':
+            a0, a1 = evaluated[id(node.args[0])]
+            evaluated[id(node)] = (a0 + node.params, a1 + node.params)
+        else:
+            raise NotImplementedError(node.op)
+
+    default, values_1 = evaluated[id(root)]
+    values = np.empty(len(times) + 1)
+    if root.interpolation == InterpolationMode.no_interpolation:
+        values[0] = float('nan')
+    else:
+        values[0] = default
+    values[1:] = values_1
+    return _from_arrays(
+        times=times,
+        values=values,
+        t_unit=root.t_unit,
+        v_unit=root.v_unit,
+        interpolation=root.interpolation)
+
+
+if STS not in objtensor._types_for_pint_to_ignore:
     objtensor._types_for_pint_to_ignore = (
         objtensor._types_for_pint_to_ignore
-        + (STS,))
+        + (STS, LazySTS, EnsembleSTS))
+    objtensor._accumulators[STS] = sum_aligned
 
 
 """
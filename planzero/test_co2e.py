@@ -1,9 +1,15 @@
 import numpy as np
+import pytest
 
-from .ureg import u
+from .ureg import u, kt_by_ghg
 from .enums import GHG
 from .ghgvalues import GWP_100
 from .planet_model import emissions_impulse_response_project_evaluation
+from .planet_model import EmissionsImpulseResponse
+from .base import ProjectEvaluation, AtmosphericChemistry, State, DynamicElement, step_times
+from .sts import SparseTimeSeries, EnsembleSTS
+from .base import GeometricHumanPopulationForecast, SubsidyAccounting
+from .base import IPCC_Transport_RoadTransportation_LightDutyGasolineTrucks
 
 
 def test_co2e(assert_value=0, years=100):
@@ -47,3 +53,236 @@ def test_co2e(assert_value=0, years=100):
     max_forcing = max(forcings)
     ratio = (max_forcing / min_forcing).to('dimensionless').magnitude
     assert 2.15 <= ratio <= 2.25
+
+
+def _assert_same_sts(a, b, exact=False):
+    """Assert that STS `a` and `b` have the same times and values (NaNs
+    included), bit for bit if `exact` and to within rounding otherwise"""
+    assert list(a.times) == list(b.times)
+    same = np.array_equal if exact else np.allclose
+    assert same(a.values, b.values, equal_nan=True)
+
+
+def _assert_same_states(state, ref, exact=False):
+    assert state.t_now == ref.t_now
+    assert sorted(state.sts) == sorted(ref.sts)
+    for key, obj in ref.sts.items():
+        _assert_same_sts(state.sts[key], obj, exact=exact)
+
+
+def _chemistry_state(projects, t_stop):
+    """Return a State from 2000 with `projects` and AtmosphericChemistry,
+    run until `t_stop`"""
+    state = State(t_start=2000 * u.years)
+    state.add_projects(list(projects) + [AtmosphericChemistry()])
+    state.run_until(t_stop)
+    return state
+
+
+def test_run_until_parallel():
+    def make():
+        return ProjectEvaluation(
+            projects={ghg: EmissionsImpulseResponse(impulse_co2e=1000 * u.kg_CO2e,
+                                                    ghg=ghg,
+                                                    catpath='Forest_Land')
+                      for ghg in [GHG.CO2, GHG.CH4]},
+            common_projects=[AtmosphericChemistry()],
+            present=2000 * u.years)
+    serial = make()
+    serial.run_until(2010 * u.years, n_workers=1)
+    parallel = make()
+    parallel.run_until(2010 * u.years, n_workers=2)
+    for name, state in serial.states.items():
+        assert parallel.states[name].ran_in_worker
+        _assert_same_states(parallel.states[name], state)
+
+
+def test_resimulate():
+    def make(impulse_co2e):
+        return _chemistry_state([EmissionsImpulseResponse(impulse_co2e=impulse_co2e,
+                                                          ghg=GHG.CH4,
+                                                          catpath='Forest_Land')],
+                                2030 * u.years)
+    state = make(1000 * u.kg_CO2e)
+    state.projects['EmissionsImpulseResponse'].impulse_co2e = 2000 * u.kg_CO2e
+    stale = state.resimulate(['EmissionsImpulseResponse'])
+    assert stale == {'EmissionsImpulseResponse', 'AtmosphericChemistry'}
+    _assert_same_states(state, make(2000 * u.kg_CO2e))
+
+
+class _Ramp(DynamicElement):
+    """Write `slope` times the years since 2020 to the STS `name`, from 2020,
+    and register it as a subsidy requirement if `subsidy`"""
+    name:str
+    slope:object
+    subsidy:bool = False
+
+    def on_add_project(self, state):
+        with state.defining(self) as ctx:
+            setattr(ctx, self.name, SparseTimeSeries(default_value=0 * self.slope.u))
+        if self.subsidy:
+            state.register_subsidy_requirement(self.name)
+        return 2020 * u.years
+
+    def ramp(self, years):
+        return self.slope * (years - 2020)
+
+    def step(self, state, current):
+        setattr(current, self.name, self.ramp(state.t_now.m_as(u.years)))
+        return state.t_now + 1 * u.years
+
+    def step_range(self, state, t0, t1):
+        times, t_next = step_times(t0, t1, 1 * u.years)
+        return times, {self.name: self.ramp(times.m_as(u.years))}, t_next
+
+
+def test_step_range():
+    def make():
+        state = State()
+        state.add_projects([
+            GeometricHumanPopulationForecast(),
+            IPCC_Transport_RoadTransportation_LightDutyGasolineTrucks(),
+            _Ramp(identifier='ZEV_adoption',
+                  name='Other_LightDutyGasolineTrucks_ZEV_fraction',
+                  slope=0.02 * u.dimensionless),
+            _Ramp(identifier='Subsidy', name='Subsidy_required',
+                  slope=1e6 * u.CAD, subsidy=True),
+            SubsidyAccounting()])
+        return state
+    bulk = make()
+    bulk.run_until(2030 * u.years)
+    bulk.run_until(2050 * u.years)
+    assert bulk._last_bulk_step is not None
+    assert bulk.sts['AnnualSubsidyTotal'].query(2030 * u.years) == 1e7 * u.CAD
+    ref = make()
+    ref._schedule()
+    ref._bulk.clear() # step() every year instead
+    ref.run_until(2030 * u.years)
+    ref.run_until(2050 * u.years)
+    assert bulk.project_t_next == ref.project_t_next
+    _assert_same_states(bulk, ref, exact=True)
+
+
+class _Emitter(DynamicElement):
+    """Emit `rate` of `ghg` into `catpath`, growing 10% a year from 2000"""
+    ghg:object
+    catpath:str
+    rate:object
+
+    def on_add_project(self, state):
+        with state.defining(self) as ctx:
+            setattr(ctx, f'{self.identifier}_emissions',
+                    SparseTimeSeries(unit=self.rate.u, t_unit=u.years))
+        state.register_emission(self.catpath, self.ghg, f'{self.identifier}_emissions')
+        return state.t_now
+
+    def step(self, state, current):
+        years = (state.t_now - 2000 * u.years).m_as(u.years)
+        setattr(current, f'{self.identifier}_emissions', self.rate * 1.1 ** years)
+        return state.t_now + 1 * u.years
+
+
+def test_atmospheric_chemistry_tally():
+    state = _chemistry_state([
+        _Emitter(identifier='a', ghg=GHG.CO2, catpath='Forest_Land', rate=3 * u.kt_CO2),
+        _Emitter(identifier='b', ghg=GHG.CO2, catpath='Forest_Land', rate=500 * u.tonne_CO2),
+        _Emitter(identifier='c', ghg=GHG.CH4, catpath='Forest_Land', rate=7 * u.kg_CH4),
+        _Emitter(identifier='d', ghg=GHG.N2O, catpath='Enteric_Fermentation', rate=2 * u.kt_N2O),
+        _Emitter(identifier='e', ghg=GHG.CH4, catpath='Enteric_Fermentation', rate=5 * u.kt_CH4),
+        ], 2010 * u.years)
+
+    # the per-contributor loop that compile_registry replaced
+    for year in range(2001, 2010):
+        t = year * u.years
+        totals = {ghg: 0 * kt_by_ghg[ghg] for ghg in [GHG.CO2, GHG.CH4, GHG.N2O]}
+        for catpath in ['Forest_Land', 'Enteric_Fermentation']:
+            contributors = state.sectoral_emissions_contributors[catpath]
+            catpath_CO2e = 0 * u.kt_CO2e
+            for ghg in totals:
+                if not contributors.get(ghg, []):
+                    continue
+                mass = sum(state.sts[sts_key].query(t) for sts_key in contributors[ghg])
+                tally = state.sts[f'Predicted_Annual_Emitted_{ghg.value}_mass_{catpath}'].query(t)
+                assert np.isclose(tally.m_as(kt_by_ghg[ghg]), mass.m_as(kt_by_ghg[ghg]))
+                totals[ghg] = totals[ghg] + mass
+                catpath_CO2e = catpath_CO2e + mass * GWP_100[ghg]
+            tally = state.sts[f'Predicted_Annual_Emitted_CO2e_mass_{catpath}'].query(t)
+            assert np.isclose(tally.m_as(u.kt_CO2e), catpath_CO2e.m_as(u.kt_CO2e))
+        for ghg, mass in totals.items():
+            tally = state.sts[f'Predicted_Annual_Emitted_{ghg.value}_mass'].query(t)
+            assert np.isclose(tally.m_as(kt_by_ghg[ghg]), mass.m_as(kt_by_ghg[ghg]))
+
+
+class _MethaneSamples(DynamicElement):
+    """Emit CH4 at a rate that is uncertain by a factor of `scales`"""
+    scales:list
+
+    def on_add_project(self, state):
+        with state.defining(self) as ctx:
+            if len(self.scales) > 1:
+                ctx.methane = EnsembleSTS(
+                    n_samples=len(self.scales), t_unit=u.years, v_unit=u.kt_CH4)
+            else:
+                ctx.methane = SparseTimeSeries(unit=u.kt_CH4, t_unit=u.years)
+        state.register_emission('Forest_Land', GHG.CH4, 'methane')
+        return state.t_now
+
+    def step(self, state, current):
+        scale = np.asarray(self.scales) if len(self.scales) > 1 else self.scales[0]
+        current.methane = scale * 10 * u.kt_CH4
+        return state.t_now + 1 * u.years
+
+
+def test_atmospheric_chemistry_ensemble():
+    def make(scales):
+        return _chemistry_state([_MethaneSamples(scales=scales)], 2020 * u.years)
+    scales = [0.5, 1.0, 2.0]
+    ensemble = make(scales)
+    assert isinstance(ensemble.sts['Ocean_Temperature_Anomaly'], EnsembleSTS)
+    for ii, scale in enumerate(scales):
+        ref = make([scale])
+        for key, obj in ref.sts.items():
+            if key != 'methane':
+                _assert_same_sts(ensemble.sts[key].sample(ii), obj)
+
+
+def test_fork():
+    def make(projects):
+        state = State(t_start=2000 * u.years)
+        state.add_projects(list(projects) + [AtmosphericChemistry()])
+        return state
+    emitter = _Emitter(identifier='a', ghg=GHG.CH4, catpath='Forest_Land', rate=7 * u.kt_CH4)
+    ramp = _Ramp(identifier='r', name='ramp', slope=1 * u.kg)
+    ref = _chemistry_state([emitter], 2030 * u.years)
+
+    prefix = make([emitter, ramp])
+    prefix.run_before(2020 * u.years)
+    snapshot = prefix.snapshot()
+    n_times = len(snapshot.sts['a_emissions'].times)
+    prefix.run_until(2030 * u.years)
+    assert len(snapshot.sts['a_emissions'].times) == n_times
+
+    # a fork runs on as the prefix did, and without `ramp` as if never added
+    for without in [(), ['r']]:
+        state = snapshot.fork(without=without)
+        state.run_until(2030 * u.years)
+        for key, obj in ref.sts.items():
+            _assert_same_sts(state.sts[key], obj, exact=True)
+        assert len(state.sts['ramp'].times) == (0 if without else 11)
+
+    # which it isn't, if what the excluded project writes is used
+    prefix = make([emitter, _Ramp(identifier='r', name='ramp', slope=1 * u.CAD, subsidy=True)])
+    prefix.run_before(2020 * u.years)
+    for without in [['a'], ['r']]:
+        with pytest.raises(ValueError):
+            prefix.fork(without=without)
+    prefix = State()
+    prefix.add_projects([
+        GeometricHumanPopulationForecast(),
+        IPCC_Transport_RoadTransportation_LightDutyGasolineTrucks(),
+        _Ramp(identifier='ZEV_adoption',
+              name='Other_LightDutyGasolineTrucks_ZEV_fraction',
+              slope=0.02 * u.dimensionless)])
+    prefix.run_before(2020 * u.years)
+    with pytest.raises(ValueError):
+        prefix.fork(without=['ZEV_adoption'])
@@ -1,4 +1,6 @@
 import enum
+import pytest
+
 from .objtensor import *
 from .ureg import u
 
@@ -107,3 +109,143 @@ def test_sum_dim3():
     bar_sum_2 = bar.sum(2)
     assert bar_sum_2.dims == empty(A, A).dims
     assert bar_sum_2.buf == [3, 12, 21, 30]
+
+
+def test_sum_mixed_units():
+    bar = empty(A, B)
+    bar.fill(1 * u.kg)
+    bar[A.B, B.C] = 500 * u.g
+    assert bar.sum() == 5.5 * u.kg
+    bar_sum_1 = bar.sum(1)
+    assert bar_sum_1[A.A] == 3 * u.kg
+    assert bar_sum_1[A.B] == 2.5 * u.kg
+
+
+def test_numeric_buffer():
+    foo = from_dict({A.A: 1 * u.kg, A.B: 2000 * u.g})
+    assert isinstance(foo.buf, NumericBuffer) and foo.buf.is_numeric
+    bar = empty(A, B)
+    bar.fill(2 * u.m)
+    bar = bar.packed()
+    assert bar.buf.is_numeric
+
+    baz = foo[:, None] * bar
+    assert baz.buf.is_numeric
+    assert baz[A.B, B.C] == 4 * u.kg * u.m
+    assert (foo @ bar)[B.A] == 6 * u.kg * u.m
+    assert foo.sum() == 3 * u.kg
+    assert (foo + foo)[A.B] == 4000 * u.g
+
+    # storing a non-scalar converts the buffer (and its views) to objects
+    view = bar[A.A]
+    bar[A.B, B.C] = 'x'
+    assert not bar.buf.is_numeric
+    assert view[B.C] == 2 * u.m
+    assert bar[A.B, B.C] == 'x'
+
+
+def test_ravel_plan():
+    foo = empty(A, B)
+    bar = empty([A.B, A.A], B)
+    foo_keys, foo_offsets = ravel_plan(foo.dims, foo.strides)
+    assert ravel_plan(foo.dims, foo.strides)[1] is foo_offsets
+    assert ravel_plan(empty(A, B).dims, foo.strides)[0] is foo_keys
+    assert list(foo_offsets) == [0, 1, 2, 3, 4, 5]
+    assert list(ravel_plan(bar.dims, bar.strides)[1]) == [3, 4, 5, 0, 1, 2]
+    assert list(ravel_keys_offsets(foo.dims, foo.strides, 10))[1] == ((A.A, B.B), 11)
+    assert [offs for key, offs in ravel_multi(foo, bar)][:2] == [(0, 3), (1, 4)]
+
+
+def test_sparse():
+    zero = from_dict({A.A: 0 * u.kg, A.B: 0 * u.g})
+    foo = sparse(A, B, B, zero=zero[:, None, None])
+    foo[A.A, B.C, B.A] = 2 * u.kg
+    foo[A.B, B.A, B.A] = 3 * u.g
+    foo[A.B, B.B, B.C] = 5 * u.g
+    assert foo.nnz == 3
+    assert foo[A.B, B.C, B.C] == 0 * u.g
+    dense = foo.dense()
+    assert dense[A.A, B.C, B.A] == 2 * u.kg
+
+    bar = foo[:, [B.A, B.B]]
+    assert bar.shape == (2, 2, 3)
+    assert bar.nnz == 2
+    assert bar.sum(1).sum(1)[A.B] == 8 * u.g
+    assert foo.sum(0)[B.C, B.A] == 2 * u.kg
+    assert foo.sum(0)[B.C, B.C] == 0 * u.kg
+    assert foo.sum().to(u.g) == 2008 * u.g
+
+    scale = from_dict({A.A: 2 * u.m, A.B: 3 * u.m})
+    baz = scale[:, None, None] * foo
+    assert isinstance(baz, SparseObjectTensor)
+    assert baz[A.B, B.A, B.A] == 9 * u.g * u.m
+    assert baz[A.B, B.A, B.B] == 0 * u.g * u.m
+    assert (scale @ foo[:, :, B.A])[B.C] == 4 * u.kg * u.m
+    assert (scale @ foo[:, :, B.A]).sum() == (scale @ dense[:, :, B.A]).sum()
+
+    # implicit zeros divided by zero only raise where they are read
+    bar = sparse(A, B, zero=zero[:, None])
+    bar[A.A, B.A] = 2.0 * u.kg
+    ratio = bar / from_dict({B.A: 2.0 * u.m, B.B: 0.0 * u.m, B.C: 4.0 * u.m})
+    assert ratio[A.A, B.A] == 1 * u.kg / u.m
+    assert ratio[A.B, B.C] == 0 * u.g / u.m
+    with pytest.raises(ZeroDivisionError):
+        ratio[A.B, B.B]
+    with pytest.raises(ZeroDivisionError):
+        ratio.dense()
+    assert (bar / bar)[A.A, B.A] == 1 * u.dimensionless
+    assert (ratio[:, [B.A, B.C]] * 2).sum().to(u.kg / u.m) == 2 * u.kg / u.m
+
+
+def test_contract():
+    foo = from_dict({A.A: 2 * u.dimensionless, A.B: 3 * u.dimensionless})
+    bar = empty(A, B)
+    bar.buf[:] = [ii * u.kg for ii in range(6)]
+    baz = from_dict({B.A: 1 * u.m, B.B: 10 * u.m, B.C: 100 * u.m})
+
+    assert contract(foo, bar, over=(A,))[B.C] == (foo @ bar)[B.C]
+    assert contract(foo, bar, over=(A, B)) == (foo @ bar).sum()
+    assert contract(bar, over=(A,))[B.B] == bar.sum(0)[B.B]
+    assert contract(foo, bar, baz, over=(A, B)) == foo @ (bar @ baz)
+    by_b_a = contract(baz, bar, over=())
+    assert by_b_a.shape == (3, 2)
+    assert by_b_a[B.C, A.B] == 500 * u.kg * u.m
+
+    with pytest.raises(ValueError):
+        contract(foo, empty([]), over=(A,))
+    with pytest.raises(ValueError):
+        contract(foo, empty(['A', 'B']), over=(A,))
+    with pytest.raises(ValueError):
+        contract(empty([A.A, B.B]), over=(A,))
+
+
+def test_interned_dims():
+    foo = empty(A, B)
+    bar = empty(A, B)
+    assert foo.dims[0] is bar.dims[0]
+    assert foo[:, [B.C, B.A]].dims[1] is bar[:, [B.C, B.A]].dims[1]
+    assert foo[:, B].dims[1] is bar[:, B].dims[1]
+    assert foo[:, [B.C, B.A]].dims[1] == {B.C: 2, B.A: 0}
+    assert same_keys(foo.dims[0], empty([A.B, A.A]).dims[0])
+    assert not same_keys(foo.dims[1], foo[:, [B.A]].dims[1])
+    assert list(take_idxs(foo.dims[1], empty([B.C, B.B, B.A]).dims[0])) == [2, 1, 0]
+    # str Enum members of different classes compare equal, but are not the same keys
+    assert empty([B.A, B.B]).dims[0] is not foo.dims[0]
+    assert [type(key) for key in empty([B.A, B.B]).dims[0]] == [B, B]
+
+
+def test_ravel_plan_enum_types():
+    class C(str, enum.Enum):
+        X = 'X'
+        Y = 'Y'
+
+    class D(str, enum.Enum):
+        Q = 'X'
+        R = 'Y'
+
+    empty(C).ravel_keys_offsets()
+    assert [type(key[0]) for key, _ in empty(D).ravel_keys_offsets()] == [D, D]
+    c_dim = {C.X: 0, C.Y: 1}
+    d_dim = {D.Q: 0, D.R: 1}
+    ravel_plan([c_dim], [1])
+    assert [type(key[0]) for key in ravel_plan([d_dim], [1])[0]] == [D, D]
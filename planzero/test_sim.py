@@ -0,0 +1,76 @@
+import types
+
+from .ureg import u
+from .enums import GHG
+from .base import DynamicElement
+from .sts import SparseTimeSeries
+from . import scenarios
+from . import sim
+from .test_co2e import _assert_same_sts
+
+
+class _Afforestation(DynamicElement):
+    """A stand-in strategy that removes CO2 from 2030, which State.fork
+    can't leave out because it registers the removals"""
+
+    def on_add_project(self, state):
+        with state.defining(self) as ctx:
+            ctx.afforestation = SparseTimeSeries(unit=u.kt_CO2, t_unit=u.years)
+        state.register_emission('Forest_Land', GHG.CO2, 'afforestation')
+        return 2030 * u.years
+
+    def step(self, state, current):
+        current.afforestation = -100 * u.kt_CO2
+        return state.t_now + 1 * u.years
+
+
+class _Survey(DynamicElement):
+    """A stand-in strategy from 2040 that nothing else depends on, which
+    ablations can be forked without"""
+
+    def on_add_project(self, state):
+        with state.defining(self) as ctx:
+            ctx.survey = SparseTimeSeries(unit=u.CAD, t_unit=u.years)
+        return 2040 * u.years
+
+    def step(self, state, current):
+        current.survey = 1e6 * u.CAD
+        return state.t_now + 5 * u.years
+
+
+def test_sim_scenario_parallel(monkeypatch):
+    scenario = types.SimpleNamespace(
+        name='StandIn',
+        t_start_year=1990,
+        dynelems=[
+            _Afforestation(identifier='Afforestation', tags={'strategy'}),
+            _Survey(identifier='Survey', tags={'strategy'})])
+    monkeypatch.setitem(scenarios.scenarios, 'standin', scenario)
+
+    # the forked ablation is as if set up from scratch
+    prefix, forkable = sim._baseline_state('standin')
+    assert forkable
+    forked = sim._ablated_state(prefix, 'standin', scenario.dynelems[1])
+    assert 'survey' in forked.sts # declared, but never written
+    ref = sim._new_state('standin', exclude_name='_Survey')
+    for state in (forked, ref):
+        state.run_until(2100 * u.years)
+    assert not len(forked.sts['survey'].times)
+    for key, obj in ref.sts.items():
+        _assert_same_sts(forked.sts[key], obj, exact=True)
+
+    serial = sim._sim_scenario('standin', None)
+    # the workers must be forked after the stand-in scenario is defined
+    pool = sim.start_workers(2)
+    try:
+        parallel = sim._sim_scenario('standin', pool)
+    finally:
+        sim.stop_workers()
+    assert sim.sim_progress('standin') == (3, 3)
+    assert list(parallel.ablations) == list(serial.ablations) == ['_Afforestation', '_Survey']
+    for name, state in serial.ablations.items():
+        assert parallel.ablations[name].name == state.name
+        for key in sim.ablation_sts_names:
+            _assert_same_sts(parallel.ablations[name].sts[key], state.sts[key], exact=True)
+    for key, obj in serial.state.sts.items():
+        _assert_same_sts(parallel.state.sts[key], obj, exact=True)
@@ -1,3 +1,6 @@
+import collections
+import contextlib
+
 import pint
 from . import enums
 
@@ -133,3 +136,76 @@ kilotonne_by_coal_type = {
 
 ureg.define('operation = [installation]')
 ureg.define('farm = operation')
+
+
+# Process-wide memo of unit conversion factors, keyed by (src_unit, dst_unit).
+# Hot paths (e.g. STS.append, STS.query) use it to convert raw floats with
+# one multiply instead of building a pint Quantity and calling .to()
+_conversion_factors = {}
+
+# Tallies of conversion work, see conversion_factor and counting_pint_conversions
+conversion_counts = collections.Counter()
+
+
+def conversion_factor(src_unit, dst_unit):
+    """Return the float that converts magnitudes in `src_unit` to `dst_unit`.
+
+    Raises the usual pint errors for incompatible or offset (non-multiplicative) units.
+    """
+    try:
+        rval = _conversion_factors[src_unit, dst_unit]
+        conversion_counts['factor_cache_hits'] += 1
+        return rval
+    except KeyError:
+        pass
+    conversion_counts['factor_cache_misses'] += 1
+    if isinstance(src_unit, str) or isinstance(dst_unit, str):
+        rval = conversion_factor(ureg.Unit(src_unit), ureg.Unit(dst_unit))
+    elif src_unit == dst_unit:
+        rval = 1.0
+    else:
+        rval = float((1.0 * src_unit / dst_unit).to('dimensionless').magnitude)
+    _conversion_factors[src_unit, dst_unit] = rval
+    return rval
+
+
+def reset_conversion_counts():
+    conversion_counts.clear()
+
+
+@contextlib.contextmanager
+def counting_pint_conversions():
+    """Count the conversions that still go through pint (i.e. calls to
+    ureg.convert, which underlies Quantity.to, m_as and mixed-unit arithmetic)
+    while the context is active.
+
+    e.g.
+    with counting_pint_conversions() as counts:
+        get_peval()
+    print(counts['pint_convert'], counts['factor_cache_hits'])
+    """
+    if 'convert' in vars(ureg):
+        # nested (or ureg.convert was already patched by someone else):
+        # count through whatever is there, and put it back afterwards
+        prev_convert = vars(ureg)['convert']
+    else:
+        prev_convert = None
+    orig_convert = ureg.convert
+    if getattr(orig_convert, 'counting_pint_conversions', False):
+        # the outer context is already counting into conversion_counts
+        yield conversion_counts
+        return
+
+    def convert(*args, **kwargs):
+        conversion_counts['pint_convert'] += 1
+        return orig_convert(*args, **kwargs)
+    convert.counting_pint_conversions = True
+
+    ureg.convert = convert
+    try:
+        yield conversion_counts
+    finally:
+        if prev_convert is None:
+            del ureg.convert
+        else:
+            ureg.convert = prev_convert